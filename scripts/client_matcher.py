@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificação de cliente já cadastrado a partir dos dados do OCR
+Índices de blocagem (CPF, nascimento + nome fonético, nome da mãe) sobre
+a exportação da tabela de clientes: só os candidatos dos blocos são
+comparados, em vez de todos os clientes
+
+Exportação: CSV (separado por ; ou ,) ou JSON/JSONL com as colunas
+id, nome, cpf, rg, data_nascimento e, quando houver, mae
+
+Uso:
+  python client_matcher.py build <clientes.csv> <clientes.idx>
+  python client_matcher.py match <clientes.idx> <resultado_ocr.json>
+"""
+
+import re
+import sys
+import csv
+import json
+import time
+import pickle
+import unicodedata
+from array import array
+from difflib import SequenceMatcher
+
+# Versão do arquivo de índice (recriar com 'build' ao mudar)
+INDEX_VERSION = 1
+
+# Partículas ignoradas na comparação de nomes
+NAME_PARTICLES = {'DA', 'DE', 'DO', 'DAS', 'DOS', 'E'}
+
+# Regras fonéticas simplificadas para nomes em português (ordem importa)
+PHONETIC_RULES = [
+    (r'Ç', 'S'), (r'PH', 'F'), (r'TH', 'T'), (r'SCH|SH|CH', 'X'), (r'LH', 'L'), (r'NH', 'N'),
+    (r'C(?=[EI])', 'S'), (r'G(?=[EI])', 'J'), (r'QU|Q|C|K', 'K'), (r'Y', 'I'), (r'W', 'V'),
+    (r'Z', 'S'), (r'H', ''), (r'N\b', 'M')
+]
+
+# Peso de cada campo na pontuação (só entram os campos presentes nos dois lados)
+FIELD_WEIGHTS = {'cpf': 0.4, 'nome': 0.3, 'nascimento': 0.2, 'mae': 0.1}
+
+# Blocos maiores que isto são ignorados na busca (chaves pouco seletivas)
+MAX_BLOCK_SIZE = 500
+
+def strip_accents(value):
+    """Maiúsculas sem acentos (Ç preservado para as regras fonéticas)"""
+    value = (value or '').upper().replace('Ç', '\0')
+    value = ''.join(char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char))
+    return value.replace('\0', 'Ç')
+
+def name_tokens(name):
+    """Palavras do nome, sem acentos, pontuação e partículas"""
+    return [token for token in re.sub(r'[^A-ZÇ ]', ' ', strip_accents(name)).split() if token not in NAME_PARTICLES]
+
+def phonetic(word):
+    """Chave fonética de uma palavra: esqueleto de consoantes após as regras"""
+    for pattern, replacement in PHONETIC_RULES:
+        word = re.sub(pattern, replacement, word)
+    word = re.sub(r'(.)\1+', r'\1', word)
+    return word[:1] + re.sub(r'[AEIOU]', '', word[1:])
+
+def name_key(name, surname=True):
+    """Chave fonética do nome: primeiro nome (+ último sobrenome)"""
+    tokens = name_tokens(name)
+    if not tokens:
+        return None
+    key = phonetic(tokens[0])
+    if surname and len(tokens) > 1:
+        key += ' ' + phonetic(tokens[-1])
+    return key
+
+def normalize_cpf(value):
+    """CPF só com dígitos (None se não tiver 11 dígitos)"""
+    digits = re.sub(r'\D', '', value or '')
+    return digits if len(digits) == 11 else None
+
+def normalize_date(value):
+    """Data em AAAA-MM-DD a partir de DD/MM/AAAA ou AAAA-MM-DD[...]"""
+    value = (value or '').strip()
+    match = re.match(r'(\d{4})-(\d{2})-(\d{2})', value)
+    if match:
+        return '-'.join(match.groups())
+    match = re.match(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})', value)
+    if match:
+        day, month, year = match.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}"
+    return None
+
+def blocking_keys(nome=None, cpf=None, nascimento=None, mae=None):
+    """Chaves de blocagem de um registro (normalizado)"""
+    keys = []
+    if cpf:
+        keys.append('cpf:' + cpf)
+    # Só o primeiro nome: o sobrenome muda com o casamento
+    first_name = name_key(nome, surname=False)
+    if nascimento and first_name:
+        keys.append(f"nasc:{nascimento}:{first_name}")
+    mother = name_key(mae)
+    if mother:
+        keys.append('mae:' + mother)
+    return keys
+
+def name_similarity(a, b):
+    """Similaridade entre nomes normalizados (0 a 1)"""
+    a, b = ' '.join(name_tokens(a)), ' '.join(name_tokens(b))
+    if not a or not b:
+        return None
+    return SequenceMatcher(None, a, b).ratio()
+
+class ClientIndex:
+    """Clientes exportados e índices de blocagem, em estrutura compacta"""
+
+    def __init__(self):
+        # Colunas paralelas (uma lista por campo) em vez de um dicionário por cliente
+        self.ids, self.nomes, self.cpfs, self.nascimentos, self.maes = [], [], [], [], []
+        self.blocks = {}
+
+    def add(self, client_id, nome, cpf=None, nascimento=None, mae=None):
+        """Acrescenta um cliente aos índices"""
+        position = len(self.ids)
+        cpf, nascimento = normalize_cpf(cpf), normalize_date(nascimento)
+        self.ids.append(str(client_id))
+        self.nomes.append(nome or '')
+        self.cpfs.append(cpf)
+        self.nascimentos.append(nascimento)
+        self.maes.append(mae or None)
+
+        for key in blocking_keys(nome, cpf, nascimento, mae):
+            self.blocks.setdefault(key, array('I')).append(position)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def score(self, position, nome, cpf, nascimento, mae):
+        """Pontuação ponderada e comparação campo a campo"""
+        fields = {}
+        if cpf and self.cpfs[position]:
+            fields['cpf'] = 1.0 if cpf == self.cpfs[position] else 0.0
+        similarity = name_similarity(nome, self.nomes[position])
+        if similarity is not None:
+            fields['nome'] = round(similarity, 3)
+        if nascimento and self.nascimentos[position]:
+            fields['nascimento'] = 1.0 if nascimento == self.nascimentos[position] else 0.0
+        similarity = name_similarity(mae, self.maes[position])
+        if similarity is not None:
+            fields['mae'] = round(similarity, 3)
+
+        weight = sum(FIELD_WEIGHTS[field] for field in fields)
+        total = sum(FIELD_WEIGHTS[field] * value for field, value in fields.items())
+        return (total / weight if weight else 0.0), fields
+
+    def match(self, data, limit=5, min_score=0.6):
+        """Candidatos para os dados do OCR, do mais provável ao menos"""
+        nome, mae = data.get('nome'), data.get('mae')
+        cpf, nascimento = normalize_cpf(data.get('cpf')), normalize_date(data.get('nascimento'))
+
+        candidates = {}
+        for key in blocking_keys(nome, cpf, nascimento, mae):
+            block = self.blocks.get(key, ())
+            if len(block) > MAX_BLOCK_SIZE:
+                continue
+            for position in block:
+                candidates.setdefault(position, []).append(key.split(':', 1)[0])
+
+        matches = []
+        for position, blocks in candidates.items():
+            score, fields = self.score(position, nome, cpf, nascimento, mae)
+            if score >= min_score:
+                matches.append({
+                    'client_id': self.ids[position],
+                    'nome': self.nomes[position],
+                    'cpf': self.cpfs[position],
+                    'score': round(score, 3),
+                    'fields': fields,
+                    'blocks': blocks
+                })
+
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches[:limit]
+
+    def save(self, path):
+        """Grava o índice para carregamento rápido"""
+        with open(path, 'wb') as f:
+            pickle.dump((INDEX_VERSION, self.__dict__), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """Carrega um índice gravado por save()"""
+        with open(path, 'rb') as f:
+            version, state = pickle.load(f)
+        if version != INDEX_VERSION:
+            raise ValueError(f"Índice {path} de versão {version}; recrie com 'client_matcher.py build'")
+        index = cls()
+        index.__dict__.update(state)
+        return index
+
+def read_clients(path):
+    """Lê a exportação de clientes (CSV, JSON ou JSONL)"""
+    with open(path, encoding='utf-8-sig') as f:
+        if path.lower().endswith('.json'):
+            yield from json.load(f)
+        elif path.lower().endswith('.jsonl'):
+            yield from (json.loads(line) for line in f if line.strip())
+        else:
+            dialect = csv.Sniffer().sniff(f.read(4096), delimiters=';,')
+            f.seek(0)
+            yield from csv.DictReader(f, dialect=dialect)
+
+def build_index(path):
+    """Monta o índice a partir da exportação de clientes"""
+    index = ClientIndex()
+    for client in read_clients(path):
+        index.add(
+            client.get('id'), client.get('nome'), client.get('cpf'),
+            client.get('data_nascimento') or client.get('nascimento'), client.get('mae')
+        )
+    return index
+
+def main():
+    """Função principal do verificador de clientes"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+
+    if len(args) != 3 or args[0] not in ('build', 'match'):
+        print(json.dumps({
+            'success': False,
+            'error': 'Uso: python client_matcher.py build <clientes.csv> <clientes.idx> | '
+                     'match <clientes.idx> <resultado_ocr.json>'
+        }))
+        sys.exit(1)
+
+    started = time.perf_counter()
+    if args[0] == 'build':
+        index = build_index(args[1])
+        index.save(args[2])
+        print(f"✅ {len(index)} clientes, {len(index.blocks)} blocos em {time.perf_counter() - started:.1f}s",
+              file=sys.stderr)
+        return
+
+    index = ClientIndex.load(args[1])
+    with open(args[2], encoding='utf-8') as f:
+        result = json.load(f)
+    loaded = time.perf_counter()
+    matches = index.match(result.get('data', result))
+    print(json.dumps({
+        'success': True,
+        'matches': matches,
+        'load_ms': round((loaded - started) * 1000, 1),
+        'match_ms': round((time.perf_counter() - loaded) * 1000, 2)
+    }, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
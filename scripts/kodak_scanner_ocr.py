@@ -8,124 +8,240 @@ Otimizado para documentos brasileiros (RG/CNH)
 import sys
 import json
 import base64
+
+# Orçamento de threads (precisa ser aplicado antes de numpy/cv2)
+from ocr_threads import apply_thread_budget
+THREAD_BUDGET = apply_thread_budget()
+
 import pytesseract
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import io
 import re
-import cv2
-import numpy as np
 
-# Configuração do Tesseract
-TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-TESSDATA_PREFIX = r'C:\Program Files\Tesseract-OCR\tessdata'
+from ocr_bands import ocr_image_in_bands
+from ocr_barcode import NO_CODES, decode_document_codes
+from ocr_bitonal import read_archive, save_bitonal_tiff
+from ocr_deadline import Deadline, DeadlineExceeded, timeout_result
+from ocr_graph import build_chain, run_graph
+from ocr_memory import (binarize_in_strips, check_input_size, memory_report, open_image, plan_memory,
+                        release_peak_rss, reset_peak_rss)
+from ocr_outputs import ocr_multi_output, save_searchable_pdf, scale_words
+from ocr_profile import profiled
+from ocr_profiles import load_profile
+from ocr_quality import assess_quality, rejection_result
+from ocr_stream import NULL_EMITTER, run_streaming
+
+# Configuração do Tesseract (TESSERACT_CMD e TESSDATA_PREFIX no ambiente
+# sobrescrevem: Linux, ou o stub_tesseract.py do teste de carga)
+import os
+TESSERACT_PATH = os.environ.get('TESSERACT_CMD', r'C:\Program Files\Tesseract-OCR\tesseract.exe')
+TESSDATA_PREFIX = os.environ.get('TESSDATA_PREFIX', r'C:\Program Files\Tesseract-OCR\tessdata')
 pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
 # Configurar variável de ambiente para tessdata
-import os
 os.environ['TESSDATA_PREFIX'] = TESSDATA_PREFIX
 
-def preprocess_for_kodak_scanner(image):
+# Parâmetros padrão de pré-processamento (sobrescritos por profiles/kodak.json,
+# gerado por tune_device_profile.py)
+KODAK_DEFAULT_PROFILE = {
+    'scale_factor': 2.0,
+    'blur_kernel': 3,
+    'threshold_block_size': 11,
+    'threshold_c': 2,
+    'morph_kernel': 1,
+    'contrast': 1.5,
+    'sharpness': 2.0,
+    'brightness': 1.1
+}
+KODAK_PROFILE = load_profile('kodak', KODAK_DEFAULT_PROFILE)
+
+# Configurações otimizadas para documentos brasileiros
+TESSERACT_CONFIG = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,-/:()@ '
+
+def preprocess_for_kodak_scanner(image, profile=None, memory_plan=None):
     """Pré-processamento específico para imagens de scanners Kodak"""
-    # Converter para OpenCV
-    img_array = np.array(image)
-    
-    # Converter RGB para BGR (OpenCV usa BGR)
-    if len(img_array.shape) == 3:
-        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-    else:
-        img_bgr = img_array
+    profile = profile or KODAK_PROFILE
     
-    # Redimensionar para melhor qualidade
-    height, width = img_bgr.shape[:2]
-    scale_factor = 2.0
-    new_width = int(width * scale_factor)
-    new_height = int(height * scale_factor)
-    img_resized = cv2.resize(img_bgr, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
+    # Orçamento de memória estourado: caminho econômico em faixas
+    if memory_plan and memory_plan['economy']:
+        cleaned = binarize_in_strips(
+            image, memory_plan['scale_factor'], profile['blur_kernel'],
+            profile['threshold_block_size'], profile['threshold_c'], profile['morph_kernel']
+        )
+        return Image.fromarray(cleaned)
     
-    # Converter para escala de cinza
-    gray = cv2.cvtColor(img_resized, cv2.COLOR_BGR2GRAY)
-    
-    # Aplicar filtros para melhorar qualidade
-    # Desfoque gaussiano para reduzir ruído
-    blurred = cv2.GaussianBlur(gray, (3, 3), 0)
-    
-    # Aplicar threshold adaptativo
-    thresh = cv2.adaptiveThreshold(
-        blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-    )
-    
-    # Morfologia para limpar a imagem
-    kernel = np.ones((1, 1), np.uint8)
-    cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-    
-    # Converter de volta para PIL
-    processed_image = Image.fromarray(cleaned)
+    # Cadeia de operadores (ocr_graph.py): bgr, resize, gray, blur, threshold, ...
+    scale_factor = memory_plan['scale_factor'] if memory_plan else profile['scale_factor']
+    processed_image, _ = run_graph(image, build_chain('kodak', profile, ('preprocess',), scale_factor))
     
     return processed_image
 
-def enhance_document_image(image):
+def enhance_document_image(image, profile=None):
     """Melhorar a qualidade da imagem do documento"""
-    # Aumentar contraste
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(1.5)
+    profile = profile or KODAK_PROFILE
     
-    # Aumentar nitidez
-    enhancer = ImageEnhance.Sharpness(image)
-    image = enhancer.enhance(2.0)
-    
-    # Ajustar brilho
-    enhancer = ImageEnhance.Brightness(image)
-    image = enhancer.enhance(1.1)
+    # Contraste, nitidez e brilho (operadores do ocr_graph.py)
+    image, _ = run_graph(image, build_chain('kodak', profile, ('enhance',)))
     
     return image
 
-def extract_document_data_kodak(image_data):
+def extract_document_data_kodak(image_data, bands=False, barcode=True, emitter=None, profile=None,
+                                memory_budget_mb=None, pdf_path=None, deadline_seconds=None, quality_gate=True,
+                                tiff_path=None):
     """Extrai dados de documentos usando OCR otimizado para scanners Kodak"""
+    emitter = emitter or NULL_EMITTER
+    profile = profile or KODAK_PROFILE
+    per_request_peak = reset_peak_rss()
+    deadline = Deadline(deadline_seconds)
+    codes = NO_CODES
     try:
         # Decodificar imagem base64
+        emitter.stage('decode')
         image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
+        image = open_image(io.BytesIO(image_bytes))
+        
+        # Limite rígido de pixels (antes de decodificar) e plano de memória
+        image = check_input_size(image)
+        # Arquivo bitonal (TIFF Grupo 4) já pré-processado: sem ampliação nem pré-processamento
+        archive = read_archive(image)
+        source_size = tuple(archive['source_size']) if archive else image.size
+        memory_plan = plan_memory(image.size, 1 if archive else profile['scale_factor'], memory_budget_mb)
         
         print(f"📷 Imagem original: {image.size[0]}x{image.size[1]} pixels")
         
-        # Pré-processar para scanner Kodak
-        processed_image = preprocess_for_kodak_scanner(image)
+        # Primeira etapa: QR code / código de barras (milissegundos)
+        deadline.check('barcode')
+        emitter.stage('barcode')
+        codes = decode_document_codes(image, parse_document_text_advanced) if barcode else NO_CODES
+        emitter.fields(codes['data'], 'barcode', 100)
+        if codes['complete']:
+            print("⚡ Dados lidos do código, OCR dispensado")
+            result = {
+                'success': True,
+                'data': codes['data'],
+                'raw_text': '\n'.join(codes['payloads']),
+                'confidence': calculate_confidence(codes['data']),
+                'source': 'barcode',
+                'thread_budget': THREAD_BUDGET,
+                'memory': memory_report(memory_plan, per_request_peak)
+            }
+            emitter.result(result)
+            return result
         
-        # Melhorar qualidade
-        enhanced_image = enhance_document_image(processed_image)
+        # Verificação de qualidade (milissegundos): imagens sem chance de leitura
+        # são recusadas com o motivo, antes do pré-processamento e do Tesseract
+        quality = None
+        if quality_gate and not archive:
+            emitter.stage('quality')
+            quality = assess_quality(image)
+            if not quality['ok']:
+                result = rejection_result(quality, codes['data'])
+                result['confidence'] = calculate_confidence(codes['data'])
+                print(f"🚫 Imagem recusada: {result['error']}")
+                emitter.result(result)
+                return result
+        
+        # Pré-processar para scanner Kodak
+        deadline.check('preprocess')
+        emitter.stage('preprocess')
+        bitonal = None
+        if archive:
+            enhanced_image = image.convert('L')
+        else:
+            processed_image = preprocess_for_kodak_scanner(image, profile, memory_plan)
+            
+            # Melhorar qualidade
+            enhanced_image = enhance_document_image(processed_image, profile)
+            
+            # Imagem binarizada guardada para reprocessar sem o original colorido
+            if tiff_path:
+                bitonal = save_bitonal_tiff(enhanced_image, tiff_path, image.size, 'kodak', profile,
+                                            image.info.get('dpi'))
+                print(f"🗜️ TIFF bitonal gravado em {bitonal['path']} ({bitonal['bytes'] // 1024} KB)")
         
         print(f"📷 Imagem processada: {enhanced_image.size[0]}x{enhanced_image.size[1]} pixels")
         
-        # Configurações otimizadas para documentos brasileiros
-        custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,-/:()@ '
+        deadline.check('ocr')
+        emitter.stage('ocr')
+        words = []
+        searchable_pdf = None
+        # O PDF pesquisável precisa da página inteira em uma só execução
+        if bands and not pdf_path:
+            # Páginas inteiras: OCR em faixas paralelas
+            on_text = None
+            if emitter.enabled:
+                def on_text(partial_text):
+                    partial_data = parse_document_text_advanced(partial_text)
+                    emitter.fields(partial_data, 'ocr', calculate_confidence(partial_data))
+            text = ocr_image_in_bands(enhanced_image, TESSERACT_CONFIG, on_text=on_text, words=words,
+                                      deadline=deadline)
+        else:
+            # Uma única execução do Tesseract: texto, palavras (TSV) e PDF pesquisável
+            output = ocr_multi_output(enhanced_image, TESSERACT_CONFIG, pdf=bool(pdf_path),
+                                      deadline=deadline)
+            text, words = output['text'], output['words']
+            if output['lang'] == 'por':
+                print("✅ OCR em português realizado com sucesso")
+            else:
+                print("⚠️ Fallback para OCR em inglês")
+            if pdf_path:
+                searchable_pdf = save_searchable_pdf(output['pdf'], pdf_path)
+                print(f"📄 PDF pesquisável gravado em {searchable_pdf}")
         
-        # Tentar português primeiro, fallback para inglês
-        try:
-            text = pytesseract.image_to_string(enhanced_image, lang='por', config=custom_config)
-            print("✅ OCR em português realizado com sucesso")
-        except:
-            text = pytesseract.image_to_string(enhanced_image, lang='eng', config=custom_config)
-            print("⚠️ Fallback para OCR em inglês")
+        # Caixas das palavras nas coordenadas da imagem original
+        words = scale_words(words, source_size[0] / enhanced_image.size[0])
         
         # Analisar texto e extrair dados
+        emitter.stage('parse')
         data = parse_document_text_advanced(text)
         
-        return {
+        # Campos lidos do código prevalecem sobre o OCR
+        data.update(codes['data'])
+        
+        confidence = calculate_confidence(data)
+        emitter.fields(data, 'ocr', confidence)
+        
+        result = {
             'success': True,
             'data': data,
             'raw_text': text,
-            'confidence': calculate_confidence(data)
+            'confidence': confidence,
+            'source': 'barcode+ocr' if codes['data'] else 'ocr',
+            'code_fields': sorted(codes['data']),
+            'words': words,
+            'searchable_pdf': searchable_pdf,
+            'bitonal_archive': bitonal,
+            'thread_budget': THREAD_BUDGET,
+            'memory': memory_report(memory_plan, per_request_peak),
+            'quality': quality
         }
+        emitter.result(result)
+        return result
+        
+    except DeadlineExceeded as e:
+        print(f"⏱️ {e}")
+        # Resultado parcial: campos do código e do texto das faixas já lidas
+        data = parse_document_text_advanced(e.partial_text) if e.partial_text else {}
+        data.update(codes['data'])
+        result = timeout_result(e, deadline, data)
+        result['confidence'] = calculate_confidence(data)
+        emitter.result(result)
+        return result
         
     except Exception as e:
         print(f"❌ Erro no processamento OCR: {str(e)}")
-        return {
+        result = {
             'success': False,
             'error': str(e),
             'data': {},
             'raw_text': '',
             'confidence': 0
         }
+        emitter.result(result)
+        return result
+        
+    finally:
+        release_peak_rss()
 
 def parse_document_text_advanced(text):
     """Análise avançada do texto extraído para documentos brasileiros"""
@@ -325,17 +441,64 @@ def calculate_confidence(data):
 
 def main():
     """Função principal para processar OCR via linha de comando"""
-    if len(sys.argv) != 2:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    
+    if len(args) != 1:
         print(json.dumps({
             'success': False,
-            'error': 'Uso: python kodak_scanner_ocr.py <imagem_base64>'
+            'error': 'Uso: python kodak_scanner_ocr.py <imagem_base64> [--bands] [--no-barcode] [--no-quality-gate] '
+                     '[--stream] [--profile=<nome>] [--memory-budget=<MB>] [--pdf=<arquivo>] '
+                     '[--tiff=<arquivo.tif>] [--deadline=<segundos>] [--trace=<arquivo.json>] [--trace-mode=sample|cprofile]'
         }))
         sys.exit(1)
     
     try:
-        image_data = sys.argv[1]
-        result = extract_document_data_kodak(image_data)
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        image_data = args[0]
+        options = {
+            'bands': '--bands' in flags,
+            'barcode': '--no-barcode' not in flags,
+            'quality_gate': '--no-quality-gate' not in flags
+        }
+        
+        # Perfil ajustado para um modelo de scanner específico (profiles/<nome>.json)
+        profile_name = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--profile=')), None)
+        if profile_name:
+            options['profile'] = load_profile('kodak', KODAK_DEFAULT_PROFILE, profile_name)
+        
+        # Orçamento de memória por requisição (MB)
+        memory_budget = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--memory-budget=')), None)
+        if memory_budget:
+            options['memory_budget_mb'] = float(memory_budget)
+        
+        # PDF pesquisável gerado na mesma execução do OCR
+        pdf_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--pdf=')), None)
+        if pdf_path:
+            options['pdf_path'] = pdf_path
+        
+        # Imagem binarizada em TIFF Grupo 4 (arquivo digital, reprocessamento)
+        tiff_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--tiff=')), None)
+        if tiff_path:
+            options['tiff_path'] = tiff_path
+        
+        # Prazo da requisição: o Tesseract é encerrado ao esgotá-lo
+        deadline = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--deadline=')), None)
+        if deadline:
+            options['deadline_seconds'] = float(deadline)
+        
+        # Perfil da requisição (trace de etapas e pilhas): só quando pedido
+        extract = extract_document_data_kodak
+        trace_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--trace=')), None)
+        if trace_path:
+            trace_mode = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--trace-mode=')), 'sample')
+            extract = profiled(extract, trace_path, trace_mode)
+        
+        if '--stream' in flags:
+            # Eventos NDJSON linha a linha (etapas, campos e resultado final)
+            run_streaming(extract, image_data, **options)
+        else:
+            result = extract(image_data, **options)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
         
     except Exception as e:
         print(json.dumps({
@@ -6,13 +6,128 @@ const fs = require('fs')
 const app = express()
 const PORT = 3001
 
+// Prazo padrão das requisições OCR (segundos); o cliente pode enviar deadlineSeconds
+const OCR_DEADLINE_SECONDS = Number(process.env.OCR_DEADLINE_SECONDS || 30)
+
+// Margem além do prazo antes de encerrar o processo Python à força
+const OCR_KILL_GRACE_MS = 2000
+
+// Executa o Python em um grupo de processos próprio (POSIX), para encerrar
+// junto os processos do Tesseract iniciados por ele
+function spawnOcr (args) {
+  return spawn('python', args, { detached: process.platform !== 'win32' })
+}
+
+// Encerra o processo Python e os processos filhos (Tesseract)
+function killProcessTree (child) {
+  if (child.exitCode !== null || child.signalCode !== null) {
+    return
+  }
+  if (process.platform === 'win32') {
+    spawn('taskkill', ['/pid', String(child.pid), '/T', '/F'])
+    return
+  }
+  try {
+    process.kill(-child.pid, 'SIGKILL')
+  } catch (error) {
+    child.kill('SIGKILL')
+  }
+}
+
+// Prazo da requisição em segundos (valor do cliente limitado ao padrão)
+function requestDeadline (body) {
+  const requested = Number(body.deadlineSeconds)
+  return requested > 0 ? Math.min(requested, OCR_DEADLINE_SECONDS) : OCR_DEADLINE_SECONDS
+}
+
+// Executa o script Python com prazo (o Tesseract é encerrado ao esgotá-lo) e
+// responde com o JSON do resultado
+function runOcrProcess (res, args, deadline) {
+  const pythonProcess = spawnOcr(args)
+
+  let output = ''
+  let errorOutput = ''
+  let finished = false
+
+  // Garantia caso o Python não respeite o prazo
+  const killTimer = setTimeout(() => {
+    console.error(`⏱️ OCR excedeu ${deadline}s, encerrando processo`)
+    killProcessTree(pythonProcess)
+  }, deadline * 1000 + OCR_KILL_GRACE_MS)
+
+  // Cliente desistiu: não gastar CPU com uma resposta que ninguém vai ler
+  res.on('close', () => {
+    if (!finished) {
+      console.log('🛑 Cliente desconectou, cancelando OCR')
+      killProcessTree(pythonProcess)
+    }
+  })
+
+  pythonProcess.stdout.on('data', (data) => {
+    output += data.toString()
+  })
+
+  pythonProcess.stderr.on('data', (data) => {
+    errorOutput += data.toString()
+  })
+
+  pythonProcess.on('close', (code) => {
+    finished = true
+    clearTimeout(killTimer)
+    if (res.writableEnded || res.destroyed) {
+      return
+    }
+    if (code === 0) {
+      try {
+        const result = JSON.parse(output)
+        if (result.timeout) {
+          console.log(`⏱️ OCR interrompido pelo prazo na etapa ${result.stage}`)
+          return res.status(504).json(result)
+        }
+        console.log('✅ OCR processado com sucesso')
+        res.json(result)
+      } catch (parseError) {
+        console.error('❌ Erro ao fazer parse do resultado:', parseError)
+        res.status(500).json({
+          status: 'error',
+          message: 'Erro ao processar resultado do OCR'
+        })
+      }
+    } else if (code === null) {
+      res.status(504).json({
+        status: 'error',
+        timeout: true,
+        message: `Tempo limite de ${deadline}s excedido no processamento OCR`
+      })
+    } else {
+      console.error('❌ Erro no processamento Python:', errorOutput)
+      res.status(500).json({
+        status: 'error',
+        message: `Erro no processamento: ${errorOutput}`
+      })
+    }
+  })
+
+  pythonProcess.on('error', (error) => {
+    finished = true
+    clearTimeout(killTimer)
+    console.error('❌ Erro ao executar Python:', error)
+    if (!res.headersSent) {
+      res.status(500).json({
+        status: 'error',
+        message: 'Erro ao executar processamento OCR'
+      })
+    }
+  })
+}
+
 // Middleware para parsing JSON
 app.use(express.json({ limit: '50mb' }))
 
 // Endpoint para processar OCR
 app.post('/api/ocr-process', async (req, res) => {
   try {
-    const { imageData } = req.body
+    const { imageData, device } = req.body
     
     if (!imageData) {
       return res.status(400).json({
@@ -23,60 +138,115 @@ app.post('/api/ocr-process', async (req, res) => {
 
     console.log('📸 Processando imagem com OCR...')
 
-    // Caminho para o script Python
-    const pythonScript = path.join(__dirname, 'ocr_processor.py')
-    
-    // Executar o script Python
-    const pythonProcess = spawn('python', [pythonScript, imageData])
+    // Caminho para o script Python (device 'auto': perfil escolhido pelas características da imagem)
+    const pythonScript = path.join(__dirname, device === 'auto' ? 'ocr_auto.py' : 'ocr_processor.py')
     
-    let output = ''
-    let errorOutput = ''
+    // Executar o script Python com prazo (o Tesseract é encerrado ao esgotá-lo)
+    const deadline = requestDeadline(req.body)
+    runOcrProcess(res, [pythonScript, imageData, `--deadline=${deadline}`], deadline)
 
-    pythonProcess.stdout.on('data', (data) => {
-      output += data.toString()
+  } catch (error) {
+    console.error('❌ Erro no servidor:', error)
+    res.status(500).json({
+      status: 'error',
+      message: 'Erro interno do servidor'
     })
+  }
+})
 
-    pythonProcess.stderr.on('data', (data) => {
-      errorOutput += data.toString()
-    })
+// Endpoint de frente e verso: os dois lados processados em paralelo e juntos em um resultado
+// (frontImage e backImage, ou imageData com os dois lados na mesma digitalização)
+app.post('/api/ocr-process/pair', (req, res) => {
+  const { frontImage, backImage, imageData, device } = req.body
+  const images = frontImage && backImage ? [frontImage, backImage] : imageData ? [imageData] : null
 
-    pythonProcess.on('close', (code) => {
-      if (code === 0) {
-        try {
-          const result = JSON.parse(output)
-          console.log('✅ OCR processado com sucesso')
-          res.json(result)
-        } catch (parseError) {
-          console.error('❌ Erro ao fazer parse do resultado:', parseError)
-          res.status(500).json({
-            status: 'error',
-            message: 'Erro ao processar resultado do OCR'
-          })
-        }
-      } else {
-        console.error('❌ Erro no processamento Python:', errorOutput)
-        res.status(500).json({
-          status: 'error',
-          message: `Erro no processamento: ${errorOutput}`
-        })
-      }
+  if (!images) {
+    return res.status(400).json({
+      status: 'error',
+      message: 'Envie frontImage e backImage, ou imageData com os dois lados'
     })
+  }
 
-    pythonProcess.on('error', (error) => {
-      console.error('❌ Erro ao executar Python:', error)
-      res.status(500).json({
-        status: 'error',
-        message: 'Erro ao executar processamento OCR'
-      })
-    })
+  console.log('🪪 Processando frente e verso com OCR...')
 
-  } catch (error) {
-    console.error('❌ Erro no servidor:', error)
-    res.status(500).json({
+  const pythonScript = path.join(__dirname, 'ocr_pairing.py')
+  const deadline = requestDeadline(req.body)
+  const args = [pythonScript, ...images, `--deadline=${deadline}`]
+  if (device) {
+    args.push(`--device=${device}`)
+  }
+  runOcrProcess(res, args, deadline)
+})
+
+// Endpoint de OCR com streaming NDJSON (etapas e campos enviados assim que encontrados)
+app.post('/api/ocr-process/stream', (req, res) => {
+  const { imageData, bands } = req.body
+
+  if (!imageData) {
+    return res.status(400).json({
       status: 'error',
-      message: 'Erro interno do servidor'
+      message: 'Dados da imagem não fornecidos'
     })
   }
+
+  console.log('📡 Processando imagem com OCR (streaming)...')
+
+  const pythonScript = path.join(__dirname, 'ocr_processor.py')
+  const deadline = requestDeadline(req.body)
+  const args = [pythonScript, imageData, '--stream', `--deadline=${deadline}`]
+  if (bands) {
+    args.push('--bands')
+  }
+
+  const pythonProcess = spawnOcr(args)
+  let finished = false
+
+  const killTimer = setTimeout(() => {
+    console.error(`⏱️ OCR excedeu ${deadline}s, encerrando processo`)
+    killProcessTree(pythonProcess)
+  }, deadline * 1000 + OCR_KILL_GRACE_MS)
+
+  // Cliente desistiu: encerrar o Python e o Tesseract
+  res.on('close', () => {
+    if (!finished) {
+      console.log('🛑 Cliente desconectou, cancelando OCR')
+      killProcessTree(pythonProcess)
+    }
+  })
+
+  res.status(200)
+  res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8')
+  res.setHeader('Cache-Control', 'no-cache')
+  res.flushHeaders()
+
+  // Cada linha do stdout já é um evento NDJSON completo
+  pythonProcess.stdout.on('data', (data) => {
+    res.write(data)
+  })
+
+  pythonProcess.stderr.on('data', (data) => {
+    console.log(data.toString().trimEnd())
+  })
+
+  pythonProcess.on('close', (code) => {
+    finished = true
+    clearTimeout(killTimer)
+    if (res.writableEnded || res.destroyed) {
+      return
+    }
+    if (code !== 0) {
+      res.write(JSON.stringify({ event: 'error', message: `Processo OCR finalizado com código ${code}` }) + '\n')
+    }
+    res.end()
+  })
+
+  pythonProcess.on('error', (error) => {
+    finished = true
+    clearTimeout(killTimer)
+    console.error('❌ Erro ao executar Python:', error)
+    res.write(JSON.stringify({ event: 'error', message: 'Erro ao executar processamento OCR' }) + '\n')
+    res.end()
+  })
 })
 
 // Endpoint de teste
@@ -92,6 +262,8 @@ app.get('/api/test', (req, res) => {
 app.listen(PORT, () => {
   console.log(`🚀 Servidor OCR rodando na porta ${PORT}`)
   console.log(`📡 Endpoint: http://localhost:${PORT}/api/ocr-process`)
+  console.log(`📡 Streaming: http://localhost:${PORT}/api/ocr-process/stream`)
+  console.log(`📡 Frente e verso: http://localhost:${PORT}/api/ocr-process/pair`)
   console.log(`🧪 Teste: http://localhost:${PORT}/api/test`)
 })
 
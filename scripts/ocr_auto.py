@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Escolha automática do perfil do dispositivo
+Em vez de o chamador escolher o script (genérico, Kodak ou multifuncional)
+e reprocessar com outro quando erra, características baratas da imagem
+decidem o perfil: resolução e fabricante (tags DPI/EXIF/TIFF), ruído,
+cor ou cinza e tamanho físico (carteira ou página). A extração roda uma
+única vez com o perfil escolhido, e a decisão vai no resultado
+
+Uso: python ocr_auto.py <imagem_base64> [--dry-run] [opções do script do dispositivo]
+     python ocr_auto.py --file=<imagem> [...]
+"""
+
+import io
+import re
+import sys
+import json
+import time
+import base64
+from contextlib import redirect_stdout
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ocr_bitonal import read_archive
+from ocr_devices import get_extractor
+from ocr_memory import check_input_size, open_image
+from ocr_profile import profiled
+from ocr_quality import ANALYSIS_SIZE, text_regions
+from ocr_stream import NULL_EMITTER, run_streaming
+
+# Limites da escolha (medidos na imagem original ou na cópia reduzida)
+AUTO_THRESHOLDS = {
+    'min_scan_dpi': 150,          # abaixo disso (72/96 dpi): foto ou captura de tela
+    'card_max_mm': 140,           # maior lado de uma carteira digitalizada recortada (RG: 102 mm)
+    'page_min_mm': 180,           # maior lado de uma página (vidro A4: 297 mm)
+    'card_on_glass': 0.35,        # fração da página ocupada pelo texto de uma carteira no vidro
+    'clean_noise': 1.5,           # desvio do ruído (níveis de cinza) de um scanner de alimentação
+    'noisy_noise': 3.0,           # desvio do ruído de um vidro de multifuncional
+    'color_chroma': 24,           # croma (máx - mín dos canais) de um pixel colorido
+    'color_fraction': 0.05        # fração de pixels coloridos de uma digitalização em cores
+}
+
+# Fabricantes nas tags Make/Model/Software (palavras, em minúsculas)
+DEVICE_MAKERS = {
+    'kodak': ('kodak', 'alaris'),
+    'multifunctional': ('hp', 'hewlett', 'canon', 'epson', 'brother', 'xerox', 'ricoh', 'lexmark',
+                        'kyocera', 'samsung', 'sharp', 'konica', 'minolta', 'oki', 'pantum')
+}
+
+# Tags EXIF/TIFF: fabricante, modelo e software; subdiretório EXIF com as tags de câmera
+MAKER_TAGS = (271, 272, 305)
+EXIF_IFD = 0x8769
+CAMERA_TAGS = (33434, 33437, 37386)  # tempo de exposição, abertura, distância focal
+
+# Lado do recorte usado na estimativa de ruído (pixels da imagem original)
+NOISE_PATCH = 512
+
+# Desfoque subtraído do recorte: separa o grão das variações suaves (sombra, iluminação)
+NOISE_BLUR_SIGMA = 3
+
+# Motivo de cada escolha
+SELECTION_REASONS = {
+    'archive': 'Arquivo bitonal gravado com o perfil do dispositivo',
+    'camera': 'Foto de câmera (tags EXIF de exposição)',
+    'maker': 'Fabricante do equipamento nas tags da imagem',
+    'low_dpi': 'Sem resolução de digitalização (foto ou captura de tela)',
+    'evidence': 'Ruído, cor e tamanho da digitalização'
+}
+
+def source_dpi(image):
+    """Resolução horizontal declarada no arquivo (JFIF/EXIF, PNG ou TIFF), None se ausente"""
+    dpi = image.info.get('dpi')
+    if dpi and dpi[0]:
+        return float(dpi[0])
+    return None
+
+def maker_words(exif):
+    """Palavras das tags de fabricante, modelo e software"""
+    text = ' '.join(str(exif.get(tag, '')) for tag in MAKER_TAGS)
+    return set(re.findall(r'[a-z]+', text.lower()))
+
+def estimate_noise(image):
+    """
+    Desvio padrão do ruído (níveis de cinza) no fundo de um recorte central,
+    na resolução original: a redução da cópia de análise apagaria o ruído.
+
+    Mede o grão do papel e do sensor que sobra ao tirar um desfoque leve
+    (sobrevive à compressão JPEG, ao contrário do ruído pixel a pixel); as
+    letras ficam de fora pelo limiar de Otsu.
+    """
+    if image.mode == '1':
+        return 0.0
+    width, height = image.size
+    side = min(NOISE_PATCH, width, height)
+    left, top = (width - side) // 2, (height - side) // 2
+    patch = np.asarray(image.crop((left, top, left + side, top + side)).convert('L'))
+    threshold, _ = cv2.threshold(patch, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    background = patch > threshold
+    if background.mean() < 0.1:
+        # Recorte quase todo escuro (foto, tarja): medir nele inteiro
+        background = np.ones_like(background)
+    patch = patch.astype(np.float32)
+    residual = (patch - cv2.GaussianBlur(patch, (0, 0), NOISE_BLUR_SIGMA))[background]
+    # Desvio pela mediana dos desvios absolutos (1,4826): robusto às bordas que sobram
+    return float(np.median(np.abs(residual - np.median(residual)))) * 1.4826
+
+def color_fraction(small, thresholds):
+    """Fração de pixels coloridos da cópia reduzida (0 para imagens em cinza ou bitonais)"""
+    if small.mode in ('1', 'L', 'LA', 'I', 'I;16', 'F'):
+        return 0.0
+    red, green, blue = (np.asarray(channel) for channel in small.convert('RGB').split())
+    chroma = cv2.subtract(np.maximum(np.maximum(red, green), blue), np.minimum(np.minimum(red, green), blue))
+    return float(np.count_nonzero(chroma >= thresholds['color_chroma'])) / chroma.size
+
+def image_features(image, thresholds=None):
+    """
+    Características baratas da imagem para escolher o perfil.
+
+    Retorna {'dpi', 'size_mm', 'makers', 'camera', 'mode', 'noise',
+    'color_fraction', 'text_fraction'}.
+    """
+    thresholds = dict(AUTO_THRESHOLDS, **(thresholds or {}))
+    width, height = image.size
+    exif = image.getexif()
+    dpi = source_dpi(image)
+    camera = any(tag in exif.get_ifd(EXIF_IFD) for tag in CAMERA_TAGS)
+
+    # Cópia reduzida (como a da verificação de qualidade), mantendo as cores
+    factor = max(1, max(image.size) // ANALYSIS_SIZE)
+    # Imagens bitonais não são reduzidas pelo PIL no modo '1'
+    small = image.convert('L') if image.mode == '1' else image
+    small = small.reduce(factor) if factor > 1 else small
+    scale = ANALYSIS_SIZE / max(small.size)
+    if scale < 1:
+        small = small.resize((max(1, int(small.size[0] * scale)), max(1, int(small.size[1] * scale))),
+                             Image.Resampling.BILINEAR)
+    gray = np.asarray(small.convert('L'))
+
+    # Área ocupada pelo texto: uma carteira no vidro A4 ocupa uma fração pequena da página
+    boxes = text_regions(gray)
+    text_fraction = None
+    if boxes:
+        left = min(x for x, _, _, _ in boxes)
+        top = min(y for _, y, _, _ in boxes)
+        right = max(x + w for x, _, w, _ in boxes)
+        bottom = max(y + h for _, y, _, h in boxes)
+        text_fraction = round((right - left) * (bottom - top) / gray.size, 3)
+
+    return {
+        'dpi': dpi,
+        'size_mm': [round(width / dpi * 25.4), round(height / dpi * 25.4)] if dpi else None,
+        'makers': sorted(maker_words(exif)),
+        'camera': camera,
+        'mode': image.mode,
+        'noise': round(estimate_noise(image), 2),
+        'color_fraction': round(color_fraction(small, thresholds), 3),
+        'text_fraction': text_fraction
+    }
+
+def choose_device(features, archive=None, thresholds=None):
+    """
+    Escolhe o dispositivo a partir das características.
+
+    Tags decidem quando existem (arquivo bitonal, câmera, fabricante);
+    senão ruído, cor e tamanho votam entre Kodak e multifuncional. No
+    empate fica o multifuncional: seu perfil (mediana, desfoque maior)
+    tolera uma imagem limpa melhor do que o da Kodak tolera ruído.
+    Retorna (dispositivo, regra, votos).
+    """
+    thresholds = dict(AUTO_THRESHOLDS, **(thresholds or {}))
+    if archive and archive.get('device') in ('generic', 'kodak', 'multifunctional'):
+        return archive['device'], 'archive', []
+    if features['camera']:
+        return 'generic', 'camera', []
+    for device, makers in DEVICE_MAKERS.items():
+        if set(makers) & set(features['makers']):
+            return device, 'maker', []
+    if not features['dpi'] or features['dpi'] < thresholds['min_scan_dpi']:
+        return 'generic', 'low_dpi', []
+
+    votes = []
+    if features['mode'] == '1' or features['noise'] <= thresholds['clean_noise']:
+        votes.append(('kodak', 'clean'))
+    elif features['noise'] >= thresholds['noisy_noise']:
+        votes.append(('multifunctional', 'noisy'))
+    if features['color_fraction'] >= thresholds['color_fraction']:
+        votes.append(('multifunctional', 'color'))
+    else:
+        votes.append(('kodak', 'grayscale'))
+    longest = max(features['size_mm'])
+    if longest <= thresholds['card_max_mm']:
+        # Carteira recortada no tamanho: scanner de alimentação
+        votes.append(('kodak', 'card_size'))
+    elif (longest >= thresholds['page_min_mm'] and features['text_fraction'] is not None
+          and features['text_fraction'] < thresholds['card_on_glass']):
+        votes.append(('multifunctional', 'card_on_glass'))
+
+    kodak = sum(1 for device, _ in votes if device == 'kodak')
+    device = 'kodak' if kodak > len(votes) - kodak else 'multifunctional'
+    return device, 'evidence', [{'device': voted, 'evidence': evidence} for voted, evidence in votes]
+
+def select_device(image_data, thresholds=None):
+    """Decide o dispositivo de uma imagem em base64; retorna o registro da decisão"""
+    started = time.perf_counter()
+    image = check_input_size(open_image(io.BytesIO(base64.b64decode(image_data))))
+    archive = read_archive(image)
+    features = image_features(image, thresholds)
+    device, rule, votes = choose_device(features, archive, thresholds)
+    return {
+        'device': device,
+        'rule': rule,
+        'reason': SELECTION_REASONS[rule],
+        'votes': votes,
+        'features': features,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def extract_document_data_auto(image_data, emitter=None, **options):
+    """Extrai os dados com o perfil escolhido pelas características da imagem"""
+    emitter = emitter or NULL_EMITTER
+    try:
+        emitter.stage('select_device')
+        selection = select_device(image_data)
+    except Exception as e:
+        print(f"❌ Erro ao analisar a imagem: {str(e)}", file=sys.stderr)
+        result = {
+            'success': False,
+            'error': str(e),
+            'data': {},
+            'raw_text': '',
+            'confidence': 0
+        }
+        emitter.result(result)
+        return result
+
+    print(f"🧭 Perfil escolhido: {selection['device']} ({selection['reason']}, {selection['elapsed_ms']} ms)",
+          file=sys.stderr)
+    emitter.emit('device_selected', selection=selection)
+    extract = get_extractor(selection['device'])
+    result = extract(image_data, emitter=emitter, **options)
+    # device_type: o reprocessamento (ocr_reparse.py) usa o analisador do dispositivo escolhido
+    result['device_type'] = selection['device']
+    result['device_selection'] = selection
+    return result
+
+def main():
+    """Função principal para processar OCR com perfil automático via linha de comando"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    image_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--file=')), None)
+
+    if len(args) != (0 if image_path else 1):
+        print(json.dumps({
+            'success': False,
+            'error': 'Uso: python ocr_auto.py <imagem_base64>|--file=<imagem> [--dry-run] [--bands] [--no-barcode] '
+                     '[--no-quality-gate] [--stream] [--memory-budget=<MB>] [--pdf=<arquivo>] '
+                     '[--tiff=<arquivo.tif>] [--deadline=<segundos>] [--trace=<arquivo.json>] '
+                     '[--trace-mode=sample|cprofile]'
+        }))
+        sys.exit(1)
+
+    try:
+        if image_path:
+            with open(image_path, 'rb') as f:
+                image_data = base64.b64encode(f.read()).decode('ascii')
+        else:
+            image_data = args[0]
+
+        if '--dry-run' in flags:
+            # Só a decisão, sem OCR
+            print(json.dumps(select_device(image_data), ensure_ascii=False, indent=2))
+            return
+
+        options = {
+            'bands': '--bands' in flags,
+            'barcode': '--no-barcode' not in flags,
+            'quality_gate': '--no-quality-gate' not in flags
+        }
+
+        # Orçamento de memória por requisição (MB)
+        memory_budget = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--memory-budget=')), None)
+        if memory_budget:
+            options['memory_budget_mb'] = float(memory_budget)
+
+        # PDF pesquisável e imagem binarizada gravados na mesma execução do OCR
+        pdf_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--pdf=')), None)
+        if pdf_path:
+            options['pdf_path'] = pdf_path
+        tiff_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--tiff=')), None)
+        if tiff_path:
+            options['tiff_path'] = tiff_path
+
+        # Prazo da requisição: o Tesseract é encerrado ao esgotá-lo
+        deadline = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--deadline=')), None)
+        if deadline:
+            options['deadline_seconds'] = float(deadline)
+
+        # Perfil da requisição (trace de etapas e pilhas): só quando pedido
+        extract = extract_document_data_auto
+        trace_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--trace=')), None)
+        if trace_path:
+            trace_mode = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--trace-mode=')), 'sample')
+            extract = profiled(extract, trace_path, trace_mode)
+
+        if '--stream' in flags:
+            # Eventos NDJSON linha a linha (escolha do perfil, etapas, campos e resultado)
+            run_streaming(extract, image_data, **options)
+        else:
+            # Prints dos scripts de dispositivo vão para o stderr; stdout só tem o resultado
+            with redirect_stdout(sys.stderr):
+                result = extract(image_data, **options)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
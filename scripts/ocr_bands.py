@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR em faixas paralelas para documentos de página inteira
+Divide a imagem binarizada em faixas de texto e executa o Tesseract
+em paralelo, remontando o texto na ordem de leitura
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ocr_deadline import NO_DEADLINE, DeadlineExceeded, is_tesseract_timeout
+from ocr_outputs import ocr_multi_output, run_renderers
+from ocr_threads import current_thread_budget
+
+# Altura mínima (pixels) para valer a pena dividir a página
+MIN_PAGE_HEIGHT_FOR_BANDS = 1200
+
+# Número mínimo de linhas vazias consecutivas para separar faixas
+MIN_BAND_GAP = 6
+
+# Margem adicionada acima e abaixo de cada faixa
+BAND_MARGIN = 4
+
+def detect_text_bands(image, min_gap=MIN_BAND_GAP, margin=BAND_MARGIN):
+    """Detecta faixas horizontais de texto por projeção de tinta nas linhas"""
+    gray = np.asarray(image.convert('L') if image.mode != 'L' else image)
+    height, width = gray.shape[:2]
+
+    # Projeção horizontal: quantidade de pixels escuros por linha
+    ink_per_row = np.count_nonzero(gray < 128, axis=1)
+    has_ink = ink_per_row > max(1, width // 500)
+
+    bands = []
+    start = None
+    last_ink = None
+    for row in np.flatnonzero(has_ink):
+        if start is None:
+            start = row
+        elif row - last_ink > min_gap:
+            bands.append((start, last_ink + 1))
+            start = row
+        last_ink = row
+    if start is not None:
+        bands.append((start, last_ink + 1))
+
+    return [(max(0, int(top) - margin), min(height, int(bottom) + margin)) for top, bottom in bands]
+
+def group_bands(bands, chunks):
+    """Agrupa faixas consecutivas em blocos de altura semelhante"""
+    if not bands or chunks <= 1:
+        return [(bands[0][0], bands[-1][1])] if bands else []
+
+    total_height = sum(bottom - top for top, bottom in bands)
+    target = total_height / chunks
+
+    groups = []
+    group_top, group_height = bands[0][0], 0
+    for index, (top, bottom) in enumerate(bands):
+        group_height += bottom - top
+        is_last = index == len(bands) - 1
+        if is_last or (group_height >= target and len(groups) < chunks - 1):
+            groups.append((group_top, bottom))
+            if not is_last:
+                group_top, group_height = bands[index + 1][0], 0
+
+    return groups
+
+def ocr_with_fallback(image, config, langs=('por', 'eng'), deadline=None, threads=None):
+    """Executa o Tesseract tentando os idiomas na ordem informada (threads: limite OpenMP deste processo)"""
+    deadline = deadline or NO_DEADLINE
+    for index, lang in enumerate(langs):
+        try:
+            return run_renderers(image, config, lang, ['txt'], deadline.tesseract_timeout(), threads)['txt']
+        except Exception as e:
+            # Tempo esgotado: o Tesseract já foi encerrado, sem tentar outro idioma
+            if is_tesseract_timeout(e):
+                raise DeadlineExceeded('ocr')
+            if isinstance(e, DeadlineExceeded) or index == len(langs) - 1:
+                raise
+
+def ocr_image_in_bands(image, config, langs=('por', 'eng'), max_workers=None, on_text=None, words=None,
+                       deadline=None):
+    """
+    Executa OCR da página dividida em faixas, em paralelo.
+
+    Cada bloco roda em um processo próprio do Tesseract; as threads apenas
+    aguardam os processos filhos, então não há disputa pelo GIL nem cópia
+    da imagem entre processos Python. Páginas pequenas (cartões) ou sem
+    faixas detectáveis seguem pelo caminho tradicional de uma única chamada.
+
+    Por padrão usa as threads reservadas para este worker no orçamento de
+    threads, com um núcleo (OMP_THREAD_LIMIT=1 no ambiente de cada processo
+    do Tesseract, sem mexer no os.environ) por faixa.
+
+    Se on_text for informado, é chamado com o texto acumulado a cada faixa
+    concluída em ordem de leitura (usado pelo modo streaming).
+
+    Se words for uma lista, cada faixa também gera o TSV na mesma execução
+    do Tesseract e as palavras são acrescentadas nas coordenadas da página.
+
+    Com prazo, cada processo do Tesseract recebe o tempo restante; ao
+    esgotá-lo, DeadlineExceeded leva o texto das faixas já concluídas.
+    """
+    max_workers = max_workers or current_thread_budget()['threads_per_worker']
+
+    def recognize(crop, top=0, threads=None):
+        if words is None:
+            return ocr_with_fallback(crop, config, langs, deadline, threads), []
+        output = ocr_multi_output(crop, config, langs, offset_top=top, deadline=deadline, threads=threads)
+        return output['text'], output['words']
+
+    groups = []
+    if image.size[1] >= MIN_PAGE_HEIGHT_FOR_BANDS and max_workers > 1:
+        groups = group_bands(detect_text_bands(image), max_workers)
+
+    if len(groups) < 2:
+        text, page_words = recognize(image)
+        if words is not None:
+            words.extend(page_words)
+        return text
+
+    width = image.size[0]
+    crops = [image.crop((0, top, width, bottom)) for top, bottom in groups]
+
+    print(f"🧩 OCR em {len(crops)} faixas paralelas ({max_workers} workers)", file=sys.stderr)
+
+    # As faixas já estão em ordem de leitura (de cima para baixo)
+    texts = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(crops))) as executor:
+        try:
+            for text, band_words in executor.map(recognize, crops, [top for top, _ in groups], [1] * len(crops)):
+                if words is not None:
+                    words.extend(band_words)
+                if text.strip():
+                    texts.append(text.strip('\n'))
+                    if on_text:
+                        on_text('\n'.join(texts))
+        except DeadlineExceeded as e:
+            raise DeadlineExceeded(e.stage, '\n'.join(texts))
+
+    return '\n'.join(texts)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura rápida de QR code e código de barras antes do OCR
+CNH/CNH-e e outros documentos trazem os dados em QR code; decodificá-lo
+leva milissegundos, contra segundos do Tesseract
+"""
+
+import sys
+import json
+import re
+
+import cv2
+import numpy as np
+
+# Maior lado das cópias reduzidas usadas na detecção, da mais barata à mais fina
+DETECTION_MAX_SIDES = (1280, 2560)
+
+# Campos que, encontrados no código, dispensam o OCR completo
+REQUIRED_FIELDS = ('nome', 'cpf', 'nascimento')
+
+# Resultado quando a leitura de códigos está desativada
+NO_CODES = {'payloads': [], 'data': {}, 'complete': False}
+
+# Chaves conhecidas nos payloads -> (rótulo entendido pelos parsers, campo)
+PAYLOAD_LABELS = {
+    'nome': ('NOME', 'nome'),
+    'nome_completo': ('NOME', 'nome'),
+    'nomecompleto': ('NOME', 'nome'),
+    'cpf': ('CPF', 'cpf'),
+    'rg': ('RG', 'rg'),
+    'identidade': ('RG', 'rg'),
+    'registro': ('REGISTRO', 'rg'),
+    'nascimento': ('NASCIMENTO', 'nascimento'),
+    'data_nascimento': ('NASCIMENTO', 'nascimento'),
+    'datanascimento': ('NASCIMENTO', 'nascimento'),
+    'dt_nasc': ('NASCIMENTO', 'nascimento'),
+    'dtnasc': ('NASCIMENTO', 'nascimento'),
+    'mae': ('MÃE', 'mae'),
+    'nome_mae': ('MÃE', 'mae'),
+    'nomemae': ('MÃE', 'mae'),
+    'filiacao_mae': ('MÃE', 'mae'),
+    'pai': ('PAI', 'pai'),
+    'nome_pai': ('PAI', 'pai'),
+    'nomepai': ('PAI', 'pai'),
+    'filiacao_pai': ('PAI', 'pai'),
+    'naturalidade': ('NATURAL DE', 'naturalidade'),
+    'nasc': ('NASCIMENTO', 'nascimento'),
+    'sexo': ('SEXO', 'sexo')
+}
+
+def _downscale(gray, max_side):
+    """Cria cópia reduzida para detecção"""
+    height, width = gray.shape[:2]
+    scale = max_side / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    return gray
+
+def _decoded_strings(result):
+    """Extrai os textos decodificados (o formato do retorno varia entre versões do OpenCV)"""
+    strings = []
+    for item in result if isinstance(result, tuple) else (result,):
+        if isinstance(item, str) and item:
+            strings.append(item)
+        elif isinstance(item, (list, tuple)):
+            strings.extend(value for value in item if isinstance(value, str) and value)
+    return strings
+
+def _detect_codes_at(gray):
+    """Detecta e decodifica QR codes e códigos de barras em uma cópia"""
+    payloads = []
+
+    try:
+        payloads.extend(_decoded_strings(cv2.QRCodeDetector().detectAndDecodeMulti(gray)))
+    except cv2.error:
+        pass
+
+    if hasattr(cv2, 'barcode'):
+        try:
+            payloads.extend(_decoded_strings(cv2.barcode.BarcodeDetector().detectAndDecodeMulti(gray)))
+        except cv2.error:
+            pass
+
+    return payloads
+
+def detect_codes(image):
+    """Detecta códigos na imagem, da cópia mais reduzida para a maior"""
+    gray = np.array(image.convert('L') if image.mode != 'L' else image)
+
+    for max_side in DETECTION_MAX_SIDES:
+        payloads = _detect_codes_at(_downscale(gray, max_side))
+        if payloads or max(gray.shape[:2]) <= max_side:
+            return payloads
+
+    return []
+
+def _strip_accents_key(key):
+    """Normaliza chave do payload (minúsculas, sem acentos e separadores)"""
+    key = key.strip().lower()
+    for accented, plain in (('ã', 'a'), ('á', 'a'), ('â', 'a'), ('é', 'e'), ('ê', 'e'),
+                            ('í', 'i'), ('ó', 'o'), ('ô', 'o'), ('õ', 'o'), ('ú', 'u'), ('ç', 'c')):
+        key = key.replace(accented, plain)
+    return re.sub(r'[\s\-\.]+', '_', key)
+
+def payload_to_lines(payload):
+    """Converte o payload (JSON ou CHAVE: valor) em pares (linha rotulada, campo)"""
+    pairs = []
+
+    try:
+        decoded = json.loads(payload)
+        if isinstance(decoded, dict):
+            pairs = [(key, value) for key, value in decoded.items() if isinstance(value, (str, int))]
+    except ValueError:
+        for segment in re.split(r'[\n;|]', payload):
+            match = re.match(r'\s*([^:=]+?)\s*[:=]\s*(.+)', segment)
+            if match:
+                pairs.append((match.group(1), match.group(2)))
+
+    lines = []
+    for key, value in pairs:
+        known = PAYLOAD_LABELS.get(_strip_accents_key(str(key)))
+        if known:
+            label, field = known
+            # Datas ISO (AAAA-MM-DD) para o formato brasileiro
+            value = re.sub(r'^(\d{4})-(\d{2})-(\d{2})$', r'\3/\2/\1', str(value).strip())
+            lines.append((f"{label}: {value}", field))
+    return lines
+
+def parse_code_payload(payload, parse_text):
+    """
+    Converte o payload em campos usando o parser de texto do script.
+
+    Só payloads rotulados (JSON ou CHAVE: valor): os campos do código
+    prevalecem sobre o OCR, e os palpites do parser de texto livre sobre um
+    payload sem rótulos (sexo, RG, telefone) não merecem essa confiança
+    """
+    data = {}
+    # Cada campo isolado, para um rótulo não invadir o valor do outro
+    for line, field in payload_to_lines(payload):
+        value = parse_text(line).get(field)
+        if value:
+            data.setdefault(field, value)
+    return data
+
+def decode_document_codes(image, parse_text):
+    """
+    Primeira etapa do pipeline: tenta ler os dados do documento pelos códigos.
+
+    Retorna um dicionário com os payloads encontrados, os campos extraídos e
+    se os campos obrigatórios já estão completos (OCR pode ser dispensado).
+    """
+    payloads = detect_codes(image)
+    data = {}
+    for payload in payloads:
+        for field, value in parse_code_payload(payload, parse_text).items():
+            data.setdefault(field, value)
+
+    if payloads:
+        print(f"🔳 {len(payloads)} código(s) lido(s), {len(data)} campo(s) extraído(s)", file=sys.stderr)
+
+    return {
+        'payloads': payloads,
+        'data': data,
+        'complete': all(data.get(field) for field in REQUIRED_FIELDS)
+    }
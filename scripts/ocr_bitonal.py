@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Arquivo bitonal das digitalizações pré-processadas (TIFF CCITT Grupo 4)
+A imagem binarizada entregue ao Tesseract é gravada com 1 bit por pixel e
+compressão Grupo 4 (dezenas de KB por página), com o dispositivo, o perfil
+e o tamanho da imagem original na descrição do TIFF. Lido de volta, o
+arquivo dispensa o pré-processamento: o reprocessamento (novo OCR, ajuste
+de regras) parte direto da imagem binária
+
+Uso: python ocr_bitonal.py <arquivo.tif> [...]   (metadados e tamanho de cada arquivo)
+"""
+
+import os
+import sys
+import json
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ocr_outputs import page_output_path
+
+# Compressões CCITT aceitas como entrada (a gravação usa sempre Grupo 4)
+BITONAL_COMPRESSIONS = ('group4', 'group3')
+
+# Tag TIFF ImageDescription: metadados do processamento (JSON)
+DESCRIPTION_TAG = 270
+
+def to_bitonal(image):
+    """
+    Imagem convertida para 1 bit por pixel, sem pontilhamento.
+
+    Limiar de Otsu, como o Tesseract faz internamente: imagens já binárias
+    (Kodak, multifuncional) ficam iguais; as em cinza (genérico) ficam como
+    o Tesseract as enxerga.
+    """
+    if image.mode == '1':
+        return image
+    gray = np.asarray(image.convert('L') if image.mode != 'L' else image)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return Image.fromarray(binary).convert('1', dither=Image.Dither.NONE)
+
+def save_bitonal_tiff(image, path, source_size, device, profile=None, source_dpi=None):
+    """
+    Grava a imagem binarizada como TIFF Grupo 4.
+
+    source_size: (largura, altura) da imagem original, para levar as caixas
+    das palavras de volta às coordenadas dela ao reprocessar.
+    Retorna {'path', 'bytes', 'width', 'height'}.
+    """
+    bitonal = to_bitonal(image)
+    metadata = {
+        'device': device,
+        'source_size': list(source_size),
+        'profile': profile
+    }
+    options = {'compression': 'group4', 'tiffinfo': {DESCRIPTION_TAG: json.dumps(metadata)}}
+    if source_dpi:
+        # Resolução da imagem ampliada pelo pré-processamento
+        factor = bitonal.size[0] / source_size[0]
+        options['dpi'] = tuple(round(value * factor) for value in source_dpi)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    bitonal.save(path, format='TIFF', **options)
+    return {
+        'path': os.path.abspath(path),
+        'bytes': os.path.getsize(path),
+        'width': bitonal.size[0],
+        'height': bitonal.size[1]
+    }
+
+def read_archive(image):
+    """
+    Metadados se a imagem for um arquivo bitonal (TIFF CCITT de 1 bit), senão None.
+
+    TIFFs Grupo 4 de outras origens (scanners que já entregam bitonal) também
+    são aceitos: sem descrição, a própria imagem é a original.
+    """
+    if image.format != 'TIFF' or image.mode != '1' or image.info.get('compression') not in BITONAL_COMPRESSIONS:
+        return None
+    try:
+        metadata = json.loads(image.tag_v2.get(DESCRIPTION_TAG, ''))
+    except ValueError:
+        metadata = None
+    if not isinstance(metadata, dict) or 'source_size' not in metadata:
+        metadata = {'device': None, 'source_size': list(image.size), 'profile': None}
+    return metadata
+
+def archive_path(directory, page):
+    """Caminho do arquivo bitonal de uma página de lote"""
+    return page_output_path(directory, page, '.tif')
+
+def main():
+    """Mostra os metadados e o tamanho dos arquivos bitonais informados"""
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not paths:
+        print(json.dumps({'success': False, 'error': 'Uso: python ocr_bitonal.py <arquivo.tif> [...]'}))
+        sys.exit(1)
+
+    for path in paths:
+        with Image.open(path) as image:
+            metadata = read_archive(image)
+            size = image.size
+        print(json.dumps({'path': path, 'bitonal': metadata is not None, 'size': list(size),
+                          'bytes': os.path.getsize(path), 'metadata': metadata}, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
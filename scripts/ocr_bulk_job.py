@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job de OCR em lote para livros de registro (nascimento, casamento, óbito)
+Processa um manifesto de páginas com um pool de workers, grava cada
+resultado num diário (journal) em disco e retoma de onde parou após
+queda ou reinício, sem refazer páginas concluídas
+
+Manifesto: arquivo texto com um caminho de imagem por linha (linhas vazias
+e iniciadas por # são ignoradas; caminhos relativos ao manifesto) ou uma
+pasta com as imagens
+
+Uso: python ocr_bulk_job.py <manifesto> --journal livro_A12.jsonl --device kodak
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import importlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from ocr_bitonal import archive_path
+from ocr_devices import DEVICES
+from ocr_outputs import page_output_path
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# Intervalo mínimo entre linhas de progresso (segundos)
+PROGRESS_INTERVAL = 10
+
+# Estado de cada processo worker
+_worker = {}
+
+def load_manifest(manifest):
+    """Lista os caminhos das páginas, na ordem do manifesto"""
+    if os.path.isdir(manifest):
+        return [
+            os.path.join(manifest, filename) for filename in sorted(os.listdir(manifest))
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+        ]
+
+    base = os.path.dirname(os.path.abspath(manifest))
+    pages = []
+    with open(manifest, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                pages.append(line if os.path.isabs(line) else os.path.join(base, line))
+    return pages
+
+def load_journal(path):
+    """
+    Lê o diário e retorna {página: registro}.
+
+    Uma última linha truncada (queda durante a escrita) é ignorada; a página
+    correspondente volta a ser processada.
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            done[record['page']] = record
+    return done
+
+class Journal:
+    """Diário só de acréscimo; cada registro é gravado em disco (fsync) antes de seguir"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        self._lock()
+
+        # Completar linha truncada por uma queda, para o próximo registro começar limpo
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() > 0:
+            self.file.seek(-1, os.SEEK_END)
+            if self.file.read(1) != b'\n':
+                self.file.write(b'\n')
+
+    def _lock(self):
+        """Impede dois jobs gravando no mesmo diário"""
+        try:
+            import fcntl
+        except ImportError:
+            return
+        try:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            raise RuntimeError(f"Diário {self.file.name} já está em uso por outro job")
+
+    def append(self, record):
+        """Acrescenta um registro e o torna durável"""
+        self.file.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+def _init_worker(device, workers, options):
+    """Carrega o módulo do dispositivo uma vez por worker"""
+    from ocr_threads import apply_thread_budget
+
+    module_name, function_name = DEVICES[device]
+    with redirect_stdout(sys.stderr):
+        module = importlib.import_module(module_name)
+
+    # Orçamento de threads dividido entre os workers do job
+    apply_thread_budget(workers)
+
+    _worker['extract'] = getattr(module, function_name)
+    _worker['options'] = options
+
+def process_page(page):
+    """Executa o OCR de uma página (no processo worker)"""
+    started = time.perf_counter()
+    options = dict(_worker['options'])
+    pdf_dir = options.pop('pdf_dir', None)
+    if pdf_dir:
+        # PDF pesquisável de cada página, para o arquivo digital
+        options['pdf_path'] = page_output_path(pdf_dir, page, '.pdf')
+    tiff_dir = options.pop('tiff_dir', None)
+    if tiff_dir:
+        # Imagem binarizada em TIFF Grupo 4: reprocessar o livro sem o original colorido
+        options['tiff_path'] = archive_path(tiff_dir, page)
+    extract = _worker['extract']
+    trace_dir = options.pop('trace_dir', None)
+    trace_mode = options.pop('trace_mode', 'sample')
+    if trace_dir:
+        # Perfil de cada página (etapas e pilhas), para investigar páginas lentas
+        from ocr_profile import profiled
+        extract = profiled(extract, page_output_path(trace_dir, page, '.trace.json'), trace_mode)
+    try:
+        with open(page, 'rb') as f:
+            image_data = base64.b64encode(f.read()).decode('ascii')
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            result = extract(image_data, **options)
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+
+    return {
+        'page': page,
+        'success': bool(result.get('success')),
+        'result': result,
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'finished_at': datetime.now().isoformat(timespec='seconds')
+    }
+
+def format_eta(seconds):
+    """Formata a estimativa de término (h:mm:ss)"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class Progress:
+    """Vazão (páginas/min) e estimativa de término da execução atual"""
+
+    def __init__(self, total, already_done):
+        self.total = total
+        self.done = already_done
+        self.processed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.last_report = 0.0
+        # Saída capturada na criação (o pipeline silencia o stdout durante o job)
+        self.output = sys.stdout
+
+    def update(self, record):
+        self.done += 1
+        self.processed += 1
+        self.failed += not record['success']
+
+    def pages_per_minute(self):
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed * 60 if elapsed > 0 else 0.0
+
+    def report(self, force=False):
+        """Imprime o progresso no máximo a cada PROGRESS_INTERVAL segundos"""
+        now = time.monotonic()
+        if not force and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+
+        rate = self.pages_per_minute()
+        remaining = self.total - self.done
+        eta = format_eta(remaining / rate * 60) if rate else '--:--:--'
+        print(f"📊 {self.done}/{self.total} páginas ({self.done / self.total:.1%}) | "
+              f"{rate:.1f} páginas/min | falhas {self.failed} | ETA {eta}", file=self.output, flush=True)
+
+def _pool_records(pending, device, workers, options):
+    """Processa as páginas com um pool de processos idênticos"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(device, workers, options)) as executor:
+        queue = iter(pending)
+        running = set()
+        while True:
+            # Janela limitada de páginas em andamento (não enfileira o livro inteiro)
+            for page in queue:
+                running.add(executor.submit(process_page, page))
+                if len(running) >= workers * 2:
+                    break
+            if not running:
+                break
+
+            completed, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in completed:
+                yield future.result()
+
+def _pipeline_records(pending, device, stage_workers, options):
+    """Processa as páginas pelo pipeline em etapas (ocr_pipeline.py)"""
+    from ocr_pipeline import create_pipeline
+
+    options = {key: value for key, value in options.items() if key != 'bands'}
+    pipeline = create_pipeline(device, stage_workers, **options)
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for item in pipeline.run({'path': page} for page in pending):
+            yield {
+                'page': item['path'],
+                'success': bool(item['result'].get('success')),
+                'result': item['result'],
+                'finished_at': datetime.now().isoformat(timespec='seconds')
+            }
+
+    stats = pipeline.stats()
+    print(f"🧵 Utilização por etapa (gargalo: {stats['bottleneck']}): " + ', '.join(
+        f"{name} {stage['utilization']:.0%} x{stage['workers']}" for name, stage in stats['stages'].items()))
+
+def run_job(pages, journal_path, device, workers, options, retry_failed=False, stage_workers=None):
+    """
+    Processa as páginas pendentes e grava cada resultado no diário.
+
+    Com stage_workers (dicionário, pode ser vazio), usa o pipeline em etapas
+    em vez do pool de processos.
+    """
+    done = load_journal(journal_path)
+    finished = {page for page, record in done.items() if record['success'] or not retry_failed}
+    pending = [page for page in pages if page not in finished]
+    progress = Progress(len(pages), len(pages) - len(pending))
+
+    if finished:
+        print(f"🔁 Retomando: {len(pages) - len(pending)} páginas já concluídas, {len(pending)} pendentes")
+    if not pending:
+        return progress
+
+    if stage_workers is not None:
+        records = _pipeline_records(pending, device, stage_workers, options)
+    else:
+        records = _pool_records(pending, device, workers, options)
+
+    journal = Journal(journal_path)
+    try:
+        for record in records:
+            journal.append(record)
+            progress.update(record)
+            if not record['success']:
+                print(f"⚠️ Falha em {record['page']}: {record['result'].get('error')}", file=progress.output)
+            progress.report()
+    finally:
+        journal.close()
+
+    progress.report(force=True)
+    return progress
+
+def main():
+    """Função principal do job em lote"""
+    parser = argparse.ArgumentParser(description='Job de OCR em lote com retomada após queda')
+    parser.add_argument('manifest', help='Arquivo com um caminho de imagem por linha, ou uma pasta')
+    parser.add_argument('--journal', help='Diário de resultados (padrão: <manifesto>.journal.jsonl)')
+    parser.add_argument('--device', choices=sorted(DEVICES), default='generic')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--bands', action='store_true', help='OCR por faixas de texto (páginas inteiras)')
+    parser.add_argument('--no-barcode', action='store_true')
+    parser.add_argument('--no-quality-gate', action='store_true', help='Não recusar imagens ilegíveis antes do OCR')
+    parser.add_argument('--memory-budget', type=float, help='Orçamento de memória por página (MB)')
+    parser.add_argument('--pdf-dir', help='Pasta para o PDF pesquisável de cada página')
+    parser.add_argument('--tiff-dir', help='Pasta para a imagem binarizada (TIFF Grupo 4) de cada página')
+    parser.add_argument('--trace-dir', help='Pasta para o perfil (trace) de cada página')
+    parser.add_argument('--trace-mode', choices=('sample', 'cprofile'), default='sample')
+    parser.add_argument('--retry-failed', action='store_true', help='Reprocessar páginas que falharam')
+    parser.add_argument('--pipeline', nargs='?', const='', metavar='ETAPAS',
+                        help='Usar o pipeline em etapas; opcionalmente decode:1,preprocess:2,ocr:4,parse:1')
+    args = parser.parse_args()
+
+    pages = load_manifest(args.manifest)
+    if not pages:
+        print(f"❌ Nenhuma página em {args.manifest}")
+        sys.exit(1)
+
+    journal_path = args.journal or args.manifest.rstrip('/\\') + '.journal.jsonl'
+    options = {'bands': args.bands, 'barcode': not args.no_barcode, 'quality_gate': not args.no_quality_gate}
+    if args.memory_budget:
+        options['memory_budget_mb'] = args.memory_budget
+    if args.pdf_dir:
+        options['pdf_dir'] = args.pdf_dir
+    if args.tiff_dir:
+        options['tiff_dir'] = args.tiff_dir
+    if args.trace_dir:
+        if args.pipeline is not None:
+            parser.error('--trace-dir não se aplica ao --pipeline (as etapas de uma página rodam em threads diferentes)')
+        options.update(trace_dir=args.trace_dir, trace_mode=args.trace_mode)
+
+    if args.device == 'auto' and args.pipeline is not None:
+        parser.error('--device auto não se aplica ao --pipeline (as etapas são montadas para um único dispositivo)')
+
+    stage_workers = None
+    if args.pipeline is not None:
+        from ocr_pipeline import parse_workers
+        stage_workers = parse_workers(args.pipeline)
+
+    print(f"📚 {len(pages)} páginas, {args.workers} workers, diário {journal_path}")
+    try:
+        progress = run_job(pages, journal_path, args.device, args.workers, options, args.retry_failed,
+                           stage_workers)
+    except KeyboardInterrupt:
+        print("⏸️ Interrompido; execute novamente para retomar do diário")
+        sys.exit(130)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"✅ Job concluído: {progress.done}/{progress.total} páginas, "
+          f"{progress.processed} nesta execução, {progress.failed} falhas")
+
+if __name__ == '__main__':
+    main()
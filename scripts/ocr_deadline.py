@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prazo (deadline) por requisição
+Verificado no início de cada etapa e repassado ao Tesseract como tempo
+limite: ao estourar, o processo do Tesseract é encerrado e a requisição
+devolve um resultado parcial estruturado em vez de ocupar a CPU à toa
+"""
+
+import os
+import time
+
+# Prazo padrão por requisição (segundos); vazio = sem prazo
+DEFAULT_DEADLINE_SECONDS = os.environ.get('OCR_DEADLINE_SECONDS')
+
+# Menor tempo limite repassado ao Tesseract (pytesseract trata 0 como "sem limite")
+MIN_TESSERACT_TIMEOUT = 0.05
+
+class DeadlineExceeded(Exception):
+    """Prazo da requisição esgotado; guarda a etapa e o texto parcial"""
+
+    def __init__(self, stage, partial_text=''):
+        super().__init__(f"Tempo limite da requisição esgotado na etapa '{stage}'")
+        self.stage = stage
+        self.partial_text = partial_text
+
+class Deadline:
+    """Instante limite de uma requisição (sem prazo se seconds for None)"""
+
+    def __init__(self, seconds=None):
+        seconds = seconds if seconds is not None else DEFAULT_DEADLINE_SECONDS
+        self.seconds = float(seconds) if seconds else None
+        self.expires = time.monotonic() + self.seconds if self.seconds else None
+
+    def remaining(self):
+        """Segundos restantes (None sem prazo)"""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def check(self, stage):
+        """Interrompe a requisição se o prazo já passou"""
+        if self.expires is not None and time.monotonic() >= self.expires:
+            raise DeadlineExceeded(stage)
+
+    def tesseract_timeout(self, stage='ocr'):
+        """Tempo limite para o próximo processo do Tesseract (0 = sem limite)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return 0
+        if remaining <= 0:
+            raise DeadlineExceeded(stage)
+        return max(MIN_TESSERACT_TIMEOUT, remaining)
+
+# Requisições sem prazo
+NO_DEADLINE = Deadline(0)
+
+def is_tesseract_timeout(error):
+    """Erro do pytesseract ao encerrar o Tesseract por tempo limite"""
+    return isinstance(error, RuntimeError) and 'timeout' in str(error).lower()
+
+def timeout_result(error, deadline, data=None, raw_text=''):
+    """Resultado estruturado de requisição interrompida pelo prazo"""
+    return {
+        'success': False,
+        'timeout': True,
+        'error': str(error),
+        'stage': error.stage,
+        'deadline_seconds': deadline.seconds,
+        'data': data or {},
+        'raw_text': raw_text or error.partial_text,
+        'partial': bool(data) or bool(raw_text or error.partial_text)
+    }
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detecção de quase-duplicatas por hash perceptual
+Reaproveita o resultado quando o atendente redigitaliza o mesmo documento
+(cada redigitalização difere em alguns pixels, então cache por bytes não serve)
+
+O hash de 64 bits só vê o leiaute: carteiras de pessoas diferentes no mesmo
+modelo têm o mesmo hash. Ele apenas aponta candidatos; um resultado anterior
+só é usado depois de conferir o texto (região das linhas de texto, alinhada
+e comparada pixel a pixel em blocos)
+"""
+
+import io
+import time
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from ocr_quality import analysis_copy, text_regions
+
+# Distância de Hamming máxima (em 64 bits) para considerar a mesma imagem
+DEFAULT_MAX_DISTANCE = 6
+
+# Janela de tempo em que um resultado anterior ainda é reaproveitado
+DEFAULT_WINDOW_SECONDS = 600
+
+# Quantidade máxima de documentos mantidos no índice
+DEFAULT_MAX_ENTRIES = 2000
+
+# Conferência do conteúdo: maior largura da imagem comparada (pixels), margem em
+# volta das linhas de texto e lado dos blocos comparados
+CONTENT_MAX_WIDTH = 1600
+CONTENT_MARGIN = 24
+CONTENT_TILE = 32
+
+# Fração máxima de tinta sem correspondência em um bloco: redigitalizações do mesmo
+# documento ficam perto de 0,02; um dígito ou nome diferente passa de 0,15
+MAX_TILE_MISMATCH = 0.08
+
+# Tinta mínima (pixels) para um bloco entrar na comparação
+MIN_TILE_INK = 30
+
+# Candidatos do hash conferidos por busca (cada conferência custa dezenas de ms)
+MAX_VERIFIED_CANDIDATES = 3
+
+def dhash(image, hash_size=8):
+    """
+    Hash de diferença (dHash) sobre uma miniatura normalizada.
+
+    Escala de cinza + autocontraste tornam o hash estável a variações de
+    brilho entre digitalizações; cada bit indica se um pixel é mais claro
+    que o vizinho da direita.
+    """
+    # JPEG: decodificar já reduzido (muito mais barato que a imagem inteira)
+    image.draft('L', (hash_size * 16, hash_size * 16))
+    thumb = ImageOps.autocontrast(image.convert('L')).resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = list(thumb.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def dhash_from_bytes(image_bytes):
+    """dHash direto dos bytes da imagem"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return dhash(image)
+
+def content_reference(image):
+    """
+    Recorte em cinza das linhas de texto (com margem), na escala de comparação.
+
+    A escala depende só da largura da imagem: redigitalizações do mesmo
+    documento ficam na mesma escala. None se não houver linhas de texto.
+    """
+    gray = analysis_copy(image)
+    boxes = text_regions(gray)
+    if not boxes:
+        return None
+
+    scale = min(1.0, CONTENT_MAX_WIDTH / image.size[0])
+    full = image.convert('L')
+    if scale < 1:
+        full = full.resize((max(1, int(image.size[0] * scale)), max(1, int(image.size[1] * scale))),
+                           Image.Resampling.BOX)
+    pixels = np.asarray(full)
+    ratio = full.size[0] / gray.shape[1]
+    left = max(0, int(min(x for x, _, _, _ in boxes) * ratio) - CONTENT_MARGIN)
+    top = max(0, int(min(y for _, y, _, _ in boxes) * ratio) - CONTENT_MARGIN)
+    right = min(pixels.shape[1], int(max(x + w for x, _, w, _ in boxes) * ratio) + 1 + CONTENT_MARGIN)
+    bottom = min(pixels.shape[0], int(max(y + h for _, y, _, h in boxes) * ratio) + 1 + CONTENT_MARGIN)
+    return pixels[top:bottom, left:right].copy()
+
+def fingerprint_from_bytes(image_bytes):
+    """(dHash, recorte do texto) dos bytes da imagem"""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        reference = content_reference(image)
+    return dhash_from_bytes(image_bytes), reference
+
+def ink(gray):
+    """Tinta (1) e fundo (0) pelo limiar de Otsu"""
+    _, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    return binary
+
+def content_mismatch(reference, candidate):
+    """
+    Pior fração de tinta sem correspondência entre dois recortes de texto.
+
+    O candidato é alinhado ao recorte de referência (ECC: deslocamento e
+    rotação do documento no vidro); cada tinta precisa de uma tinta a até
+    1 pixel na outra imagem. 1.0 se o alinhamento falhar.
+    """
+    warp = np.eye(2, 3, dtype=np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+    try:
+        _, warp = cv2.findTransformECC(reference.astype(np.float32), candidate.astype(np.float32), warp,
+                                       cv2.MOTION_EUCLIDEAN, criteria, None, 5)
+    except cv2.error:
+        return 1.0
+    aligned = cv2.warpAffine(candidate, warp, (reference.shape[1], reference.shape[0]),
+                             flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE)
+
+    first, second = ink(reference), ink(aligned)
+    kernel = np.ones((3, 3), np.uint8)
+    unmatched = (first & (1 - cv2.dilate(second, kernel))) + (second & (1 - cv2.dilate(first, kernel)))
+    height, width = first.shape
+    worst = 0.0
+    for top in range(0, height, CONTENT_TILE):
+        for left in range(0, width, CONTENT_TILE):
+            tile = (slice(top, top + CONTENT_TILE), slice(left, left + CONTENT_TILE))
+            total = int(first[tile].sum()) + int(second[tile].sum())
+            if total >= MIN_TILE_INK:
+                worst = max(worst, int(unmatched[tile].sum()) / total)
+    return round(worst, 3)
+
+def hamming(a, b):
+    """Distância de Hamming entre dois hashes"""
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """Árvore BK sobre distância de Hamming: busca por vizinhos sem varrer tudo"""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, key, value):
+        """Insere um hash com o valor associado"""
+        node = [key, value, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+        while True:
+            distance = hamming(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, max_distance):
+        """Retorna [(distância, valor)] com distância <= max_distance"""
+        if self.root is None:
+            return []
+
+        found = []
+        pending = [self.root]
+        while pending:
+            node = pending.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance:
+                found.append((distance, node[1]))
+            # Desigualdade triangular: só os filhos nessa faixa podem casar
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        return found
+
+class DuplicateIndex:
+    """
+    Índice em memória dos documentos recentes (thread-safe).
+
+    Entradas em ordem de chegada: as vencidas (ou além de max_entries) saem
+    a cada consulta e registro, e o recorte do texto fica guardado em PNG
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE, window_seconds=DEFAULT_WINDOW_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.tree = BKTree()
+        self.entries = deque()
+        self.lock = threading.Lock()
+
+    def _expire(self, now):
+        """Descarta as entradas vencidas ou excedentes (chamado com o lock)"""
+        while self.entries and (now - self.entries[0]['time'] > self.window_seconds
+                                or len(self.entries) > self.max_entries):
+            # O nó continua na árvore até a reconstrução, mas sem resultado nem recorte
+            entry = self.entries.popleft()
+            entry['result'] = entry['content'] = None
+
+        # A árvore BK não remove nós: reconstruir quando houver mais nós mortos que vivos
+        if self.tree.size > 2 * len(self.entries):
+            self.tree = BKTree()
+            for entry in self.entries:
+                self.tree.add(entry['hash'], entry)
+
+    def find(self, image_hash, content, key=None):
+        """
+        Resultado anterior do mesmo documento dentro da janela de tempo.
+
+        O hash só escolhe os candidatos; cada um é conferido pelo recorte do
+        texto (content, de content_reference). Sem recorte, nada é devolvido.
+        """
+        if content is None:
+            return None
+
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            # Cópia dos campos: uma entrada descartada por outra thread perde resultado e recorte
+            matches = [
+                (distance, dict(entry)) for distance, entry in self.tree.search(image_hash, self.max_distance)
+                if now - entry['time'] <= self.window_seconds and entry['key'] == key
+                and entry['content'] is not None
+            ]
+
+        matches.sort(key=lambda match: (match[0], -match[1]['time']))
+        for distance, entry in matches[:MAX_VERIFIED_CANDIDATES]:
+            mismatch = content_mismatch(cv2.imdecode(entry['content'], cv2.IMREAD_GRAYSCALE), content)
+            if mismatch <= MAX_TILE_MISMATCH:
+                return {
+                    'result': entry['result'],
+                    'distance': distance,
+                    'content_mismatch': mismatch,
+                    'age_seconds': round(now - entry['time'], 1)
+                }
+        return None
+
+    def add(self, image_hash, result, key=None, content=None):
+        """Registra o resultado de um documento processado (content: recorte do texto)"""
+        now = time.time()
+        # PNG sem perdas: a conferência é a mesma, com uma fração da memória do recorte
+        packed = cv2.imencode('.png', content)[1] if content is not None else None
+        entry = {'hash': image_hash, 'result': result, 'key': key, 'content': packed, 'time': now}
+        with self.lock:
+            self.entries.append(entry)
+            self.tree.add(image_hash, entry)
+            self._expire(now)
+
+def seed_from_previous(result, previous):
+    """Completa os campos não encontrados com os do resultado anterior"""
+    data = dict(previous.get('data', {}))
+    data.update({field: value for field, value in result.get('data', {}).items() if value})
+    seeded = dict(result)
+    seeded['data'] = data
+    seeded['seeded_fields'] = sorted(set(data) - set(result.get('data', {})))
+    return seeded
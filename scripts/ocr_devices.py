@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro dos dispositivos de OCR
+Módulo e função de extração de cada dispositivo, importados sob demanda;
+usado pelo worker, pelos lotes e pelos fluxos que escolhem ou combinam
+extrações (ocr_auto.py, ocr_pairing.py, ocr_video.py)
+"""
+
+import importlib
+
+# Módulo e função de extração de cada dispositivo
+DEVICES = {
+    'generic': ('ocr_processor', 'extract_document_data'),
+    'kodak': ('kodak_scanner_ocr', 'extract_document_data_kodak'),
+    'multifunctional': ('multifunctional_scanner_ocr', 'extract_document_data_multifunctional'),
+    # Perfil escolhido pelas características da imagem (ocr_auto.py)
+    'auto': ('ocr_auto', 'extract_document_data_auto')
+}
+
+_extractors = {}
+
+def get_extractor(device):
+    """Importa (uma vez) a função de extração do dispositivo"""
+    if device not in DEVICES:
+        raise ValueError(f"Dispositivo desconhecido: {device} (use {', '.join(sorted(DEVICES))})")
+
+    if device not in _extractors:
+        module_name, function_name = DEVICES[device]
+        _extractors[device] = getattr(importlib.import_module(module_name), function_name)
+    return _extractors[device]
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pré-processamento como cadeia de operadores nomeados
+Cada dispositivo descreve seus passos (redimensionar, cinza, desfoque,
+threshold, ...) com os parâmetros do perfil. O custo de cada operador é
+medido a cada execução
+
+O cache de intermediários por (imagem de entrada, prefixo da cadeia) serve
+ao ajuste de perfis (tune_device_profile.py), que repete as mesmas imagens
+trocando só o fim da cadeia (threshold, contraste) sem refazer
+redimensionamento e escala de cinza. Os scripts de OCR processam cada
+imagem uma vez e executam a cadeia sem cache
+"""
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from ocr_profile import active_tracer
+
+# Tamanho padrão do cache de intermediários (MB)
+DEFAULT_CACHE_MB = 256
+
+def _array(image):
+    return np.asarray(image) if isinstance(image, Image.Image) else image
+
+def _pil(image):
+    return image if isinstance(image, Image.Image) else Image.fromarray(image)
+
+def op_bgr(image):
+    """RGB -> BGR (OpenCV usa BGR); imagens em cinza passam direto"""
+    img_array = _array(image)
+    return cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR) if len(img_array.shape) == 3 else img_array
+
+def op_resize(image, scale_factor):
+    img_array = _array(image)
+    height, width = img_array.shape[:2]
+    return cv2.resize(img_array, (int(width * scale_factor), int(height * scale_factor)),
+                      interpolation=cv2.INTER_CUBIC)
+
+def op_gray(image):
+    img_array = _array(image)
+    return cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY) if len(img_array.shape) == 3 else img_array
+
+def op_gaussian_blur(image, blur_kernel):
+    return cv2.GaussianBlur(_array(image), (blur_kernel, blur_kernel), 0)
+
+def op_adaptive_threshold(image, threshold_block_size, threshold_c):
+    return cv2.adaptiveThreshold(
+        _array(image), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+        threshold_block_size, threshold_c
+    )
+
+def op_morph_close(image, morph_kernel):
+    kernel = np.ones((morph_kernel, morph_kernel), np.uint8)
+    return cv2.morphologyEx(_array(image), cv2.MORPH_CLOSE, kernel)
+
+def op_median(image, median_kernel):
+    return cv2.medianBlur(_array(image), median_kernel)
+
+def op_contrast(image, contrast):
+    return ImageEnhance.Contrast(_pil(image)).enhance(contrast)
+
+def op_sharpness(image, sharpness):
+    return ImageEnhance.Sharpness(_pil(image)).enhance(sharpness)
+
+def op_brightness(image, brightness):
+    return ImageEnhance.Brightness(_pil(image)).enhance(brightness)
+
+def op_color(image, color):
+    """Saturação, só para imagens coloridas"""
+    image = _pil(image)
+    return ImageEnhance.Color(image).enhance(color) if image.mode == 'RGB' else image
+
+# Operadores disponíveis: nome -> (função, parâmetros lidos do perfil)
+OPERATORS = {
+    'bgr': (op_bgr, ()),
+    'resize': (op_resize, ('scale_factor',)),
+    'gray': (op_gray, ()),
+    'gaussian_blur': (op_gaussian_blur, ('blur_kernel',)),
+    'adaptive_threshold': (op_adaptive_threshold, ('threshold_block_size', 'threshold_c')),
+    'morph_close': (op_morph_close, ('morph_kernel',)),
+    'median': (op_median, ('median_kernel',)),
+    'contrast': (op_contrast, ('contrast',)),
+    'sharpness': (op_sharpness, ('sharpness',)),
+    'brightness': (op_brightness, ('brightness',)),
+    'color': (op_color, ('color',))
+}
+
+# Passos de cada dispositivo (pré-processamento e realce)
+DEVICE_GRAPHS = {
+    'kodak': {
+        'preprocess': ('bgr', 'resize', 'gray', 'gaussian_blur', 'adaptive_threshold', 'morph_close'),
+        'enhance': ('contrast', 'sharpness', 'brightness')
+    },
+    'multifunctional': {
+        'preprocess': ('bgr', 'resize', 'gray', 'gaussian_blur', 'adaptive_threshold', 'morph_close', 'median'),
+        'enhance': ('contrast', 'sharpness', 'brightness', 'color')
+    }
+}
+
+def build_chain(device, profile, stages=('preprocess', 'enhance'), scale_factor=None):
+    """
+    Monta a cadeia [(operador, parâmetros)] do dispositivo a partir do perfil.
+
+    scale_factor, se informado, substitui o do perfil (plano de memória).
+    """
+    chain = []
+    for stage in stages:
+        for name in DEVICE_GRAPHS[device][stage]:
+            params = {key: profile[key] for key in OPERATORS[name][1]}
+            if name == 'resize' and scale_factor is not None:
+                params['scale_factor'] = scale_factor
+            chain.append((name, params))
+    return chain
+
+def image_key(image):
+    """Identificador do conteúdo da imagem de entrada"""
+    img_array = _array(image)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{img_array.shape}{img_array.dtype}".encode())
+    digest.update(np.ascontiguousarray(img_array).data)
+    return digest.hexdigest()
+
+def _step_key(step):
+    name, params = step
+    return (name, tuple(sorted(params.items())))
+
+class IntermediateCache:
+    """
+    Cache LRU de intermediários por (entrada, prefixo da cadeia), limitado em MB.
+    Usado nas varreduras de parâmetros (tune_device_profile.py)
+    """
+
+    def __init__(self, max_mb=DEFAULT_CACHE_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _nbytes(image):
+        if isinstance(image, Image.Image):
+            return image.size[0] * image.size[1] * len(image.getbands())
+        return image.nbytes
+
+    def get(self, key):
+        """(imagem, custos) do prefixo, ou None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def count(self, hit):
+        """Contabiliza uma execução que aproveitou (ou não) algum prefixo"""
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key, image, costs):
+        """Guarda o intermediário com os custos dos operadores que o produziram"""
+        nbytes = self._nbytes(image)
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (image, costs)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self.entries.popitem(last=False)
+                self.size -= self._nbytes(evicted)
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'size_mb': round(self.size / 1024 / 1024, 1),
+                    'hits': self.hits, 'misses': self.misses}
+
+def run_graph(image, chain, cache=None, input_key=None):
+    """
+    Executa a cadeia sobre a imagem e retorna (imagem PIL, custos).
+
+    Com cache, parte do maior prefixo já calculado para esta entrada
+    (input_key, ou o hash do conteúdo) e guarda cada novo intermediário.
+    Custos: [{'op', 'ms', 'cached'}] na ordem da cadeia; passos vindos do
+    cache trazem o tempo que custaram ao serem calculados.
+    """
+    prefixes = []
+    start = 0
+    current = image
+    costs = []
+    if cache is not None:
+        input_key = input_key or image_key(image)
+        prefix = (input_key,)
+        for step in chain:
+            prefix = prefix + (_step_key(step),)
+            prefixes.append(prefix)
+        # Procurar do fim para o início o maior prefixo em cache
+        for index in range(len(chain), 0, -1):
+            cached = cache.get(prefixes[index - 1])
+            if cached is not None:
+                current, costs = cached
+                costs = [dict(cost, cached=True) for cost in costs]
+                start = index
+                break
+        cache.count(start > 0)
+
+    tracer = active_tracer()
+    for index in range(start, len(chain)):
+        name, params = chain[index]
+        started = time.perf_counter()
+        current = OPERATORS[name][0](current, **params)
+        finished = time.perf_counter()
+        costs.append({'op': name, 'ms': round((finished - started) * 1000, 2), 'cached': False})
+        if tracer:
+            tracer.span(name, started, finished, 'preprocess', **params)
+        if cache is not None:
+            # Operadores nunca alteram a entrada no lugar: o intermediário pode ser compartilhado
+            cache.put(prefixes[index], current, [dict(cost, cached=False) for cost in costs])
+
+    return _pil(current), costs
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de texto completo dos resultados de OCR (SQLite FTS5, embutido)
+Permite achar documentos digitalizados por nome, filiação, CPF, RG ou
+qualquer trecho do texto, sem serviço de busca externo
+
+Uso:
+  python ocr_index.py index <banco.db> <diario.jsonl> [...]   (carga em lote)
+  python ocr_index.py search <banco.db> "maria aparecida" [--limit=20]
+  python ocr_index.py optimize <banco.db>
+
+Busca: termos são combinados com E; "entre aspas" busca a frase; termo*
+busca por prefixo; mae:termo restringe a uma coluna (nome, mae, pai,
+raw_text). Um CPF (11 dígitos) ou RG é buscado nas colunas normalizadas.
+"""
+
+import re
+import sys
+import json
+import time
+import sqlite3
+from datetime import datetime
+
+# Colunas com busca de texto completo
+FTS_COLUMNS = ('nome', 'mae', 'pai', 'raw_text')
+
+# Acentos removidos na indexação e na busca (JOÃO = joao); prefixos de 2 e 3
+# letras pré-indexados para buscas por prefixo rápidas
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    source TEXT UNIQUE,
+    device TEXT,
+    indexed_at TEXT,
+    extraction TEXT,
+    code_fields TEXT,
+    confidence REAL,
+    nome TEXT,
+    mae TEXT,
+    pai TEXT,
+    cpf TEXT,
+    rg TEXT,
+    nascimento TEXT,
+    data TEXT,
+    raw_text TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_cpf ON documents(cpf);
+CREATE INDEX IF NOT EXISTS idx_documents_rg ON documents(rg);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    nome, mae, pai, raw_text,
+    content='documents', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, nome, mae, pai, raw_text)
+    VALUES (new.id, new.nome, new.mae, new.pai, new.raw_text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, nome, mae, pai, raw_text)
+    VALUES ('delete', old.id, old.nome, old.mae, old.pai, old.raw_text);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts(documents_fts, rowid, nome, mae, pai, raw_text)
+    VALUES ('delete', old.id, old.nome, old.mae, old.pai, old.raw_text);
+    INSERT INTO documents_fts(rowid, nome, mae, pai, raw_text)
+    VALUES (new.id, new.nome, new.mae, new.pai, new.raw_text);
+END;
+"""
+
+INSERT_SQL = """
+INSERT INTO documents (source, device, indexed_at, extraction, code_fields, confidence, nome, mae, pai, cpf, rg,
+                       nascimento, data, raw_text)
+VALUES (:source, :device, :indexed_at, :extraction, :code_fields, :confidence, :nome, :mae, :pai, :cpf, :rg,
+        :nascimento, :data, :raw_text)
+ON CONFLICT(source) DO UPDATE SET
+    device = excluded.device, indexed_at = excluded.indexed_at, extraction = excluded.extraction,
+    code_fields = excluded.code_fields, confidence = excluded.confidence, nome = excluded.nome,
+    mae = excluded.mae, pai = excluded.pai, cpf = excluded.cpf, rg = excluded.rg,
+    nascimento = excluded.nascimento, data = excluded.data, raw_text = excluded.raw_text
+"""
+
+# Colunas acrescentadas depois da primeira versão (bancos antigos ganham na abertura);
+# extraction: origem dos dados no resultado ('ocr', 'barcode', 'barcode+ocr');
+# code_fields: lista JSON dos campos lidos do código
+ADDED_COLUMNS = {'extraction': 'TEXT', 'code_fields': 'TEXT', 'confidence': 'REAL'}
+
+# Colunas devolvidas pela busca
+RESULT_COLUMNS = ('documents.id, documents.source, documents.device, documents.nome, documents.mae, '
+                  'documents.cpf, documents.rg, documents.nascimento')
+
+# Registros por transação na carga em lote
+BULK_BATCH_SIZE = 5000
+
+def normalize_cpf(value):
+    """CPF só com dígitos (None se não tiver 11 dígitos)"""
+    digits = re.sub(r'\D', '', value or '')
+    return digits if len(digits) == 11 else None
+
+def normalize_rg(value):
+    """RG só com letras e dígitos, em maiúsculas"""
+    normalized = re.sub(r'[^0-9A-Za-z]', '', value or '').upper()
+    return normalized or None
+
+def document_row(result, source=None, device=None):
+    """Converte um resultado de OCR em linha da tabela documents"""
+    data = result.get('data', {})
+    return {
+        'source': source,
+        'device': device or result.get('device_type'),
+        'indexed_at': datetime.now().isoformat(timespec='seconds'),
+        'extraction': result.get('source'),
+        'code_fields': json.dumps(result['code_fields']) if 'code_fields' in result else None,
+        'confidence': result.get('confidence'),
+        'nome': data.get('nome'),
+        'mae': data.get('mae'),
+        'pai': data.get('pai'),
+        'cpf': normalize_cpf(data.get('cpf')),
+        'rg': normalize_rg(data.get('rg')),
+        'nascimento': data.get('nascimento'),
+        'data': json.dumps(data, ensure_ascii=False),
+        'raw_text': result.get('raw_text', '')
+    }
+
+def build_match(query):
+    """
+    Converte a busca do usuário em expressão MATCH do FTS5.
+
+    Cada termo vira uma string entre aspas (pontuação do OCR não quebra a
+    sintaxe do FTS5), mantendo frases, prefixos (*) e filtros de coluna.
+    """
+    terms = []
+    for column, phrase, word in re.findall(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))', query):
+        if phrase:
+            term = '"' + phrase.replace('"', '') + '"'
+        else:
+            prefix = word.endswith('*')
+            word = re.sub(r'[^\w]', ' ', word).strip()
+            if not word:
+                continue
+            term = '"' + word + '"' + ('*' if prefix else '')
+        if column in FTS_COLUMNS:
+            term = f"{column} : {term}"
+        terms.append(term)
+    return ' '.join(terms)
+
+class OcrIndex:
+    """Índice FTS5 dos resultados de OCR"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL: leituras (buscas) não bloqueiam a escrita do worker
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        existing = {row['name'] for row in self.conn.execute('PRAGMA table_info(documents)')}
+        with self.conn:
+            for column, kind in ADDED_COLUMNS.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE documents ADD COLUMN {column} {kind}")
+
+    def add(self, result, source=None, device=None):
+        """Indexa um resultado (inserção incremental, usada pelo worker)"""
+        with self.conn:
+            self.conn.execute(INSERT_SQL, document_row(result, source, device))
+
+    def add_many(self, records, batch_size=BULK_BATCH_SIZE):
+        """
+        Carga em lote de (resultado, origem, dispositivo).
+
+        Agrupa milhares de linhas por transação; o custo dominante do SQLite
+        é o commit, não a inserção.
+        """
+        total = 0
+        batch = []
+        for result, source, device in records:
+            batch.append(document_row(result, source, device))
+            if len(batch) >= batch_size:
+                with self.conn:
+                    self.conn.executemany(INSERT_SQL, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            with self.conn:
+                self.conn.executemany(INSERT_SQL, batch)
+            total += len(batch)
+        return total
+
+    def search(self, query, limit=20):
+        """Busca por CPF, RG ou texto (prefixo/frase), do mais relevante ao menos"""
+        cpf = normalize_cpf(query) if re.fullmatch(r'[\d.\-\s/]+', query.strip()) else None
+        if cpf:
+            rows = self.conn.execute(f"SELECT {RESULT_COLUMNS} FROM documents WHERE cpf = ? LIMIT ?", (cpf, limit))
+            return [dict(row) for row in rows]
+
+        rg = normalize_rg(query)
+        if rg and re.fullmatch(r'\d{5,10}[0-9X]?', rg):
+            rows = self.conn.execute(f"SELECT {RESULT_COLUMNS} FROM documents WHERE rg = ? LIMIT ?", (rg, limit)).fetchall()
+            if rows:
+                return [dict(row) for row in rows]
+
+        match = build_match(query)
+        if not match:
+            return []
+        rows = self.conn.execute(
+            f"SELECT {RESULT_COLUMNS}, snippet(documents_fts, 3, '[', ']', '…', 12) AS snippet "
+            "FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid "
+            "WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def optimize(self):
+        """Funde os segmentos do FTS5 (após cargas grandes)"""
+        with self.conn:
+            self.conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('optimize')")
+
+    def close(self):
+        self.conn.close()
+
+def read_records(path):
+    """
+    Lê resultados de um arquivo JSON por linha: diário do ocr_bulk_job.py
+    ({"page", "result"}) ou resultados do ocr_worker.py
+
+    A origem é a página do lote ou a linha do arquivo: ids de requisição do
+    worker se repetem entre clientes e sobrescreveriam outro documento.
+    """
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            result = record.get('result', record)
+            if result.get('success'):
+                source = record.get('page') or f"{path}:{number}"
+                yield result, str(source), None
+
+def main():
+    """Função principal do índice"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+
+    if len(args) < 2 or args[0] not in ('index', 'search', 'optimize'):
+        print(json.dumps({
+            'success': False,
+            'error': 'Uso: python ocr_index.py index <banco.db> <arquivo.jsonl>... | '
+                     'search <banco.db> "<busca>" [--limit=20] | optimize <banco.db>'
+        }))
+        sys.exit(1)
+
+    command, db_path = args[0], args[1]
+    index = OcrIndex(db_path)
+    started = time.perf_counter()
+
+    if command == 'index':
+        total = sum(index.add_many(read_records(path)) for path in args[2:])
+        print(f"✅ {total} documentos indexados em {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    elif command == 'search':
+        limit = int(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--limit=')), 20))
+        results = index.search(' '.join(args[2:]), limit)
+        print(json.dumps({
+            'success': True,
+            'results': results,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+        }, ensure_ascii=False, indent=2))
+    else:
+        index.optimize()
+        print(f"✅ Índice otimizado em {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    index.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste de carga do OCR sem o Tesseract real
+Gera imagens de carteiras fictícias e dispara requisições contra os pontos
+de entrada do OCR, com o stub_tesseract.py simulando a latência do
+reconhecimento, e informa vazão, latência p50/p95/p99 e taxa de erro
+
+Modos:
+  cli     um processo Python por requisição (como o ocr-server.js faz)
+  worker  processos ocr_worker.py de longa duração (--workers; --prefork
+          cria os workers por fork de um processo pré-carregado)
+  http    POST no servidor Node (--url; --device generic ou auto);
+          inicie o servidor com TESSERACT_CMD=<scripts>/stub_tesseract.py
+          para usar o stub
+
+Carga: --concurrency N (N clientes em laço fechado) ou --rate R
+(chegadas de Poisson, R req/s; a latência conta a espera na fila)
+
+Uso: python ocr_loadtest.py --mode worker --workers 4 --concurrency 8 --requests 200
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import queue
+import base64
+import random
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from ocr_scheduler import WorkerProcess, percentile
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_TESSERACT = os.path.join(SCRIPTS_DIR, 'stub_tesseract.py')
+
+# Script de linha de comando de cada dispositivo
+DEVICE_SCRIPTS = {
+    'generic': 'ocr_processor.py',
+    'kodak': 'kodak_scanner_ocr.py',
+    'multifunctional': 'multifunctional_scanner_ocr.py',
+    'auto': 'ocr_auto.py'
+}
+
+DEFAULT_URL = 'http://localhost:3001/api/ocr-process'
+
+# Devices que o /api/ocr-process distingue (os demais caem no ocr_processor.py)
+HTTP_DEVICES = ('generic', 'auto')
+
+# Tamanho da carteira digitalizada a 300 dpi (RG: 102 x 68 mm)
+CARD_SIZE = (1205, 803)
+
+FIRST_NAMES = ('JOAO', 'MARIA', 'ANA', 'JOSE', 'FRANCISCO', 'ANTONIA', 'CARLOS', 'PAULA')
+SURNAMES = ('SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'PEREIRA', 'LIMA', 'CARVALHO', 'FERREIRA')
+
+def random_cpf(rng):
+    """CPF fictício com dígitos verificadores válidos"""
+    digits = [rng.randint(0, 9) for _ in range(9)]
+    for length in (9, 10):
+        total = sum(digit * (length + 1 - index) for index, digit in enumerate(digits))
+        digits.append((total * 10 % 11) % 10)
+    cpf = ''.join(map(str, digits))
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+
+def generate_card(seed):
+    """Imagem JPEG (bytes) de uma carteira de identidade fictícia"""
+    rng = random.Random(seed)
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)} {rng.choice(SURNAMES)}"
+    lines = [
+        'REPUBLICA FEDERATIVA DO BRASIL',
+        'CARTEIRA DE IDENTIDADE',
+        f"NOME: {name}",
+        f"FILIACAO: {rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}",
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}",
+        f"DATA DE NASCIMENTO: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1940, 2005)}",
+        f"RG: {rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}-{rng.randint(0, 9)}",
+        f"CPF: {random_cpf(rng)}"
+    ]
+
+    background = tuple(rng.randint(205, 240) for _ in range(3))
+    image = Image.new('RGB', CARD_SIZE, background)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 40, 300, 380), outline=(90, 90, 90), width=3)
+    for index, line in enumerate(lines):
+        draw.text((340, 60 + index * 70), line, fill=(20, 20, 30))
+
+    # Leve desfoque e rotação, como uma digitalização real
+    image = image.rotate(rng.uniform(-1.5, 1.5), fillcolor=background).filter(ImageFilter.GaussianBlur(0.6))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+def parse_cli_output(output):
+    """Resultado JSON da saída do script (os scripts por dispositivo imprimem antes do JSON)"""
+    try:
+        return json.loads(output)
+    except ValueError:
+        start = output.rfind('\n{')
+        return json.loads(output[start + 1:])
+
+def make_cli_call(device, deadline_seconds):
+    """Uma requisição = um processo Python, como no servidor Node"""
+    script = os.path.join(SCRIPTS_DIR, DEVICE_SCRIPTS[device])
+
+    def call(image_data):
+        args = [sys.executable, script, image_data]
+        if deadline_seconds:
+            args.append(f"--deadline={deadline_seconds}")
+        completed = subprocess.run(args, capture_output=True, text=True, encoding='utf-8')
+        if completed.returncode != 0:
+            return 'error'
+        result = parse_cli_output(completed.stdout)
+        return 'timeout' if result.get('timeout') else 'ok' if result.get('success') else 'error'
+
+    return call, lambda: None
+
+def make_worker_call(device, deadline_seconds, workers, prefork=False):
+    """Requisições distribuídas entre processos ocr_worker.py (ou pré-fork)"""
+    worker_factory = partial(WorkerProcess, workers)
+    if prefork:
+        from ocr_prefork import ForkedWorker, preload
+        preload((device,), workers)
+        worker_factory = ForkedWorker
+    idle = queue.Queue()
+    pool = [worker_factory() for _ in range(workers)]
+    for worker in pool:
+        idle.put(worker)
+
+    def call(image_data):
+        request = {'image': image_data, 'device': device, 'dedup': 'off'}
+        if deadline_seconds:
+            request['deadline_seconds'] = deadline_seconds
+        worker = idle.get()
+        try:
+            result = worker.process_request(request)
+        finally:
+            idle.put(worker)
+        return 'timeout' if result.get('timeout') else 'ok' if result.get('success') else 'error'
+
+    def close():
+        for worker in pool:
+            worker.close()
+
+    return call, close
+
+def make_http_call(url, device, deadline_seconds):
+    """POST no servidor Node (/api/ocr-process)"""
+
+    def call(image_data):
+        body = {'imageData': image_data, 'device': device}
+        if deadline_seconds:
+            body['deadlineSeconds'] = deadline_seconds
+        request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                result = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return 'timeout' if e.code == 504 else 'error'
+        return 'ok' if result.get('success') else 'error'
+
+    return call, lambda: None
+
+def timed_call(call, image_data, started):
+    """(latência em ms desde a chegada, resultado)"""
+    try:
+        outcome = call(image_data)
+    except Exception as e:
+        print(f"⚠️ {e}", file=sys.stderr)
+        outcome = 'error'
+    return (time.perf_counter() - started) * 1000, outcome
+
+def run_closed_loop(call, images, requests, concurrency):
+    """N clientes, cada um envia a próxima requisição ao receber a resposta"""
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    samples = []
+
+    def client():
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            sample = timed_call(call, images[number % len(images)], time.perf_counter())
+            with lock:
+                samples.append(sample)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+def run_open_loop(call, images, requests, rate, seed):
+    """Chegadas de Poisson a uma taxa fixa, independentes das respostas"""
+    rng = random.Random(seed)
+    futures = []
+    # Uma thread por requisição em voo; a fila (workers ocupados) entra na latência
+    with ThreadPoolExecutor(max_workers=max(32, int(rate * 60))) as executor:
+        next_arrival = time.perf_counter()
+        for number in range(requests):
+            next_arrival += rng.expovariate(rate)
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(timed_call, call, images[number % len(images)], next_arrival))
+        return [future.result() for future in futures]
+
+def build_report(samples, wall, config):
+    """Vazão, latência e erros do teste"""
+    latencies = [latency for latency, outcome in samples if outcome == 'ok']
+    outcomes = {}
+    for _, outcome in samples:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def ms(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        'config': config,
+        'requests': len(samples),
+        'ok': outcomes.get('ok', 0),
+        'errors': outcomes.get('error', 0),
+        'timeouts': outcomes.get('timeout', 0),
+        'error_rate': round((len(samples) - outcomes.get('ok', 0)) / len(samples), 4) if samples else 0.0,
+        'wall_seconds': round(wall, 2),
+        'throughput_rps': round(outcomes.get('ok', 0) / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 0.5)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(max(latencies) if latencies else None)
+        }
+    }
+
+def main():
+    """Função principal do teste de carga"""
+    parser = argparse.ArgumentParser(description='Teste de carga do OCR com Tesseract simulado')
+    parser.add_argument('--mode', choices=('cli', 'worker', 'http'), default='worker')
+    parser.add_argument('--device', choices=sorted(DEVICE_SCRIPTS), default='generic')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4, help='Clientes simultâneos (laço fechado)')
+    parser.add_argument('--rate', type=float, help='Chegadas por segundo (laço aberto; ignora --concurrency)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processos no modo worker')
+    parser.add_argument('--prefork', action='store_true', help='Workers por fork de um processo pré-carregado')
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--images', type=int, default=20, help='Carteiras distintas geradas')
+    parser.add_argument('--warmup', type=int, default=0, help='Requisições iniciais fora das estatísticas')
+    parser.add_argument('--deadline', type=float, help='Prazo por requisição (segundos)')
+    parser.add_argument('--real-tesseract', action='store_true', help='Não usar o stub_tesseract.py')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.mode == 'http' and args.device not in HTTP_DEVICES:
+        parser.error(f"--device={args.device} não é suportado pelo servidor; use {' ou '.join(HTTP_DEVICES)}")
+
+    # Processos filhos (scripts e workers) herdam o Tesseract simulado
+    if not args.real_tesseract:
+        os.environ['TESSERACT_CMD'] = STUB_TESSERACT
+
+    images = [base64.b64encode(generate_card(args.seed + index)).decode('ascii') for index in range(args.images)]
+    print(f"🪪 {len(images)} carteiras geradas ({sum(map(len, images)) // len(images) // 1024} KB em base64)",
+          file=sys.stderr)
+
+    if args.mode == 'cli':
+        call, close = make_cli_call(args.device, args.deadline)
+    elif args.mode == 'worker':
+        call, close = make_worker_call(args.device, args.deadline, args.workers, args.prefork)
+    else:
+        call, close = make_http_call(args.url, args.device, args.deadline)
+
+    try:
+        if args.warmup:
+            run_closed_loop(call, images, args.warmup, args.concurrency)
+
+        started = time.perf_counter()
+        if args.rate:
+            samples = run_open_loop(call, images, args.requests, args.rate, args.seed)
+        else:
+            samples = run_closed_loop(call, images, args.requests, args.concurrency)
+        wall = time.perf_counter() - started
+    finally:
+        close()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('images', 'seed')}
+    config['cpus'] = os.cpu_count()
+    config['stub_tesseract'] = not args.real_tesseract
+    report = build_report(samples, wall, config)
+
+    print(f"📊 {report['throughput_rps']} req/s, p50 {report['latency_ms']['p50']} ms, "
+          f"p95 {report['latency_ms']['p95']} ms, p99 {report['latency_ms']['p99']} ms, "
+          f"erros {report['error_rate']:.1%}", file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Orçamento de memória para o pré-processamento OCR
+Limita os pixels de trabalho, processa em faixas quando necessário e
+informa o pico de memória (RSS) de cada requisição
+
+Uso: python ocr_memory.py [<imagem>] [--scale=2.5]   (faixas x imagem inteira, pixel a pixel)
+"""
+
+import os
+import sys
+import json
+import math
+import threading
+from fractions import Fraction
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Orçamento padrão por requisição (MB); vazio = sem orçamento
+DEFAULT_BUDGET_MB = os.environ.get('OCR_MEMORY_BUDGET_MB')
+
+# Limite rígido de pixels da imagem de entrada (600 dpi A4 ~ 35 MP)
+MAX_INPUT_PIXELS = int(os.environ.get('OCR_MAX_INPUT_PIXELS', str(60_000_000)))
+
+# O que fazer acima do limite: 'reject' ou 'downsample'
+OVERSIZE_POLICY = os.environ.get('OCR_OVERSIZE_POLICY', 'reject')
+
+# Maior imagem reduzida sem decodificação reduzida (só o JPEG a tem): PNG/TIFF
+# são decodificados inteiros antes da redução, então acima disso são recusados
+MAX_FULL_DECODE_PIXELS = 2 * MAX_INPUT_PIXELS
+
+# Bytes por pixel de trabalho no caminho tradicional:
+# BGR redimensionado (3) + cinza (1) + desfoque (1) + threshold (1) + limpeza (1) + mediana (1)
+BYTES_PER_WORKING_PIXEL = 8
+
+# Bytes por pixel no caminho econômico: saída binária (1) + cópias do ImageEnhance
+# e do arquivo temporário enviado ao Tesseract (~2)
+ECONOMY_BYTES_PER_PIXEL = 3
+
+# Altura das faixas do caminho econômico (linhas da imagem de saída)
+STRIP_ROWS = 1024
+
+# Passo da escala limitada pelo orçamento (1/8: faixas alinhadas a cada 8 linhas no máximo)
+SCALE_STEP = 0.125
+
+# Maior denominador aceito para alinhar as faixas à escala
+MAX_STRIP_ALIGNMENT = 64
+
+# Pico de RSS por requisição: requisições em andamento no processo e quantas já começaram
+_peak_lock = threading.Lock()
+_peak_in_flight = 0
+_peak_started = 0
+
+class ImageTooLargeError(ValueError):
+    """Imagem acima do limite rígido de pixels"""
+
+def open_image(source):
+    """
+    Image.open com a recusa do PIL (bomba de descompressão, acima de 2x o
+    Image.MAX_IMAGE_PIXELS padrão) convertida em ImageTooLargeError. O limite
+    global do PIL não é alterado
+    """
+    try:
+        return Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(f"{e}; digitalize com resolução menor (300 dpi é suficiente)") from e
+
+def check_input_size(image, policy=None, max_pixels=None):
+    """
+    Verifica o tamanho da imagem antes de decodificá-la por completo.
+
+    Acima do limite, rejeita com erro claro ou reduz a imagem (usando a
+    decodificação reduzida do JPEG; outros formatos só até MAX_FULL_DECODE_PIXELS).
+    """
+    policy = policy or OVERSIZE_POLICY
+    max_pixels = max_pixels or MAX_INPUT_PIXELS
+    width, height = image.size
+    pixels = width * height
+
+    if pixels <= max_pixels:
+        return image
+
+    if policy != 'downsample' or (image.format != 'JPEG' and pixels > MAX_FULL_DECODE_PIXELS):
+        raise ImageTooLargeError(
+            f"Imagem com {pixels / 1e6:.0f} MP excede o limite de {max_pixels / 1e6:.0f} MP "
+            f"({width}x{height}); digitalize com resolução menor (300 dpi é suficiente)"
+        )
+
+    factor = math.sqrt(max_pixels / pixels)
+    target = (max(1, int(width * factor)), max(1, int(height * factor)))
+    image.draft(image.mode, target)
+    image = image.resize(target, Image.Resampling.LANCZOS) if image.size != target else image
+    print(f"🧮 Imagem reduzida de {width}x{height} para {target[0]}x{target[1]}", file=sys.stderr)
+    return image
+
+def plan_memory(size, scale_factor, budget_mb=None):
+    """
+    Decide fator de escala e modo de processamento para caber no orçamento.
+
+    Sem orçamento, mantém o caminho tradicional. Com orçamento, limita os
+    pixels de trabalho e usa o caminho econômico (cinza antes de ampliar,
+    operações no próprio buffer e processamento em faixas).
+    """
+    width, height = size
+    plan = {
+        'budget_mb': None,
+        'scale_factor': scale_factor,
+        'working_pixels': int(width * scale_factor) * int(height * scale_factor),
+        'economy': False
+    }
+
+    budget_mb = budget_mb if budget_mb is not None else DEFAULT_BUDGET_MB
+    if not budget_mb:
+        return plan
+
+    budget_bytes = float(budget_mb) * 1024 * 1024
+    plan['budget_mb'] = float(budget_mb)
+    plan['economy'] = plan['working_pixels'] * BYTES_PER_WORKING_PIXEL > budget_bytes
+
+    # Pixels de trabalho máximos no caminho escolhido
+    bytes_per_pixel = ECONOMY_BYTES_PER_PIXEL if plan['economy'] else BYTES_PER_WORKING_PIXEL
+    max_working_pixels = budget_bytes / bytes_per_pixel
+    if plan['working_pixels'] > max_working_pixels:
+        # Múltiplo de SCALE_STEP: faixas do caminho econômico alinhadas (strip_alignment)
+        scale_factor = math.sqrt(max_working_pixels / (width * height))
+        plan['scale_factor'] = max(1.0, math.floor(scale_factor / SCALE_STEP) * SCALE_STEP)
+        plan['working_pixels'] = int(width * plan['scale_factor']) * int(height * plan['scale_factor'])
+        print(f"🧮 Escala limitada a {plan['scale_factor']:.2f}x pelo orçamento de {budget_mb} MB",
+              file=sys.stderr)
+
+    return plan
+
+def strip_alignment(scale_factor):
+    """
+    Menor passo de linhas da imagem original cuja posição ampliada é inteira
+    (2,5x -> 2 linhas), None se a escala não for uma fração simples
+    """
+    fraction = Fraction(scale_factor).limit_denominator(MAX_STRIP_ALIGNMENT)
+    if abs(float(fraction) - scale_factor) > 1e-9:
+        return None
+    return fraction.denominator
+
+def align_up(rows, align):
+    """Arredonda rows para cima até um múltiplo de align"""
+    return -(-rows // align) * align
+
+def binarize_in_strips(image, scale_factor, blur_kernel, block_size, threshold_c,
+                       morph_kernel, median_kernel=None, strip_rows=STRIP_ROWS):
+    """
+    Caminho econômico: escala de cinza -> ampliação -> desfoque -> threshold
+    adaptativo -> fechamento (-> mediana), faixa por faixa.
+
+    Só a saída binária tem o tamanho ampliado completo; cada faixa é
+    processada com uma margem de sobreposição para que os filtros locais
+    vejam os mesmos vizinhos do processamento da imagem inteira.
+    """
+    gray = np.asarray(image.convert('L') if image.mode != 'L' else image)
+    src_height, src_width = gray.shape
+    out_width, out_height = int(src_width * scale_factor), int(src_height * scale_factor)
+    output = np.empty((out_height, out_width), np.uint8)
+
+    # Faixas começando em linhas cuja posição ampliada é inteira: a ampliação
+    # de cada faixa reproduz a fase da ampliação da imagem inteira
+    align = strip_alignment(scale_factor)
+    if align is None:
+        print(f"⚠️ Escala {scale_factor} sem alinhamento entre faixas; processando em uma faixa",
+              file=sys.stderr)
+        align = src_height
+
+    # Margem (em linhas de saída) coberta pelos raios de todos os filtros
+    radius = blur_kernel // 2 + block_size // 2 + morph_kernel + (median_kernel or 0) // 2
+    margin_src = align_up(int(math.ceil((radius + 2) / scale_factor)) + 2, align)
+    strip_src = align_up(max(1, int(strip_rows / scale_factor)), align)
+    kernel = np.ones((morph_kernel, morph_kernel), np.uint8)
+
+    for top in range(0, src_height, strip_src):
+        bottom = min(src_height, top + strip_src)
+        ext_top, ext_bottom = max(0, top - margin_src), min(src_height, bottom + margin_src)
+
+        strip = cv2.resize(gray[ext_top:ext_bottom], None, fx=scale_factor, fy=scale_factor,
+                           interpolation=cv2.INTER_CUBIC)
+        cv2.GaussianBlur(strip, (blur_kernel, blur_kernel), 0, dst=strip)
+        strip = cv2.adaptiveThreshold(strip, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                      cv2.THRESH_BINARY, block_size, threshold_c)
+        cv2.morphologyEx(strip, cv2.MORPH_CLOSE, kernel, dst=strip)
+        if median_kernel:
+            strip = cv2.medianBlur(strip, median_kernel)
+
+        # Recortar a margem e copiar para a posição final
+        out_top = int(round(top * scale_factor))
+        out_bottom = out_height if bottom == src_height else int(round(bottom * scale_factor))
+        offset = out_top - int(round(ext_top * scale_factor))
+        rows = min(out_bottom - out_top, strip.shape[0] - offset)
+        output[out_top:out_top + rows, :] = strip[offset:offset + rows, :out_width]
+
+    return output
+
+def reset_peak_rss():
+    """
+    Início de uma requisição: zera o pico de RSS do processo (Linux) se ela for
+    a única em andamento. O pico é do processo inteiro, então só vale para a
+    requisição se nenhuma outra rodou junto (lados de frente e verso, threads
+    do servidor); retorna o escopo passado a memory_report e release_peak_rss
+    """
+    global _peak_in_flight, _peak_started
+
+    with _peak_lock:
+        _peak_in_flight += 1
+        _peak_started += 1
+        scope = {'started': _peak_started, 'reset': False}
+        if _peak_in_flight == 1:
+            try:
+                with open('/proc/self/clear_refs', 'w') as f:
+                    f.write('5')
+                scope['reset'] = True
+            except OSError:
+                pass
+    return scope
+
+def release_peak_rss():
+    """Fim da requisição iniciada por reset_peak_rss"""
+    global _peak_in_flight
+
+    with _peak_lock:
+        _peak_in_flight -= 1
+
+def peak_rss_mb():
+    """Pico de memória residente do processo em MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS informa bytes; Linux, kilobytes
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+def memory_report(plan, scope):
+    """Metadados de memória anexados ao resultado (scope: de reset_peak_rss)"""
+    with _peak_lock:
+        # Zerado no início e nenhuma outra requisição começou depois: o pico é só desta
+        per_request = scope['reset'] and _peak_started == scope['started']
+    report = dict(plan)
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['peak_scope'] = 'request' if per_request else 'process'
+    return report
+
+def check_strips(image, scale_factor, strip_rows=STRIP_ROWS):
+    """
+    Compara o caminho em faixas com o mesmo processamento da imagem inteira
+    (perfis Kodak e multifuncional); retorna os pixels diferentes de cada um
+    """
+    differences = {}
+    for name, params in (('kodak', (3, 11, 2, 1, None)), ('multifunctional', (5, 15, 2, 2, 3))):
+        whole = binarize_in_strips(image, scale_factor, *params, strip_rows=max(image.size) * 4)
+        strips = binarize_in_strips(image, scale_factor, *params, strip_rows=strip_rows)
+        differences[name] = int(np.count_nonzero(whole != strips)) if whole.shape == strips.shape else None
+    return differences
+
+def main():
+    """Verifica se as faixas reproduzem a imagem inteira (imagem informada ou ruído aleatório)"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    scale_factor = float(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--scale=')), 2.5))
+
+    if args:
+        image = open_image(args[0])
+    else:
+        # Ruído: qualquer desalinhamento de fase entre faixas aparece
+        image = Image.fromarray(np.random.default_rng(0).integers(0, 256, (1500, 900), dtype=np.uint8))
+    differences = check_strips(image, scale_factor)
+    identical = all(count == 0 for count in differences.values())
+    print(json.dumps({'scale_factor': scale_factor, 'identical': identical, 'different_pixels': differences}))
+    sys.exit(0 if identical else 1)
+
+if __name__ == '__main__':
+    main()
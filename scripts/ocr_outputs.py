@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR com várias saídas em uma única execução do Tesseract
+Texto, palavras com caixas/confiança (TSV) e, opcionalmente, PDF
+pesquisável, sem pagar o reconhecimento mais de uma vez
+"""
+
+import os
+import sys
+import errno
+import shlex
+import hashlib
+import subprocess
+
+import pytesseract
+
+from ocr_deadline import NO_DEADLINE, DeadlineExceeded, is_tesseract_timeout
+from ocr_profile import trace_span
+from ocr_threads import tesseract_env
+
+# Renderizadores do Tesseract: arquivos de configuração (tessdata/configs)
+# ou variáveis -c, como o pytesseract faz para o TSV
+RENDERER_CONFIG = {
+    'txt': 'txt',
+    'tsv': '-c tessedit_create_tsv=1',
+    'pdf': 'pdf'
+}
+
+def run_tesseract(input_filename, output_base, configfiles, lang, config='', timeout=0, threads=None):
+    """
+    run_tesseract do pytesseract com o ambiente do processo filho informado:
+    threads limita o OpenMP só deste Tesseract (ocr_threads.tesseract_env)
+    """
+    tesseract = pytesseract.pytesseract
+    args = [tesseract.tesseract_cmd, input_filename, output_base]
+    if lang is not None:
+        args += ['-l', lang]
+    if config:
+        args += shlex.split(config, posix=sys.platform != 'win32')
+    args += configfiles
+
+    kwargs = tesseract.subprocess_args()
+    kwargs['env'] = tesseract_env(threads)
+    try:
+        process = subprocess.Popen(args, **kwargs)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+        raise pytesseract.TesseractNotFoundError()
+
+    # Prazo esgotado: o processo é encerrado e sobe o RuntimeError do pytesseract
+    with tesseract.timeout_manager(process, timeout) as error_string:
+        if process.returncode:
+            raise pytesseract.TesseractError(process.returncode, tesseract.get_errors(error_string))
+
+def run_renderers(image, config, lang, extensions, timeout=0, threads=None):
+    """Executa o Tesseract uma vez com os renderizadores pedidos"""
+    configfiles = [RENDERER_CONFIG[ext] for ext in extensions if not RENDERER_CONFIG[ext].startswith('-c')]
+    variables = ' '.join(RENDERER_CONFIG[ext] for ext in extensions if RENDERER_CONFIG[ext].startswith('-c'))
+
+    with pytesseract.pytesseract.save(image) as (temp_name, input_filename):
+        with trace_span('tesseract', 'tesseract', lang=lang, renderers=extensions):
+            run_tesseract(input_filename, temp_name, configfiles, lang, config=f"{config} {variables}".strip(),
+                          timeout=timeout, threads=threads)
+
+        outputs = {}
+        for ext in extensions:
+            with open(f"{temp_name}{os.extsep}{ext}", 'rb') as f:
+                content = f.read()
+            outputs[ext] = content if ext == 'pdf' else content.decode('utf-8')
+        return outputs
+
+def parse_tsv_words(tsv, offset_top=0):
+    """Palavras reconhecidas (nível 5 do TSV) com caixa e confiança"""
+    words = []
+    lines = tsv.splitlines()
+    if not lines:
+        return words
+
+    header = lines[0].split('\t')
+    for line in lines[1:]:
+        row = dict(zip(header, line.split('\t')))
+        text = row.get('text', '').strip()
+        if row.get('level') != '5' or not text or float(row.get('conf', -1)) < 0:
+            continue
+        words.append({
+            'text': text,
+            'conf': round(float(row['conf']), 1),
+            'left': int(row['left']),
+            'top': int(row['top']) + offset_top,
+            'width': int(row['width']),
+            'height': int(row['height']),
+            'block': int(row['block_num']),
+            'line': int(row['line_num'])
+        })
+    return words
+
+def ocr_multi_output(image, config, langs=('por', 'eng'), pdf=False, offset_top=0, deadline=None, threads=None):
+    """
+    Executa o OCR pedindo texto, TSV e (opcionalmente) PDF de uma só vez.
+
+    Tenta os idiomas na ordem informada, como ocr_with_fallback. Com prazo,
+    o Tesseract é encerrado ao esgotá-lo (DeadlineExceeded, sem fallback).
+    threads: limite OpenMP só deste Tesseract (None: o do orçamento do processo).
+    Retorna {'text', 'words', 'pdf' (bytes ou None), 'lang'}.
+    """
+    deadline = deadline or NO_DEADLINE
+    extensions = ['txt', 'tsv'] + (['pdf'] if pdf else [])
+
+    for index, lang in enumerate(langs):
+        try:
+            outputs = run_renderers(image, config, lang, extensions, deadline.tesseract_timeout(), threads)
+            break
+        except Exception as e:
+            if is_tesseract_timeout(e):
+                raise DeadlineExceeded('ocr')
+            if isinstance(e, DeadlineExceeded) or index == len(langs) - 1:
+                raise
+
+    return {
+        'text': outputs['txt'],
+        'words': parse_tsv_words(outputs['tsv'], offset_top),
+        'pdf': outputs.get('pdf'),
+        'lang': lang
+    }
+
+def scale_words(words, factor):
+    """Converte as caixas das palavras para as coordenadas da imagem original"""
+    if factor == 1:
+        return words
+    for word in words:
+        for key in ('left', 'top', 'width', 'height'):
+            word[key] = int(round(word[key] * factor))
+    return words
+
+def page_output_path(directory, page, extension):
+    """
+    Arquivo de saída de uma página de lote em directory.
+
+    O nome leva um hash curto do caminho completo da página: páginas de mesmo
+    nome em pastas diferentes (livroA/001.jpg, livroB/001.jpg) não se sobrescrevem
+    """
+    digest = hashlib.sha1(os.path.abspath(page).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(directory, f"{os.path.splitext(os.path.basename(page))[0]}-{digest}{extension}")
+
+def save_searchable_pdf(pdf_bytes, path):
+    """Grava o PDF pesquisável gerado pelo Tesseract"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(pdf_bytes)
+    return path
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Leitura conjunta da frente e do verso de um documento (RG/CNH)
+Recebe os dois lados (ou uma digitalização com os dois: TIFF de duas
+páginas ou os dois lados lado a lado no vidro), processa os lados em
+paralelo, identifica qual é a frente e qual é o verso e junta os campos
+em um só resultado, escolhendo por campo o valor de maior confiança
+
+Uso:
+  python ocr_pairing.py <frente_base64> <verso_base64> [--device=kodak] [--no-barcode]
+                        [--no-quality-gate] [--deadline=<segundos>]
+  python ocr_pairing.py <digitalizacao_base64> [...]   (os dois lados na mesma imagem)
+"""
+
+import io
+import re
+import sys
+import json
+import time
+import base64
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+import numpy as np
+from PIL import Image
+
+from ocr_devices import get_extractor
+from ocr_stream import NULL_EMITTER
+
+SIDES = ('front', 'back')
+
+# Textos impressos em cada lado; a frente é o lado da foto e da assinatura
+SIDE_MARKERS = {
+    'rg': {
+        'front': ('CARTEIRA DE IDENTIDADE', 'VALIDA EM TODO', 'ASSINATURA DO TITULAR', 'POLEGAR'),
+        'back': ('REGISTRO GERAL', 'DATA DE EXPEDICAO', 'FILIACAO', 'NATURALIDADE', 'DOC ORIGEM', 'LEI N')
+    },
+    'cnh': {
+        'front': ('HABILITACAO', 'PERMISSAO', 'CAT HAB', 'VALIDADE', '1A HABILITACAO', 'ACC'),
+        'back': ('OBSERVACOES', 'LOCAL', 'DATA EMISSAO', 'ASSINATURA DO EMISSOR', 'DENATRAN', 'DETRAN')
+    }
+}
+
+# Fração central da digitalização onde se procura o espaço entre os dois lados
+SPLIT_SEARCH = (0.25, 0.75)
+
+def normalize_text(text):
+    """Maiúsculas sem acentos, para comparar com os marcadores"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in text if not unicodedata.combining(char)).upper()
+
+def _encode(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def split_sides(image_data):
+    """
+    Separa uma digitalização com os dois lados em duas imagens base64.
+
+    TIFF de várias páginas: as duas primeiras páginas. Imagem única: corta no
+    maior espaço em branco da faixa central, ao longo do lado maior.
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+    if getattr(image, 'n_frames', 1) >= 2:
+        pages = []
+        for frame in range(2):
+            image.seek(frame)
+            pages.append(image.copy())
+        return [_encode(page) for page in pages]
+
+    image.load()
+    gray = image.convert('L')
+    factor = max(1, max(gray.size) // 1000)
+    small = np.asarray(gray.reduce(factor) if factor > 1 else gray)
+    vertical = small.shape[1] >= small.shape[0]
+    # Fundo do vidro estimado pelas bordas; conteúdo é o que difere dele
+    # (o fundo impresso de um cartão raramente é branco)
+    border = np.concatenate((small[0], small[-1], small[:, 0], small[:, -1]))
+    content = np.abs(small.astype(np.int16) - int(np.median(border))) > 25
+    # Projeção do conteúdo ao longo do lado maior
+    filled = np.count_nonzero(content, axis=0 if vertical else 1)
+    length = filled.shape[0]
+    start, stop = int(length * SPLIT_SEARCH[0]), int(length * SPLIT_SEARCH[1])
+    blank = filled[start:stop] <= max(1, small.shape[0 if vertical else 1] // 100)
+
+    # Centro da maior sequência em branco (sem espaço: o meio da imagem)
+    best_center, best_length, run_start = length // 2, 0, None
+    for offset, is_blank in enumerate(np.append(blank, False)):
+        if is_blank and run_start is None:
+            run_start = offset
+        elif not is_blank and run_start is not None:
+            if offset - run_start > best_length:
+                best_center, best_length = start + (run_start + offset) // 2, offset - run_start
+            run_start = None
+
+    cut = best_center * factor
+    width, height = image.size
+    boxes = ((0, 0, cut, height), (cut, 0, width, height)) if vertical else \
+        ((0, 0, width, cut), (0, cut, width, height))
+    return [_encode(image.crop(box)) for box in boxes]
+
+def document_type(texts):
+    """'cnh' se algum lado for de carteira de habilitação, senão 'rg'"""
+    return 'cnh' if any('HABILITACAO' in text for text in texts) else 'rg'
+
+def classify_sides(results):
+    """
+    Decide qual resultado é a frente.
+
+    Retorna (índice da frente, tipo do documento, {'method', 'scores'}):
+    pelos marcadores impressos; empatados, pelo número de campos (no RG os
+    dados ficam no verso, na CNH na frente); por último, a ordem de envio.
+    """
+    texts = [normalize_text(result.get('raw_text', '')) for result in results]
+    kind = document_type(texts)
+    markers = SIDE_MARKERS[kind]
+    scores = [
+        sum(marker in text for marker in markers['front']) - sum(marker in text for marker in markers['back'])
+        for text in texts
+    ]
+    if scores[0] != scores[1]:
+        return (0 if scores[0] > scores[1] else 1), kind, {'method': 'markers', 'scores': scores}
+
+    fields = [len([value for value in result.get('data', {}).values() if value]) for result in results]
+    if fields[0] != fields[1]:
+        more = 0 if fields[0] > fields[1] else 1
+        front = more if kind == 'cnh' else 1 - more
+        return front, kind, {'method': 'fields', 'scores': scores}
+
+    return 0, kind, {'method': 'order', 'scores': scores}
+
+def _token(text):
+    return re.sub(r'[^0-9A-Z]', '', normalize_text(text))
+
+def field_confidence(value, result):
+    """
+    Confiança (0-100) de um campo: média da confiança do Tesseract nas
+    palavras do valor, proporcional às palavras encontradas. Campos do
+    código de barras valem 100; sem palavras, a confiança do lado.
+    """
+    if result.get('source') == 'barcode':
+        return 100.0
+    words = {}
+    for word in result.get('words') or []:
+        words.setdefault(_token(word['text']), []).append(word['conf'])
+    if not words:
+        return result.get('confidence')
+
+    tokens = [_token(part) for part in str(value).split()]
+    tokens = [token for token in tokens if token]
+    confs = []
+    for token in tokens:
+        matches = words.get(token) or next(
+            (conf for text, conf in words.items() if len(text) >= 3 and (text in token or token in text)), None)
+        if matches:
+            confs.append(max(matches))
+    if not tokens or not confs:
+        return 0.0
+    return round(sum(confs) / len(tokens), 1)
+
+def merge_sides(sides):
+    """
+    Junta os campos dos dois lados ({'front': resultado, 'back': resultado}).
+
+    Por campo, vale o valor de maior confiança; valores diferentes nos dois
+    lados ficam em conflicts para conferência.
+    """
+    data, confidence, sources, conflicts = {}, {}, {}, {}
+    for side in SIDES:
+        result = sides[side]
+        if not result.get('success') and not result.get('timeout'):
+            continue
+        for field, value in result.get('data', {}).items():
+            if not value:
+                continue
+            score = field_confidence(value, result)
+            if field in data and data[field] != value:
+                conflicts.setdefault(field, [{'side': sources[field], 'value': data[field],
+                                              'confidence': confidence[field]}])
+                conflicts[field].append({'side': side, 'value': value, 'confidence': score})
+            if field not in data or (score or 0) > (confidence[field] or 0):
+                data[field], confidence[field], sources[field] = value, score, side
+    return data, confidence, sources, conflicts
+
+def side_summary(result, index, elapsed):
+    """Resumo de um lado no resultado conjunto"""
+    summary = {key: result[key] for key in ('success', 'source', 'confidence', 'quality', 'error', 'rejected',
+                                            'timeout', 'raw_text', 'words', 'device_selection') if key in result}
+    summary.update(input=index, seconds=round(elapsed, 2))
+    return summary
+
+def extract_pair(front_data, back_data=None, device='generic', emitter=None, **options):
+    """
+    Extrai os dados dos dois lados em paralelo e junta em um resultado.
+
+    front_data/back_data: imagens base64 (a ordem de envio não precisa estar
+    certa); sem back_data, front_data é uma digitalização com os dois lados.
+    emitter: recebe as etapas do par (separação, lados, junção); cada lado
+    roda sem emissor, para as etapas das duas threads não se misturarem.
+    options: repassadas à função de extração do dispositivo.
+    """
+    emitter = emitter or NULL_EMITTER
+    started = time.perf_counter()
+    try:
+        emitter.stage('split')
+        images = [front_data, back_data] if back_data else split_sides(front_data)
+        extract = get_extractor(device)
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'data': {}}
+
+    def run(image):
+        side_started = time.perf_counter()
+        return extract(image, **options), time.perf_counter() - side_started
+
+    # Os dois lados ao mesmo tempo: o Tesseract roda em processos próprios
+    emitter.stage('sides')
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        outputs = list(executor.map(run, images))
+    results = [result for result, _ in outputs]
+
+    emitter.stage('merge')
+
+    front, kind, classification = classify_sides(results)
+    order = (front, 1 - front)
+    sides = dict(zip(SIDES, (results[index] for index in order)))
+    data, confidence, sources, conflicts = merge_sides(sides)
+
+    success = any(result.get('success') for result in results)
+    scores = [score for score in confidence.values() if score is not None]
+    result = {
+        'success': success,
+        'data': data,
+        'field_confidence': confidence,
+        'field_sources': sources,
+        'conflicts': conflicts,
+        'confidence': round(sum(scores) / len(scores), 1) if scores else 0,
+        'document_type': kind,
+        'classification': classification,
+        'raw_text': '\n\n'.join(sides[side].get('raw_text', '') for side in SIDES).strip(),
+        'sides': {side: side_summary(results[index], index, outputs[index][1]) for side, index in zip(SIDES, order)},
+        'elapsed_seconds': round(time.perf_counter() - started, 2),
+        'sequential_seconds': round(sum(elapsed for _, elapsed in outputs), 2)
+    }
+    if not success:
+        result['error'] = '; '.join(dict.fromkeys(r.get('error', '') for r in results if r.get('error')))
+    emitter.result(result)
+    return result
+
+def main():
+    """Função principal para processar os dois lados via linha de comando"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+
+    if len(args) not in (1, 2):
+        print(json.dumps({
+            'success': False,
+            'error': 'Uso: python ocr_pairing.py <frente_base64> [<verso_base64>] [--device=<dispositivo>] '
+                     '[--no-barcode] [--no-quality-gate] [--deadline=<segundos>]'
+        }))
+        sys.exit(1)
+
+    try:
+        device = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--device=')), 'generic')
+        options = {
+            'barcode': '--no-barcode' not in flags,
+            'quality_gate': '--no-quality-gate' not in flags
+        }
+        deadline = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--deadline=')), None)
+        if deadline:
+            options['deadline_seconds'] = float(deadline)
+
+        # Prints dos scripts vão para o stderr; stdout só tem o resultado
+        with redirect_stdout(sys.stderr):
+            result = extract_pair(args[0], args[1] if len(args) > 1 else None, device, **options)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline em etapas para processamento em lote
+decode -> preprocess -> ocr -> parse, cada etapa com suas próprias threads
+e fila limitada, para que o OpenCV de um documento rode enquanto o
+Tesseract lê outro (OpenCV, PIL e o processo do Tesseract liberam o GIL)
+
+Ao final informa a utilização de cada etapa: a etapa mais ocupada é o
+gargalo e deve receber mais workers
+
+Uso: python ocr_pipeline.py <manifesto|pasta> --device kodak
+     [--workers=decode:1,preprocess:2,ocr:4,parse:1] [--queue-size=4]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import importlib
+import threading
+from contextlib import redirect_stdout
+
+from ocr_barcode import NO_CODES, decode_document_codes
+from ocr_bitonal import archive_path, read_archive, save_bitonal_tiff
+from ocr_memory import check_input_size, open_image, plan_memory
+from ocr_outputs import ocr_multi_output, page_output_path, save_searchable_pdf, scale_words
+from ocr_quality import assess_quality, rejection_result
+from ocr_threads import apply_thread_budget
+
+STAGE_NAMES = ('decode', 'preprocess', 'ocr', 'parse')
+
+# Funções de cada dispositivo usadas pelas etapas
+DEVICE_STAGES = {
+    'generic': {
+        'module': 'ocr_processor',
+        'profile': None,
+        'preprocess': 'preprocess_image',
+        'enhance': None,
+        'parse': 'parse_document_text',
+        'confidence': None,
+        'langs': ('eng',)
+    },
+    'kodak': {
+        'module': 'kodak_scanner_ocr',
+        'profile': 'KODAK_PROFILE',
+        'preprocess': 'preprocess_for_kodak_scanner',
+        'enhance': 'enhance_document_image',
+        'parse': 'parse_document_text_advanced',
+        'confidence': 'calculate_confidence',
+        'langs': ('por', 'eng')
+    },
+    'multifunctional': {
+        'module': 'multifunctional_scanner_ocr',
+        'profile': 'MULTIFUNCTIONAL_PROFILE',
+        'preprocess': 'preprocess_for_multifunctional',
+        'enhance': 'enhance_multifunctional_image',
+        'parse': 'parse_document_text_multifunctional',
+        'confidence': 'calculate_confidence_multifunctional',
+        'langs': ('por', 'eng')
+    }
+}
+
+# Fila entre etapas (documentos); limita a memória de imagens em trânsito
+DEFAULT_QUEUE_SIZE = 4
+
+# Marca de fim da entrada
+_STOP = object()
+
+def default_workers():
+    """Workers por etapa: OCR (Tesseract) é a etapa mais cara"""
+    cpus = os.cpu_count() or 1
+    return {'decode': 1, 'preprocess': max(1, cpus // 2), 'ocr': cpus, 'parse': 1}
+
+def parse_workers(value):
+    """Converte 'decode:1,ocr:4' em {'decode': 1, 'ocr': 4}"""
+    workers = {}
+    for part in filter(None, (value or '').split(',')):
+        name, count = part.split(':')
+        if name not in STAGE_NAMES:
+            raise ValueError(f"Etapa desconhecida: {name} (use {', '.join(STAGE_NAMES)})")
+        workers[name] = int(count)
+    return workers
+
+class Stage:
+    """Uma etapa: função, threads e contadores de tempo"""
+
+    def __init__(self, name, function, workers):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+        self.alive = workers
+        self.lock = threading.Lock()
+
+    def run(self, inbox, outbox):
+        """Laço de uma thread da etapa"""
+        busy = starved = blocked = 0.0
+        items = 0
+        while True:
+            waited = time.perf_counter()
+            item = inbox.get()
+            started = time.perf_counter()
+            starved += started - waited
+
+            if item is _STOP:
+                # Devolver a marca para as outras threads; a última repassa adiante
+                inbox.put(_STOP)
+                break
+
+            # Documentos já concluídos (erro ou código completo) só atravessam
+            if 'result' not in item:
+                try:
+                    self.function(item)
+                except Exception as e:
+                    item['result'] = {'success': False, 'error': f"{self.name}: {e}", 'data': {}}
+                items += 1
+            finished = time.perf_counter()
+            busy += finished - started
+
+            outbox.put(item)
+            blocked += time.perf_counter() - finished
+
+        with self.lock:
+            self.items += items
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+            self.alive -= 1
+            if self.alive == 0:
+                outbox.put(_STOP)
+
+    def stats(self, wall):
+        """Utilização da etapa no período"""
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'busy_seconds': round(self.busy, 2),
+            'utilization': round(self.busy / (self.workers * wall), 3) if wall else 0.0,
+            'mean_ms': round(self.busy / self.items * 1000, 1) if self.items else 0.0,
+            'starved_seconds': round(self.starved, 2),
+            'blocked_seconds': round(self.blocked, 2)
+        }
+
+class Pipeline:
+    """Etapas encadeadas por filas limitadas"""
+
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.wall = 0.0
+
+    def run(self, items):
+        """Processa os itens e devolve cada um ao concluir (ordem de término)"""
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = []
+
+        def feed():
+            for item in items:
+                queues[0].put(item)
+            queues[0].put(_STOP)
+
+        threads.append(threading.Thread(target=feed, daemon=True))
+        for index, stage in enumerate(self.stages):
+            stage.alive = stage.workers
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=stage.run, args=(queues[index], queues[index + 1]),
+                                                daemon=True))
+
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        while True:
+            item = queues[-1].get()
+            if item is _STOP:
+                break
+            yield item
+
+        for thread in threads:
+            thread.join()
+        self.wall = time.perf_counter() - started
+
+    def stats(self):
+        """Utilização de cada etapa e o gargalo (etapa mais ocupada)"""
+        stages = {stage.name: stage.stats(self.wall) for stage in self.stages}
+        bottleneck = max(stages, key=lambda name: stages[name]['utilization']) if stages else None
+        return {'wall_seconds': round(self.wall, 2), 'stages': stages, 'bottleneck': bottleneck}
+
+def build_stages(device, workers=None, barcode=True, memory_budget_mb=None, pdf_dir=None, quality_gate=True,
+                 tiff_dir=None):
+    """Monta as etapas do dispositivo com as funções do script correspondente"""
+    spec = DEVICE_STAGES[device]
+    module = importlib.import_module(spec['module'])
+    profile = getattr(module, spec['profile']) if spec['profile'] else None
+    scale_factor = profile['scale_factor'] if profile else 2
+    preprocess = getattr(module, spec['preprocess'])
+    enhance = getattr(module, spec['enhance']) if spec['enhance'] else None
+    parse = getattr(module, spec['parse'])
+    confidence = getattr(module, spec['confidence']) if spec['confidence'] else None
+
+    def decode(item):
+        if 'image_bytes' in item:
+            image = open_image(io.BytesIO(item.pop('image_bytes')))
+        else:
+            image = open_image(item['path'])
+        image = check_input_size(image)
+        # Decodificar por completo aqui, para o custo ficar nesta etapa
+        image.load()
+        item['image'] = image
+        # Arquivo bitonal (TIFF Grupo 4) já pré-processado: sem ampliação nem pré-processamento
+        item['archive'] = read_archive(image)
+        item['memory_plan'] = plan_memory(image.size, 1 if item['archive'] else scale_factor, memory_budget_mb)
+
+    def preprocess_stage(item):
+        image = item['image']
+        codes = decode_document_codes(image, parse) if barcode else NO_CODES
+        item['codes'] = codes
+        if codes['complete']:
+            item['result'] = {
+                'success': True,
+                'data': codes['data'],
+                'raw_text': '\n'.join(codes['payloads']),
+                'source': 'barcode'
+            }
+            return
+
+        archive = item['archive']
+        if archive:
+            item['quality'] = None
+            item['processed'] = image.convert('L')
+            item['original_width'] = archive['source_size'][0]
+            item['bitonal_archive'] = None
+            del item['image']
+            return
+
+        # Imagem sem chance de leitura: recusada antes do pré-processamento
+        item['quality'] = assess_quality(image) if quality_gate else None
+        if item['quality'] and not item['quality']['ok']:
+            item['result'] = rejection_result(item['quality'], codes['data'])
+            return
+
+        # O script genérico não tem perfil: só a escala
+        if profile is None:
+            processed = preprocess(image, item['memory_plan']['scale_factor'])
+        else:
+            processed = enhance(preprocess(image, profile, item['memory_plan']), profile)
+        item['bitonal_archive'] = None
+        if tiff_dir and 'path' in item:
+            item['bitonal_archive'] = save_bitonal_tiff(processed, archive_path(tiff_dir, item['path']), image.size,
+                                                        device, profile, image.info.get('dpi'))
+        item['original_width'] = image.size[0]
+        item['processed'] = processed
+        del item['image']
+
+    def ocr_stage(item):
+        processed = item.pop('processed')
+        pdf_path = None
+        if pdf_dir and 'path' in item:
+            pdf_path = page_output_path(pdf_dir, item['path'], '.pdf')
+
+        output = ocr_multi_output(processed, module.TESSERACT_CONFIG, spec['langs'], pdf=bool(pdf_path))
+        item['text'] = output['text']
+        item['words'] = scale_words(output['words'], item['original_width'] / processed.size[0])
+        item['searchable_pdf'] = save_searchable_pdf(output['pdf'], pdf_path) if pdf_path else None
+
+    def parse_stage(item):
+        codes = item['codes']
+        data = parse(item['text'])
+        data.update(codes['data'])
+        result = {
+            'success': True,
+            'data': data,
+            'raw_text': item['text'],
+            'source': 'barcode+ocr' if codes['data'] else 'ocr',
+            'code_fields': sorted(codes['data']),
+            'words': item['words'],
+            'searchable_pdf': item['searchable_pdf'],
+            'bitonal_archive': item['bitonal_archive'],
+            'quality': item['quality']
+        }
+        if confidence:
+            result['confidence'] = confidence(data)
+        if device != 'generic':
+            result['device_type'] = device
+        item['result'] = result
+
+    functions = {'decode': decode, 'preprocess': preprocess_stage, 'ocr': ocr_stage, 'parse': parse_stage}
+    workers = dict(default_workers(), **(workers or {}))
+    return [Stage(name, functions[name], workers[name]) for name in STAGE_NAMES]
+
+def create_pipeline(device, workers=None, queue_size=DEFAULT_QUEUE_SIZE, **options):
+    """
+    Cria o pipeline do dispositivo.
+
+    O paralelismo vem das threads das etapas, então OpenCV, BLAS e cada
+    processo do Tesseract ficam com uma thread (orçamento com pool = CPUs).
+    """
+    with redirect_stdout(sys.stderr):
+        stages = build_stages(device, workers, **options)
+    # Depois de build_stages: o módulo do dispositivo aplica o orçamento padrão ao ser importado
+    apply_thread_budget(os.cpu_count() or 1)
+    return Pipeline(stages, queue_size)
+
+def main():
+    """Função principal do pipeline"""
+    from ocr_bulk_job import load_manifest
+
+    parser = argparse.ArgumentParser(description='Processa um lote pelo pipeline em etapas')
+    parser.add_argument('manifest', help='Arquivo com um caminho de imagem por linha, ou uma pasta')
+    parser.add_argument('--device', choices=sorted(DEVICE_STAGES), default='generic')
+    parser.add_argument('--workers', default='', help='Workers por etapa, ex.: decode:1,preprocess:2,ocr:4,parse:1')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument('--no-barcode', action='store_true')
+    parser.add_argument('--no-quality-gate', action='store_true', help='Não recusar imagens ilegíveis antes do OCR')
+    parser.add_argument('--memory-budget', type=float, help='Orçamento de memória por página (MB)')
+    parser.add_argument('--pdf-dir', help='Pasta para o PDF pesquisável de cada página')
+    parser.add_argument('--tiff-dir', help='Pasta para a imagem binarizada (TIFF Grupo 4) de cada página')
+    args = parser.parse_args()
+
+    paths = load_manifest(args.manifest)
+    pipeline = create_pipeline(args.device, parse_workers(args.workers), args.queue_size,
+                               barcode=not args.no_barcode, memory_budget_mb=args.memory_budget,
+                               pdf_dir=args.pdf_dir, quality_gate=not args.no_quality_gate,
+                               tiff_dir=args.tiff_dir)
+
+    # Prints dos scripts vão para o stderr; stdout só tem resultados
+    output = sys.stdout
+    with redirect_stdout(sys.stderr):
+        for item in pipeline.run({'path': path} for path in paths):
+            output.write(json.dumps({'page': item['path'], 'result': item['result']}, ensure_ascii=False) + '\n')
+            output.flush()
+
+    stats = pipeline.stats()
+    print(f"📊 {len(paths)} páginas em {stats['wall_seconds']}s; gargalo: {stats['bottleneck']}", file=sys.stderr)
+    print(json.dumps(stats, ensure_ascii=False, indent=2), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Workers OCR em modelo pré-fork (Linux/macOS)
+O processo pai importa cv2/numpy/pytesseract e os scripts dos dispositivos,
+carrega o índice de clientes, executa uma requisição de aquecimento por
+dispositivo (compila as expressões regulares, carrega bibliotecas tardias)
+e só então cria os workers com fork: as páginas de memória já carregadas
+são compartilhadas (copy-on-write) e um worker novo nasce pronto em
+milissegundos
+
+Usado pelo ocr_scheduler.py (--prefork) e pelo ocr_loadtest.py (--prefork).
+Sozinho, mostra o tempo de criação e a memória compartilhada dos workers:
+
+Uso: python ocr_prefork.py [--workers=4] [--devices=generic,kodak] [--no-warmup]
+"""
+
+import io
+import gc
+import os
+import sys
+import json
+import time
+import base64
+import threading
+from contextlib import redirect_stdout
+
+# Dispositivos carregados no pai por padrão
+DEFAULT_DEVICES = ('generic', 'kodak', 'multifunctional')
+
+_preloaded = {}
+
+# Forks partindo de threads diferentes (reinício de worker) não se sobrepõem
+_fork_lock = threading.Lock()
+
+# Pontas dos pipes abertas no pai; cada filho fecha as dos outros workers,
+# senão um worker nunca veria o fim da entrada quando o pai fechar seu pipe
+_parent_fds = set()
+
+def warmup_image():
+    """Carteira sintética pequena (base64) para a requisição de aquecimento"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (600, 400), 'white')
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(('NOME: JOAO DA SILVA', 'CPF: 529.982.247-25', 'NASCIMENTO: 15/03/1985')):
+        draw.text((40, 60 + index * 50), line, fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+def preload(devices=DEFAULT_DEVICES, workers=None, warmup=True):
+    """
+    Carrega no processo atual tudo o que os workers vão compartilhar.
+
+    Retorna o resumo (tempo de carga e do aquecimento). Chamadas seguintes
+    reaproveitam o que já foi carregado.
+    """
+    if _preloaded:
+        return _preloaded['info']
+
+    started = time.perf_counter()
+    # Orçamento de threads antes de numpy/cv2 (lido na importação dos scripts)
+    workers = workers or os.cpu_count() or 1
+    os.environ.setdefault('OCR_POOL_SIZE', str(workers))
+    from ocr_threads import apply_thread_budget
+    apply_thread_budget(workers)
+
+    import ocr_worker
+    from ocr_dedup import DuplicateIndex
+    from ocr_devices import get_extractor
+
+    with redirect_stdout(sys.stderr):
+        for device in devices:
+            get_extractor(device)
+    clients = ocr_worker.load_client_index()
+    loaded = time.perf_counter()
+
+    warmed = {}
+    if warmup:
+        image = warmup_image()
+        with redirect_stdout(sys.stderr):
+            for device in devices:
+                # A carteira sintética é branca demais para a porta de qualidade: o aquecimento a dispensa
+                result = ocr_worker.handle_request({'image': image, 'device': device, 'dedup': 'off',
+                                                    'quality_gate': False}, DuplicateIndex())
+                warmed[device] = bool(result.get('success'))
+                if not warmed[device]:
+                    print(f"⚠️ Aquecimento do device {device} falhou: {result.get('error', 'sem resultado')}",
+                          file=sys.stderr)
+
+    # Objetos já carregados saem da coleta de lixo: a GC não toca (e não copia) essas páginas
+    gc.collect()
+    gc.freeze()
+
+    info = {
+        'devices': list(devices),
+        'load_seconds': round(loaded - started, 2),
+        'warmup_seconds': round(time.perf_counter() - loaded, 2),
+        'warmup_success': warmed,
+        'client_index': clients is not None
+    }
+    _preloaded.update(info=info, clients=clients)
+    return info
+
+class ForkedWorker:
+    """
+    Worker criado por fork do processo pré-carregado.
+
+    Mesma interface do WorkerProcess do ocr_scheduler.py: requisição JSON
+    por um pipe, resultado por outro. Se o worker morrer, o próximo pedido
+    cria outro por fork, sem recarregar nada.
+    """
+
+    def __init__(self):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('Modelo pré-fork indisponível neste sistema (sem os.fork)')
+        if not _preloaded:
+            preload()
+        self.pid = None
+        self._fork()
+
+    def _fork(self):
+        request_read, request_write = os.pipe()
+        result_read, result_write = os.pipe()
+        with _fork_lock:
+            pid = os.fork()
+
+        if pid == 0:
+            # Processo filho: atende os pedidos do pipe até o pai fechá-lo
+            os.close(request_write)
+            os.close(result_read)
+            for fd in _parent_fds:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            status = 0
+            try:
+                import ocr_worker
+                with os.fdopen(request_read, encoding='utf-8') as requests, \
+                        os.fdopen(result_write, 'w', encoding='utf-8') as output:
+                    ocr_worker.serve(requests, output, _preloaded['clients'])
+            except BaseException:
+                status = 1
+            finally:
+                sys.stderr.flush()
+                os._exit(status)
+
+        os.close(request_read)
+        os.close(result_write)
+        _parent_fds.update((request_write, result_read))
+        self.pid = pid
+        self.requests = os.fdopen(request_write, 'w', encoding='utf-8')
+        self.results = os.fdopen(result_read, encoding='utf-8')
+
+    def _alive(self):
+        try:
+            return os.waitpid(self.pid, os.WNOHANG) == (0, 0)
+        except ChildProcessError:
+            return False
+
+    def process_request(self, request):
+        """Envia a requisição e aguarda o resultado"""
+        if not self._alive():
+            self._close_pipes()
+            self._fork()
+        try:
+            self.requests.write(json.dumps(request, ensure_ascii=False) + '\n')
+            self.requests.flush()
+            line = self.results.readline()
+        except BrokenPipeError:
+            line = ''
+        if not line:
+            return {'success': False, 'error': 'Worker OCR finalizado inesperadamente', 'id': request.get('id')}
+        return json.loads(line)
+
+    def _close_pipes(self):
+        for stream in (self.requests, self.results):
+            if stream.closed:
+                continue
+            _parent_fds.discard(stream.fileno())
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def close(self):
+        self._close_pipes()
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+def memory_sharing(pid):
+    """Memória de um processo (MB): residente, proporcional e privada (Linux)"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return {
+        'rss_mb': round(fields.get('Rss', 0) / 1024, 1),
+        'pss_mb': round(fields.get('Pss', 0) / 1024, 1),
+        'private_mb': round(private / 1024, 1),
+        'shared_mb': round((fields.get('Rss', 0) - private) / 1024, 1)
+    }
+
+def main():
+    """Pré-carrega, cria os workers e mostra tempos e memória compartilhada"""
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    workers = int(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--workers=')),
+                       os.cpu_count() or 1))
+    devices = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--devices=')), None)
+    devices = tuple(devices.split(',')) if devices else DEFAULT_DEVICES
+
+    info = preload(devices, workers, warmup='--no-warmup' not in flags)
+    print(f"📦 Pai carregado em {info['load_seconds']}s, aquecimento em {info['warmup_seconds']}s",
+          file=sys.stderr)
+
+    started = time.perf_counter()
+    pool = [ForkedWorker() for _ in range(workers)]
+    fork_ms = (time.perf_counter() - started) * 1000 / workers
+
+    # Uma requisição por worker, para a memória refletir um worker em uso
+    image = warmup_image()
+    for worker in pool:
+        worker.process_request({'image': image, 'device': devices[0], 'dedup': 'off'})
+
+    report = {
+        'preload': info,
+        'workers': workers,
+        'fork_ms_per_worker': round(fork_ms, 1),
+        'parent_memory': memory_sharing(os.getpid()),
+        'worker_memory': [memory_sharing(worker.pid) for worker in pool]
+    }
+    for worker in pool:
+        worker.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -8,21 +8,40 @@ Configurado para documentos brasileiros (RG/CNH)
 import sys
 import json
 import base64
+
+# Orçamento de threads (precisa ser aplicado antes de numpy/cv2)
+from ocr_threads import apply_thread_budget
+THREAD_BUDGET = apply_thread_budget()
+
 import pytesseract
 from PIL import Image
 import io
 import re
 
-# Configuração do Tesseract
-TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-TESSDATA_PREFIX = r'C:\Program Files\Tesseract-OCR\tessdata'
+from ocr_bands import ocr_image_in_bands
+from ocr_barcode import NO_CODES, decode_document_codes
+from ocr_bitonal import read_archive, save_bitonal_tiff
+from ocr_deadline import Deadline, DeadlineExceeded, timeout_result
+from ocr_memory import check_input_size, memory_report, open_image, plan_memory, release_peak_rss, reset_peak_rss
+from ocr_outputs import ocr_multi_output, save_searchable_pdf, scale_words
+from ocr_profile import profiled
+from ocr_quality import assess_quality, rejection_result
+from ocr_stream import NULL_EMITTER, run_streaming
+
+# Configuração do Tesseract (TESSERACT_CMD e TESSDATA_PREFIX no ambiente
+# sobrescrevem: Linux, ou o stub_tesseract.py do teste de carga)
+import os
+TESSERACT_PATH = os.environ.get('TESSERACT_CMD', r'C:\Program Files\Tesseract-OCR\tesseract.exe')
+TESSDATA_PREFIX = os.environ.get('TESSDATA_PREFIX', r'C:\Program Files\Tesseract-OCR\tessdata')
 pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
 # Configurar variável de ambiente para tessdata
-import os
 os.environ['TESSDATA_PREFIX'] = TESSDATA_PREFIX
 
-def preprocess_image(image):
+# Configurações do Tesseract para português brasileiro
+TESSERACT_CONFIG = r'--oem 1 --psm 1 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,-/:()@ '
+
+def preprocess_image(image, scale_factor=2):
     """Pré-processa a imagem para melhorar a qualidade do OCR"""
     # Converter para escala de cinza
     if image.mode != 'L':
@@ -30,43 +49,150 @@ def preprocess_image(image):
     
     # Aumentar o tamanho da imagem para melhor resolução
     width, height = image.size
-    new_width = width * 2
-    new_height = height * 2
+    new_width = int(width * scale_factor)
+    new_height = int(height * scale_factor)
     image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
     
     return image
 
-def extract_document_data(image_data):
+def extract_document_data(image_data, bands=False, barcode=True, emitter=None, memory_budget_mb=None,
+                          pdf_path=None, deadline_seconds=None, quality_gate=True, tiff_path=None):
     """Extrai dados de documentos brasileiros usando OCR"""
+    emitter = emitter or NULL_EMITTER
+    per_request_peak = reset_peak_rss()
+    deadline = Deadline(deadline_seconds)
+    codes = NO_CODES
     try:
         # Decodificar imagem base64
+        emitter.stage('decode')
         image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
+        image = open_image(io.BytesIO(image_bytes))
+        
+        # Limite rígido de pixels (antes de decodificar) e plano de memória
+        image = check_input_size(image)
+        # Arquivo bitonal (TIFF Grupo 4) já pré-processado: sem ampliação nem pré-processamento
+        archive = read_archive(image)
+        source_size = tuple(archive['source_size']) if archive else image.size
+        memory_plan = plan_memory(image.size, 1 if archive else 2, memory_budget_mb)
+        
+        # Primeira etapa: QR code / código de barras (milissegundos)
+        deadline.check('barcode')
+        emitter.stage('barcode')
+        codes = decode_document_codes(image, parse_document_text) if barcode else NO_CODES
+        emitter.fields(codes['data'], 'barcode', 100)
+        if codes['complete']:
+            print("⚡ Dados lidos do código, OCR dispensado", file=sys.stderr)
+            result = {
+                'success': True,
+                'data': codes['data'],
+                'raw_text': '\n'.join(codes['payloads']),
+                'source': 'barcode',
+                'thread_budget': THREAD_BUDGET,
+                'memory': memory_report(memory_plan, per_request_peak)
+            }
+            emitter.result(result)
+            return result
+        
+        # Verificação de qualidade (milissegundos): imagens sem chance de leitura
+        # são recusadas com o motivo, antes do pré-processamento e do Tesseract
+        quality = None
+        if quality_gate and not archive:
+            emitter.stage('quality')
+            quality = assess_quality(image)
+            if not quality['ok']:
+                result = rejection_result(quality, codes['data'])
+                print(f"🚫 Imagem recusada: {result['error']}", file=sys.stderr)
+                emitter.result(result)
+                return result
         
         # Pré-processar imagem
-        processed_image = preprocess_image(image)
+        deadline.check('preprocess')
+        emitter.stage('preprocess')
+        bitonal = None
+        if archive:
+            processed_image = image.convert('L')
+        else:
+            processed_image = preprocess_image(image, memory_plan['scale_factor'])
+            
+            # Imagem binarizada (Otsu, como o Tesseract) guardada para reprocessar sem o original
+            if tiff_path:
+                bitonal = save_bitonal_tiff(processed_image, tiff_path, image.size, 'generic',
+                                            source_dpi=image.info.get('dpi'))
+                print(f"🗜️ TIFF bitonal gravado em {bitonal['path']} ({bitonal['bytes'] // 1024} KB)",
+                      file=sys.stderr)
         
-                # Configurações do Tesseract para português brasileiro
-                custom_config = r'--oem 1 --psm 1 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,-/:()@ '
-                
-                # Usar inglês por enquanto (português requer instalação manual)
-                text = pytesseract.image_to_string(processed_image, lang='eng', config=custom_config)
+        deadline.check('ocr')
+        emitter.stage('ocr')
+        words = []
+        searchable_pdf = None
+        # O PDF pesquisável precisa da página inteira em uma só execução
+        if bands and not pdf_path:
+            # Páginas inteiras: OCR em faixas paralelas (cada faixa é um bloco)
+            on_text = None
+            if emitter.enabled:
+                def on_text(partial_text):
+                    emitter.fields(parse_document_text(partial_text), 'ocr', None)
+            text = ocr_image_in_bands(processed_image, TESSERACT_CONFIG.replace('--psm 1', '--psm 6'),
+                                      langs=('eng',), on_text=on_text, words=words,
+                                      deadline=deadline)
+        else:
+            # Usar inglês por enquanto (português requer instalação manual)
+            # Uma única execução do Tesseract: texto, palavras (TSV) e PDF pesquisável
+            output = ocr_multi_output(processed_image, TESSERACT_CONFIG, langs=('eng',), pdf=bool(pdf_path),
+                                      deadline=deadline)
+            text, words = output['text'], output['words']
+            if pdf_path:
+                searchable_pdf = save_searchable_pdf(output['pdf'], pdf_path)
+                print(f"📄 PDF pesquisável gravado em {searchable_pdf}", file=sys.stderr)
+        
+        # Caixas das palavras nas coordenadas da imagem original
+        words = scale_words(words, source_size[0] / processed_image.size[0])
         
         # Analisar texto e extrair dados
+        emitter.stage('parse')
         data = parse_document_text(text)
         
-        return {
+        # Campos lidos do código prevalecem sobre o OCR
+        data.update(codes['data'])
+        
+        emitter.fields(data, 'ocr', None)
+        
+        result = {
             'success': True,
             'data': data,
-            'raw_text': text
+            'raw_text': text,
+            'source': 'barcode+ocr' if codes['data'] else 'ocr',
+            'code_fields': sorted(codes['data']),
+            'words': words,
+            'searchable_pdf': searchable_pdf,
+            'bitonal_archive': bitonal,
+            'thread_budget': THREAD_BUDGET,
+            'memory': memory_report(memory_plan, per_request_peak),
+            'quality': quality
         }
+        emitter.result(result)
+        return result
+        
+    except DeadlineExceeded as e:
+        print(f"⏱️ {e}", file=sys.stderr)
+        # Resultado parcial: campos do código e do texto das faixas já lidas
+        data = parse_document_text(e.partial_text) if e.partial_text else {}
+        data.update(codes['data'])
+        result = timeout_result(e, deadline, data)
+        emitter.result(result)
+        return result
         
     except Exception as e:
-        return {
+        result = {
             'success': False,
             'error': str(e),
             'data': {}
         }
+        emitter.result(result)
+        return result
+        
+    finally:
+        release_peak_rss()
 
 def parse_document_text(text):
     """Analisa o texto extraído e identifica campos específicos"""
@@ -207,17 +333,59 @@ def format_cep(cep):
 
 def main():
     """Função principal para processar OCR via linha de comando"""
-    if len(sys.argv) != 2:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    
+    if len(args) != 1:
         print(json.dumps({
             'success': False,
-            'error': 'Uso: python ocr_processor.py <imagem_base64>'
+            'error': 'Uso: python ocr_processor.py <imagem_base64> [--bands] [--no-barcode] [--no-quality-gate] '
+                     '[--stream] [--memory-budget=<MB>] [--pdf=<arquivo>] [--tiff=<arquivo.tif>] '
+                     '[--deadline=<segundos>] [--trace=<arquivo.json>] [--trace-mode=sample|cprofile]'
         }))
         sys.exit(1)
     
     try:
-        image_data = sys.argv[1]
-        result = extract_document_data(image_data)
-        print(json.dumps(result, ensure_ascii=False, indent=2))
+        image_data = args[0]
+        options = {
+            'bands': '--bands' in flags,
+            'barcode': '--no-barcode' not in flags,
+            'quality_gate': '--no-quality-gate' not in flags
+        }
+        
+        # Orçamento de memória por requisição (MB)
+        memory_budget = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--memory-budget=')), None)
+        if memory_budget:
+            options['memory_budget_mb'] = float(memory_budget)
+        
+        # PDF pesquisável gerado na mesma execução do OCR
+        pdf_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--pdf=')), None)
+        if pdf_path:
+            options['pdf_path'] = pdf_path
+        
+        # Imagem binarizada em TIFF Grupo 4 (arquivo digital, reprocessamento)
+        tiff_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--tiff=')), None)
+        if tiff_path:
+            options['tiff_path'] = tiff_path
+        
+        # Prazo da requisição: o Tesseract é encerrado ao esgotá-lo
+        deadline = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--deadline=')), None)
+        if deadline:
+            options['deadline_seconds'] = float(deadline)
+        
+        # Perfil da requisição (trace de etapas e pilhas): só quando pedido
+        extract = extract_document_data
+        trace_path = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--trace=')), None)
+        if trace_path:
+            trace_mode = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--trace-mode=')), 'sample')
+            extract = profiled(extract, trace_path, trace_mode)
+        
+        if '--stream' in flags:
+            # Eventos NDJSON linha a linha (etapas, campos e resultado final)
+            run_streaming(extract, image_data, **options)
+        else:
+            result = extract(image_data, **options)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
         
     except Exception as e:
         print(json.dumps({
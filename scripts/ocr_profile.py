@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfil de execução por requisição (sob demanda)
+Com --trace=<arquivo.json> (CLI), "trace" (worker) ou --trace-dir
+(lote), a requisição grava um trace no formato Chrome Trace Event, aberto
+em https://ui.perfetto.dev, chrome://tracing ou https://www.speedscope.app:
+linha do tempo das etapas (decode, cada operador do pré-processamento,
+cada execução do Tesseract, análise) e o gráfico de chamas das pilhas
+amostradas. No modo cprofile, grava também <arquivo>.prof (pstats,
+aberto com snakeviz ou flameprof) em vez de amostrar as pilhas
+
+Sem perfil, o custo é a leitura de uma variável por operador ou execução
+do Tesseract: o emissor, o cProfile e a thread de amostragem só existem
+durante uma requisição com perfil
+
+Uso: python ocr_profile.py <trace.json> [<trace.prof>]  (resumo das etapas e funções)
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+from ocr_stream import NULL_EMITTER
+
+PROFILE_MODES = ('sample', 'cprofile')
+
+# Intervalo da amostragem de pilhas (milissegundos)
+SAMPLE_INTERVAL_MS = float(os.environ.get('OCR_PROFILE_INTERVAL_MS', 2))
+
+# Profundidade máxima das pilhas amostradas
+MAX_STACK_DEPTH = 64
+
+# Funções listadas no resumo do resultado
+TOP_FUNCTIONS = 10
+
+# Trilha das etapas no trace (as pilhas usam a identificação de cada thread)
+STAGE_TRACK = 0
+
+# Perfil da requisição em andamento neste processo (None: nenhum)
+_active = None
+
+def active_tracer():
+    """Perfil em andamento (None sem perfil: custo de uma leitura de variável)"""
+    return _active
+
+@contextmanager
+def trace_span(name, cat='stage', **args):
+    """Registra um intervalo na linha do tempo, se houver perfil em andamento"""
+    tracer = _active
+    if tracer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.span(name, started, time.perf_counter(), cat, **args)
+
+class TraceEmitter:
+    """
+    Emissor que registra as etapas na linha do tempo e repassa os eventos
+    ao emissor original (streaming NDJSON ou inativo)
+    """
+
+    def __init__(self, inner=None):
+        self.inner = inner or NULL_EMITTER
+        self.enabled = self.inner.enabled
+        self.started = time.perf_counter()
+        self.events = []
+        self.current_stage = None
+        self.stage_started = None
+        # Trilha de etapas por thread: faixas do Tesseract em paralelo não se sobrepõem
+        self.tracks = {threading.get_ident(): STAGE_TRACK}
+
+    def _us(self, instant):
+        return round((instant - self.started) * 1e6, 1)
+
+    def span(self, name, started, finished, cat='stage', **args):
+        """Intervalo completo (evento 'X') na trilha de etapas da thread atual"""
+        track = self.tracks.setdefault(threading.get_ident(), len(self.tracks))
+        self.events.append({'name': name, 'cat': cat, 'ph': 'X', 'ts': self._us(started),
+                            'dur': round((finished - started) * 1e6, 1), 'pid': os.getpid(),
+                            'tid': track, 'args': args})
+
+    def emit(self, event, **fields):
+        self.inner.emit(event, **fields)
+
+    def stage(self, name):
+        self.finish_stage()
+        self.current_stage = name
+        self.stage_started = time.perf_counter()
+        self.inner.stage(name)
+
+    def finish_stage(self):
+        if self.current_stage is not None:
+            self.span(self.current_stage, self.stage_started, time.perf_counter())
+            self.current_stage = None
+        self.inner.finish_stage()
+
+    def fields(self, data, source, confidence):
+        self.inner.fields(data, source, confidence)
+
+    def result(self, result):
+        self.finish_stage()
+        self.inner.result(result)
+
+    def stages(self):
+        """Duração de cada etapa principal (ms), na ordem"""
+        return [{'stage': event['name'], 'ms': round(event['dur'] / 1000, 1)}
+                for event in self.events if event['cat'] == 'stage']
+
+class StackSampler:
+    """Amostra as pilhas de todas as threads em intervalos fixos (thread própria)"""
+
+    def __init__(self, interval_ms=SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='ocr-profile-sampler', daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples.append((now, thread_id, tuple(reversed(stack))))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def trace_events(self, started):
+        """
+        Converte as amostras em intervalos aninhados por thread (gráfico de
+        chamas no tempo): um quadro dura enquanto aparecer nas amostras seguidas
+        """
+        events = []
+        open_frames = {}
+        last_seen = {}
+        pid = os.getpid()
+
+        def close(thread_id, depth, until):
+            frames = open_frames.get(thread_id, [])
+            while len(frames) > depth:
+                name, since = frames.pop()
+                events.append({'name': name, 'cat': 'sample', 'ph': 'X', 'ts': round((since - started) * 1e6, 1),
+                               'dur': round((until - since) * 1e6, 1), 'pid': pid, 'tid': thread_id})
+
+        for now, thread_id, stack in self.samples:
+            frames = open_frames.setdefault(thread_id, [])
+            common = 0
+            while common < len(frames) and common < len(stack) and frames[common][0] == stack[common]:
+                common += 1
+            close(thread_id, common, now)
+            frames.extend((name, now) for name in stack[common:])
+            last_seen[thread_id] = now
+        for thread_id in open_frames:
+            close(thread_id, 0, last_seen[thread_id] + self.interval)
+        return events
+
+def thread_names(pid, tracks):
+    """Nomes das trilhas (eventos de metadados 'M'): etapas e pilhas de cada thread"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': track,
+               'args': {'name': 'etapas' if track == STAGE_TRACK else f"etapas ({names.get(ident, ident)})"}}
+              for ident, track in tracks.items()]
+    events.extend({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': ident, 'args': {'name': name}}
+                  for ident, name in names.items())
+    return events
+
+def top_functions(stats_path, limit=TOP_FUNCTIONS):
+    """Funções de maior tempo próprio no pstats: [{'function', 'calls', 'self_ms', 'total_ms'}]"""
+    stats = pstats.Stats(stats_path)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    return [{'function': f"{name} ({os.path.basename(filename)}:{line})", 'calls': calls,
+             'self_ms': round(self_time * 1000, 1), 'total_ms': round(total_time * 1000, 1)}
+            for (filename, line, name), (_, calls, self_time, total_time, _) in rows]
+
+def run_profiled(extract, trace_path, *args, mode='sample', emitter=None, **kwargs):
+    """
+    Executa a extração com perfil e grava o trace em trace_path.
+
+    O resultado ganha 'profile': caminhos dos arquivos e duração de cada
+    etapa. Perfis simultâneos no mesmo processo não são suportados: o
+    segundo roda sem perfil.
+    """
+    global _active
+
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfil desconhecido: {mode} (use {', '.join(PROFILE_MODES)})")
+    if _active is not None:
+        return extract(*args, emitter=emitter, **kwargs) if emitter else extract(*args, **kwargs)
+
+    tracer = TraceEmitter(emitter)
+    sampler = StackSampler() if mode == 'sample' else None
+    profiler = cProfile.Profile() if mode == 'cprofile' else None
+    _active = tracer
+    try:
+        if sampler:
+            sampler.start()
+        if profiler:
+            profiler.enable()
+        result = extract(*args, emitter=tracer, **kwargs)
+    finally:
+        if profiler:
+            profiler.disable()
+        if sampler:
+            sampler.stop()
+        tracer.finish_stage()
+        _active = None
+
+    pid = os.getpid()
+    events = thread_names(pid, tracer.tracks) + tracer.events + (sampler.trace_events(tracer.started) if sampler else [])
+    os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                   'otherData': {'mode': mode, 'success': result.get('success')}}, f)
+
+    profile = {'trace': trace_path, 'mode': mode, 'stages': tracer.stages()}
+    if profiler:
+        stats_path = os.path.splitext(trace_path)[0] + '.prof'
+        profiler.dump_stats(stats_path)
+        profile.update(pstats=stats_path, top_functions=top_functions(stats_path))
+    else:
+        profile['samples'] = len(sampler.samples)
+    print(f"🔬 Perfil gravado em {trace_path}", file=sys.stderr)
+    # Streaming: o resultado já foi emitido; o perfil segue em um evento próprio
+    tracer.inner.emit('profile', profile=profile)
+    return dict(result, profile=profile)
+
+def profiled(extract, trace_path, mode='sample'):
+    """Função de extração que grava o perfil em trace_path (mesma assinatura)"""
+    def run(*args, **kwargs):
+        return run_profiled(extract, trace_path, *args, mode=mode, **kwargs)
+    return run
+
+def main():
+    """Resumo de um trace gravado (etapas e operadores) e, se informado, do pstats"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not args:
+        print(json.dumps({'success': False, 'error': 'Uso: python ocr_profile.py <trace.json> [<trace.prof>]'}))
+        sys.exit(1)
+
+    with open(args[0], encoding='utf-8') as f:
+        events = json.load(f)['traceEvents']
+    summary = {
+        'timeline': [{'name': event['name'], 'cat': event['cat'], 'start_ms': round(event['ts'] / 1000, 1),
+                      'ms': round(event['dur'] / 1000, 1)}
+                     for event in events if event['ph'] == 'X' and event['cat'] != 'sample'],
+        'sampled_frames': sum(1 for event in events if event.get('cat') == 'sample')
+    }
+    if len(args) > 1:
+        summary['top_functions'] = top_functions(args[1])
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perfis de pré-processamento por dispositivo
+Os valores padrão ficam nos scripts; perfis ajustados por
+tune_device_profile.py ficam em arquivos JSON carregados na inicialização
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+# Diretório dos perfis (pode ser trocado por variável de ambiente)
+PROFILE_DIR = os.environ.get('OCR_PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
+def profile_path(name):
+    """Caminho do arquivo de perfil"""
+    return os.path.join(PROFILE_DIR, f"{name}.json")
+
+def load_profile(device, defaults, name=None):
+    """
+    Carrega o perfil do dispositivo sobre os valores padrão.
+
+    O nome do perfil (modelo do scanner) vem do argumento, da variável
+    OCR_PROFILE_<DEVICE> ou, por fim, do próprio nome do dispositivo.
+    Parâmetros desconhecidos no arquivo são ignorados.
+    """
+    name = name or os.environ.get(f"OCR_PROFILE_{device.upper()}") or device
+    profile = dict(defaults)
+
+    try:
+        with open(profile_path(name), encoding='utf-8') as f:
+            stored = json.load(f)
+    except FileNotFoundError:
+        return profile
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Perfil '{name}' inválido, usando valores padrão: {e}", file=sys.stderr)
+        return profile
+
+    if stored.get('device', device) != device:
+        print(f"⚠️ Perfil '{name}' é de outro dispositivo ({stored.get('device')}), ignorado", file=sys.stderr)
+        return profile
+
+    profile.update({key: value for key, value in stored.get('params', {}).items() if key in defaults})
+    return profile
+
+def save_profile(device, name, params, metrics=None):
+    """Grava um perfil ajustado para ser carregado pelos scripts"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = profile_path(name)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'device': device,
+            'name': name,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'params': params,
+            'metrics': metrics or {}
+        }, f, ensure_ascii=False, indent=2)
+
+    return path
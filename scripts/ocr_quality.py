@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verificação rápida de qualidade da imagem antes do OCR
+Em uma cópia reduzida (milissegundos), mede nitidez (variância do
+Laplaciano), exposição (histograma), cobertura de tinta e área com texto;
+imagens sem chance de leitura são recusadas com o motivo e o que fazer,
+em vez de passar segundos no Tesseract e falhar com confiança baixa
+
+Uso: python ocr_quality.py <imagem> [...]
+"""
+
+import sys
+import json
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Maior lado da cópia analisada (pixels)
+ANALYSIS_SIZE = 640
+
+# Limites de recusa: só casos sem chance de leitura (na dúvida, segue para o OCR)
+QUALITY_THRESHOLDS = {
+    'min_sharpness': 40.0,        # variância do Laplaciano na região do texto
+    'min_brightness': 45.0,       # média de cinza (0-255)
+    'max_dark_fraction': 0.6,     # pixels quase pretos (<= 15)
+    'max_bright_fraction': 0.97,  # pixels estourados (>= 245)
+    'min_ink_coverage': 0.003,    # fração de pixels de tinta (Otsu)
+    'min_text_regions': 2         # regiões com formato de linha de texto (um cartão no vidro A4 tem poucas)
+}
+
+# Motivos de recusa e o que o atendente deve fazer
+REJECTION_MESSAGES = {
+    'blurry': 'Imagem desfocada: mantenha o documento parado e plano e digitalize novamente',
+    'too_dark': 'Imagem escura demais: aumente a iluminação ou a claridade do scanner',
+    'overexposed': 'Imagem clara demais (estourada): reduza a claridade ou evite reflexo no documento',
+    'empty': 'Nenhum documento encontrado: posicione o documento no vidro do scanner',
+    'no_text': 'Pouco texto visível: reposicione o documento com o lado escrito para o vidro'
+}
+
+def analysis_copy(image):
+    """Cópia em cinza com no máximo ANALYSIS_SIZE no maior lado (a imagem original não é alterada)"""
+    factor = max(1, max(image.size) // ANALYSIS_SIZE)
+    small = image.reduce(factor) if factor > 1 else image
+    gray = small.convert('L')
+    scale = ANALYSIS_SIZE / max(gray.size)
+    if scale < 1:
+        gray = gray.resize((max(1, int(gray.size[0] * scale)), max(1, int(gray.size[1] * scale))),
+                           Image.Resampling.BILINEAR)
+    return np.asarray(gray)
+
+def text_regions(gray):
+    """Caixas (x, y, w, h) com formato de linha de texto"""
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Unir letras vizinhas em linhas
+    lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    height = gray.shape[0]
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w >= 2 * h and 3 <= h <= height * 0.15 and w >= 12:
+            boxes.append((x, y, w, h))
+    return boxes
+
+def assess_quality(image, thresholds=None):
+    """
+    Mede a imagem e decide se vale a pena fazer o OCR.
+
+    Retorna {'ok', 'reasons': [{'code', 'message'}], 'metrics', 'elapsed_ms'}.
+    """
+    started = time.perf_counter()
+    thresholds = dict(QUALITY_THRESHOLDS, **(thresholds or {}))
+    gray = analysis_copy(image)
+    pixels = gray.size
+
+    brightness = float(gray.mean())
+    dark_fraction = float(np.count_nonzero(gray <= 15)) / pixels
+    bright_fraction = float(np.count_nonzero(gray >= 245)) / pixels
+
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ink_coverage = float(np.count_nonzero(ink)) / pixels
+
+    boxes = text_regions(gray)
+    text_area = sum(w * h for _, _, w, h in boxes) / pixels
+
+    # Nitidez medida onde há texto, recortado da imagem original: um cartão
+    # pequeno no vidro A4 não dilui a medida nem perde o desfoque na redução
+    region = gray
+    if boxes:
+        ratio = image.size[0] / gray.shape[1]
+        left = min(x for x, _, _, _ in boxes)
+        top = min(y for _, y, _, _ in boxes)
+        right = max(x + w for x, _, w, _ in boxes)
+        bottom = max(y + h for _, y, _, h in boxes)
+        region = analysis_copy(image.crop((int(left * ratio), int(top * ratio),
+                                           int(right * ratio) + 1, int(bottom * ratio) + 1)))
+    sharpness = float(cv2.Laplacian(region, cv2.CV_64F).var())
+
+    reasons = []
+    if brightness < thresholds['min_brightness'] or dark_fraction > thresholds['max_dark_fraction']:
+        reasons.append('too_dark')
+    elif bright_fraction > thresholds['max_bright_fraction']:
+        reasons.append('overexposed')
+    if ink_coverage < thresholds['min_ink_coverage']:
+        reasons.append('empty')
+    elif len(boxes) < thresholds['min_text_regions']:
+        reasons.append('no_text')
+    elif not reasons and sharpness < thresholds['min_sharpness']:
+        # Imagem escura ou estourada também perde contraste: o motivo é a exposição
+        reasons.append('blurry')
+
+    return {
+        'ok': not reasons,
+        'reasons': [{'code': code, 'message': REJECTION_MESSAGES[code]} for code in reasons],
+        'metrics': {
+            'sharpness': round(sharpness, 1),
+            'brightness': round(brightness, 1),
+            'dark_fraction': round(dark_fraction, 3),
+            'bright_fraction': round(bright_fraction, 3),
+            'ink_coverage': round(ink_coverage, 4),
+            'text_area': round(text_area, 4),
+            'text_regions': len(boxes)
+        },
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+def rejection_result(quality, data=None):
+    """Resultado de imagem recusada pela verificação de qualidade"""
+    return {
+        'success': False,
+        'rejected': True,
+        'error': '; '.join(reason['message'] for reason in quality['reasons']),
+        'quality': quality,
+        'data': data or {}
+    }
+
+def main():
+    """Avalia as imagens informadas"""
+    paths = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if not paths:
+        print(json.dumps({'success': False, 'error': 'Uso: python ocr_quality.py <imagem> [...]'}))
+        sys.exit(1)
+
+    for path in paths:
+        with Image.open(path) as image:
+            quality = assess_quality(image)
+        print(json.dumps(dict(quality, path=path), ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reanálise dos textos de OCR já armazenados
+Quando as regras de extração (parse_document_text*) melhoram, aplica as
+novas regras ao raw_text guardado, sem refazer o OCR: lê resultados de
+arquivos JSON por linha (diário do ocr_bulk_job.py ou saída do
+ocr_worker.py) ou do banco do ocr_index.py, reanalisa em paralelo em todos
+os núcleos e grava data/confidence atualizados com um resumo das diferenças
+
+Resultados lidos só do código de barras (source = barcode) são mantidos;
+em barcode+ocr os campos lidos do código (code_fields) prevalecem; sem
+code_fields (resultados antigos), só os essenciais. No banco, a origem fica na
+coluna extraction; linhas indexadas antes dela existir (origem desconhecida)
+são mantidas
+
+Uso:
+  python ocr_reparse.py <diario.jsonl>... --output=<novo.jsonl> [--device=kodak]
+  python ocr_reparse.py --db=<banco.db> [--device=kodak] [--dry-run]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+from ocr_barcode import REQUIRED_FIELDS
+from ocr_pipeline import DEVICE_STAGES
+
+# Registros enviados a cada worker por vez (amortiza a troca entre processos)
+DEFAULT_CHUNK_SIZE = 500
+
+# Exemplos de mudança guardados por campo no resumo
+MAX_EXAMPLES = 3
+
+# Estado de cada processo worker
+_worker = {}
+
+def _init_worker(default_device):
+    """Carrega as funções de análise uma vez por worker"""
+    from ocr_threads import apply_thread_budget
+
+    # Os scripts imprimem o texto analisado: descartar, para não custar mais que a análise
+    sys.stdout = open(os.devnull, 'w')
+    _worker['default_device'] = default_device
+    _worker['functions'] = {}
+    # Só regex: uma thread por worker para OpenCV/BLAS importados pelos scripts
+    apply_thread_budget(os.cpu_count() or 1)
+
+def _functions(device):
+    """(parse, confidence) do dispositivo, importados uma vez"""
+    from ocr_threads import apply_thread_budget
+
+    if device not in _worker['functions']:
+        spec = DEVICE_STAGES[device]
+        module = importlib.import_module(spec['module'])
+        # O módulo aplica o orçamento padrão ao ser importado: voltar a uma thread por worker
+        apply_thread_budget(os.cpu_count() or 1)
+        confidence = getattr(module, spec['confidence']) if spec['confidence'] else None
+        _worker['functions'][device] = (getattr(module, spec['parse']), confidence)
+    return _worker['functions'][device]
+
+def diff_data(old, new):
+    """Campos acrescentados, removidos e alterados: {campo: (antes, depois)}"""
+    changes = {}
+    for field in set(old) | set(new):
+        before, after = old.get(field), new.get(field)
+        if before != after:
+            changes[field] = (before, after)
+    return changes
+
+def reparse_result(result, device):
+    """Aplica as regras atuais ao raw_text; retorna o novo resultado (ou None se mantido)"""
+    source = result.get('source', 'ocr')
+    if not result.get('success') or source not in ('ocr', 'barcode+ocr') or not result.get('raw_text'):
+        return None
+
+    parse, confidence = _functions(device)
+    data = parse(result['raw_text'])
+    old_data = result.get('data', {})
+    if source == 'barcode+ocr':
+        # Campos lidos do código continuam valendo sobre o texto
+        code_fields = result.get('code_fields') or REQUIRED_FIELDS
+        data.update({field: old_data[field] for field in code_fields if old_data.get(field)})
+
+    updated = dict(result, data=data)
+    if confidence:
+        updated['confidence'] = confidence(data)
+    return updated
+
+def reparse_chunk(items):
+    """
+    Reanalisa um lote de registros.
+
+    Cada item é uma linha JSON (diário/saída do worker) ou uma linha do
+    banco (source, device, extraction, code_fields, confidence, data, raw_text). Retorna, por item:
+    (linha ou registro atualizado, mudanças, confiança antes, confiança depois, erro).
+    """
+    outputs = []
+    for item in items:
+        try:
+            if isinstance(item, str):
+                record = json.loads(item)
+                result = record.get('result', record)
+                device = result.get('device_type') or _worker['default_device']
+            else:
+                source, device, extraction, code_fields, confidence, data, raw_text = item
+                device = device or _worker['default_device']
+                result = {'success': True, 'source': extraction, 'confidence': confidence,
+                          'data': json.loads(data or '{}'), 'raw_text': raw_text}
+                if code_fields is not None:
+                    result['code_fields'] = json.loads(code_fields)
+                record = None
+
+            updated = reparse_result(result, device)
+            if updated is None:
+                outputs.append((item if record is not None else None, None, None, None, None))
+                continue
+
+            changes = diff_data(result.get('data', {}), updated['data'])
+            if record is not None:
+                if 'result' in record:
+                    record['result'] = updated
+                else:
+                    record = updated
+                output = json.dumps(record, ensure_ascii=False) + '\n' if changes else item
+            else:
+                output = (updated, source, device) if changes else None
+            outputs.append((output, changes, result.get('confidence'), updated.get('confidence'), None))
+        except Exception as e:
+            outputs.append((item if isinstance(item, str) else None, None, None, None, str(e)))
+    return outputs
+
+class DiffSummary:
+    """Contagens da reanálise e mudanças por campo"""
+
+    def __init__(self):
+        self.records = 0
+        self.changed = 0
+        self.kept = 0
+        self.errors = 0
+        self.fields = {}
+        self.confidence_delta = 0.0
+        self.confidence_count = 0
+
+    def add(self, changes, old_confidence, new_confidence, error):
+        self.records += 1
+        if error:
+            self.errors += 1
+            return
+        if changes is None:
+            self.kept += 1
+            return
+        if changes:
+            self.changed += 1
+        if old_confidence is not None and new_confidence is not None:
+            self.confidence_delta += new_confidence - old_confidence
+            self.confidence_count += 1
+
+        for field, (before, after) in changes.items():
+            kind = 'added' if before is None else 'removed' if after is None else 'changed'
+            stats = self.fields.setdefault(field, {'added': 0, 'removed': 0, 'changed': 0, 'examples': []})
+            stats[kind] += 1
+            if len(stats['examples']) < MAX_EXAMPLES:
+                stats['examples'].append({'before': before, 'after': after})
+
+    def report(self, elapsed):
+        return {
+            'records': self.records,
+            'changed': self.changed,
+            'unchanged': self.records - self.changed - self.kept - self.errors,
+            'kept': self.kept,
+            'errors': self.errors,
+            'mean_confidence_delta': (round(self.confidence_delta / self.confidence_count, 2)
+                                      if self.confidence_count else None),
+            'fields': dict(sorted(self.fields.items())),
+            'elapsed_seconds': round(elapsed, 1),
+            'records_per_second': round(self.records / elapsed) if elapsed else None
+        }
+
+def read_lines(paths):
+    """Linhas não vazias dos arquivos JSON por linha"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line if line.endswith('\n') else line + '\n'
+
+def read_rows(db_path):
+    """Documentos do banco do índice (conexão só de leitura, separada da escrita)"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(documents)')}
+        # Banco de antes das colunas extraction/code_fields/confidence: origem desconhecida
+        extra = ', '.join(column if column in columns else 'NULL'
+                          for column in ('extraction', 'code_fields', 'confidence'))
+        yield from conn.execute(f"SELECT source, device, {extra}, data, raw_text FROM documents ORDER BY id")
+    finally:
+        conn.close()
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def reparse(items, default_device, workers, chunk_size, summary):
+    """Reanalisa em paralelo, na ordem de entrada; gera as saídas de cada registro"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(default_device,)) as executor:
+        for outputs in executor.map(reparse_chunk, chunked(items, chunk_size)):
+            for output, changes, old_confidence, new_confidence, error in outputs:
+                summary.add(changes, old_confidence, new_confidence, error)
+                yield output
+
+def main():
+    """Função principal da reanálise"""
+    parser = argparse.ArgumentParser(description='Reaplica as regras de extração ao texto de OCR armazenado')
+    parser.add_argument('inputs', nargs='*', help='Arquivos JSON por linha (diário ou saída do worker)')
+    parser.add_argument('--db', help='Banco do ocr_index.py (atualizado no lugar)')
+    parser.add_argument('--output', help='Arquivo JSON por linha com os resultados atualizados')
+    parser.add_argument('--device', choices=sorted(DEVICE_STAGES), default='generic',
+                        help='Dispositivo dos registros sem device_type')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help='Só o resumo das diferenças, sem gravar')
+    args = parser.parse_args()
+
+    if bool(args.inputs) == bool(args.db) or (args.inputs and not args.output and not args.dry_run):
+        parser.error('informe arquivos com --output (ou --dry-run), ou --db')
+
+    summary = DiffSummary()
+    started = time.perf_counter()
+
+    if args.db:
+        from ocr_index import OcrIndex
+
+        outputs = reparse(read_rows(args.db), args.device, args.workers, args.chunk_size, summary)
+        updates = (output for output in outputs if output is not None)
+        if args.dry_run:
+            for _ in updates:
+                pass
+        else:
+            index = OcrIndex(args.db)
+            index.add_many(updates)
+            index.close()
+    else:
+        outputs = reparse(read_lines(args.inputs), args.device, args.workers, args.chunk_size, summary)
+        if args.dry_run:
+            for _ in outputs:
+                pass
+        else:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                for output in outputs:
+                    if output is not None:
+                        f.write(output)
+
+    report = summary.report(time.perf_counter() - started)
+    print(f"✅ {report['records']} registros reanalisados, {report['changed']} alterados, "
+          f"{report['errors']} erros ({report['records_per_second']}/s)", file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agendador com prioridade na frente dos workers OCR
+Atendimento no balcão (interactive) passa à frente de lotes (bulk); parte
+dos workers fica reservada para o balcão, e como os lotes são enviados
+página a página, uma requisição do balcão entra já na próxima página livre
+
+Serviço: lê requisições do ocr_worker.py (uma por linha, com "priority":
+"interactive" ou "bulk") e escreve cada resultado ao concluir (fora de
+ordem, identificado por "id"); {"cmd": "stats"} devolve as estatísticas.
+Páginas de lote devem vir com "path" em vez de "image": a leitura do stdin
+nunca bloqueia, para o balcão não esperar atrás de um lote na fila
+
+Com --prefork, os workers são criados por fork de um processo já carregado
+(ocr_prefork.py) e compartilham a memória dos módulos e índices
+
+Uso: python ocr_scheduler.py [--workers=4] [--reserved=1] [--prefork] < requisicoes.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from functools import partial
+from collections import deque
+from concurrent.futures import Future
+
+PRIORITY_CLASSES = ('interactive', 'bulk')
+
+# Workers reservados para o balcão (lotes nunca ocupam estes)
+DEFAULT_RESERVED = int(os.environ.get('OCR_RESERVED_INTERACTIVE', '1'))
+
+# Páginas de lote aguardando na fila; acima disso submit() bloqueia o lote
+# (None = sem limite, usado pelo serviço, que recebe só caminhos)
+MAX_BULK_QUEUE = 64
+
+# Amostras mantidas por classe para os percentis
+STATS_WINDOW = 2000
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_worker.py')
+
+def percentile(values, fraction):
+    """Percentil simples (valor mais próximo) de uma lista"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+class WorkerProcess:
+    """
+    Um processo ocr_worker.py atendendo uma requisição por vez.
+
+    pool_size: workers do pool, repassado em OCR_POOL_SIZE para o orçamento
+    de threads do filho dividir os núcleos entre eles (ocr_threads.py)
+    """
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+        self.process = None
+
+    def _start(self):
+        env = dict(os.environ, OCR_POOL_SIZE=str(self.pool_size)) if self.pool_size else None
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='utf-8', bufsize=1, env=env
+        )
+
+    def process_request(self, request):
+        """Envia a requisição e aguarda o resultado"""
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+        self.process.stdin.write(json.dumps(request, ensure_ascii=False) + '\n')
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            # Worker morreu no meio da requisição: o próximo pedido reinicia
+            return {'success': False, 'error': 'Worker OCR finalizado inesperadamente', 'id': request.get('id')}
+        return json.loads(line)
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+class ClassStats:
+    """Contadores e tempos de uma classe de prioridade"""
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.running = 0
+        self.max_queue = 0
+        self.waits = deque(maxlen=STATS_WINDOW)
+        self.services = deque(maxlen=STATS_WINDOW)
+
+    def snapshot(self, queued):
+        waits, services = list(self.waits), list(self.services)
+        return {
+            'queued': queued,
+            'running': self.running,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'max_queue': self.max_queue,
+            'wait_ms_p50': percentile(waits, 0.5),
+            'wait_ms_p95': percentile(waits, 0.95),
+            'wait_ms_max': max(waits) if waits else None,
+            'service_ms_p50': percentile(services, 0.5),
+            'service_ms_p95': percentile(services, 0.95)
+        }
+
+class PriorityScheduler:
+    """
+    Distribui requisições entre workers por classe de prioridade.
+
+    Cada worker pega a próxima requisição do balcão, se houver; páginas de
+    lote só ocupam até (workers - reservados) workers ao mesmo tempo.
+    """
+
+    def __init__(self, workers, reserved=DEFAULT_RESERVED, worker_factory=None,
+                 max_bulk_queue=MAX_BULK_QUEUE):
+        # Padrão: processos ocr_worker.py com os núcleos divididos entre os workers
+        worker_factory = worker_factory or partial(WorkerProcess, workers)
+        self.workers = workers
+        self.reserved = min(reserved, workers - 1) if workers > 1 else 0
+        self.max_bulk_queue = max_bulk_queue
+        self.queues = {name: deque() for name in PRIORITY_CLASSES}
+        self.stats_by_class = {name: ClassStats() for name in PRIORITY_CLASSES}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.threads = [
+            threading.Thread(target=self._run_worker, args=(worker_factory(),), daemon=True)
+            for _ in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, request, priority='bulk'):
+        """Enfileira uma requisição e retorna um Future com o resultado"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Prioridade desconhecida: {priority} (use {', '.join(PRIORITY_CLASSES)})")
+
+        future = Future()
+        with self.condition:
+            # Contrapressão: um lote de 10.000 páginas não fica inteiro na memória
+            while (priority == 'bulk' and self.max_bulk_queue
+                   and len(self.queues['bulk']) >= self.max_bulk_queue):
+                self.condition.wait()
+            self.queues[priority].append((request, future, time.monotonic()))
+            stats = self.stats_by_class[priority]
+            stats.submitted += 1
+            stats.max_queue = max(stats.max_queue, len(self.queues[priority]))
+            self.condition.notify_all()
+        return future
+
+    def _next_job(self):
+        """Próxima requisição respeitando prioridade e reserva (bloqueia)"""
+        with self.condition:
+            while True:
+                if self.queues['interactive']:
+                    priority = 'interactive'
+                    break
+                bulk_limit = self.workers - self.reserved
+                if self.queues['bulk'] and self.stats_by_class['bulk'].running < bulk_limit:
+                    priority = 'bulk'
+                    break
+                if self.closed and not any(self.queues.values()):
+                    return None
+                self.condition.wait()
+
+            request, future, submitted_at = self.queues[priority].popleft()
+            stats = self.stats_by_class[priority]
+            stats.running += 1
+            stats.waits.append(round((time.monotonic() - submitted_at) * 1000, 1))
+            self.condition.notify_all()
+            return priority, request, future
+
+    def _run_worker(self, worker):
+        """Laço de um worker"""
+        while True:
+            job = self._next_job()
+            if job is None:
+                worker.close()
+                return
+
+            priority, request, future = job
+            started = time.monotonic()
+            try:
+                future.set_result(worker.process_request(request))
+            except Exception as e:
+                future.set_result({'success': False, 'error': str(e), 'id': request.get('id')})
+
+            with self.condition:
+                stats = self.stats_by_class[priority]
+                stats.running -= 1
+                stats.completed += 1
+                stats.services.append(round((time.monotonic() - started) * 1000, 1))
+                # Libera um worker de lote ou um submit() aguardando espaço
+                self.condition.notify_all()
+
+    def stats(self):
+        """Fila, execução e tempos de espera por classe"""
+        with self.condition:
+            return {
+                'workers': self.workers,
+                'reserved_interactive': self.reserved,
+                'classes': {
+                    name: self.stats_by_class[name].snapshot(len(self.queues[name]))
+                    for name in PRIORITY_CLASSES
+                }
+            }
+
+    def close(self):
+        """Processa o que falta na fila e encerra os workers"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+def main():
+    """Serviço de agendamento: requisições no stdin, resultados no stdout"""
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    workers = int(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--workers=')),
+                       os.cpu_count() or 1))
+    reserved = int(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--reserved=')),
+                        DEFAULT_RESERVED))
+
+    worker_factory = None
+    if '--prefork' in flags:
+        from ocr_prefork import ForkedWorker, preload
+        info = preload(workers=workers)
+        print(f"📦 Workers pré-carregados em {info['load_seconds'] + info['warmup_seconds']:.1f}s", file=sys.stderr)
+        worker_factory = ForkedWorker
+
+    scheduler = PriorityScheduler(workers, reserved, worker_factory, max_bulk_queue=None)
+    output_lock = threading.Lock()
+
+    def write(message):
+        with output_lock:
+            sys.stdout.write(json.dumps(message, ensure_ascii=False) + '\n')
+            sys.stdout.flush()
+
+    print(f"🚦 Agendador: {scheduler.workers} workers, {scheduler.reserved} reservados para o balcão",
+          file=sys.stderr)
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            if request.get('cmd') == 'stats':
+                write({'stats': scheduler.stats()})
+                continue
+            priority = request.pop('priority', 'bulk')
+            future = scheduler.submit(request, priority)
+            future.add_done_callback(lambda done: write(done.result()))
+        except Exception as e:
+            write({'success': False, 'error': str(e), 'id': request_id})
+
+    scheduler.close()
+    print(json.dumps(scheduler.stats(), ensure_ascii=False, indent=2), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming de eventos NDJSON durante o processamento OCR
+Permite à interface preencher CPF e nome assim que forem encontrados,
+sem esperar o resultado completo
+"""
+
+import sys
+import json
+import time
+from contextlib import redirect_stdout
+
+class NdjsonEmitter:
+    """Emite um objeto JSON por linha a cada etapa, campo encontrado e resultado"""
+
+    enabled = True
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.started = time.perf_counter()
+        self.current_stage = None
+        self.stage_started = None
+        self.sent_fields = {}
+
+    def _elapsed_ms(self, since=None):
+        return round((time.perf_counter() - (since or self.started)) * 1000, 1)
+
+    def emit(self, event, **fields):
+        """Escreve um evento e força o envio imediato"""
+        payload = {'event': event, 't_ms': self._elapsed_ms()}
+        payload.update(fields)
+        self.stream.write(json.dumps(payload, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def stage(self, name):
+        """Encerra a etapa atual (se houver) e inicia a próxima"""
+        self.finish_stage()
+        self.current_stage = name
+        self.stage_started = time.perf_counter()
+        self.emit('stage_started', stage=name)
+
+    def finish_stage(self):
+        """Encerra a etapa atual informando a duração"""
+        if self.current_stage is not None:
+            self.emit('stage_finished', stage=self.current_stage,
+                      elapsed_ms=self._elapsed_ms(self.stage_started))
+            self.current_stage = None
+
+    def fields(self, data, source, confidence):
+        """Emite apenas os campos novos ou alterados desde o último envio"""
+        for field, value in data.items():
+            if self.sent_fields.get(field) != value:
+                self.sent_fields[field] = value
+                self.emit('field', field=field, value=value, source=source, confidence=confidence)
+
+    def result(self, result):
+        """Emite o resultado final (mesmo formato da saída sem streaming)"""
+        self.finish_stage()
+        self.emit('result', result=result)
+
+class NullEmitter:
+    """Emissor inativo: usado quando o streaming não foi solicitado"""
+
+    enabled = False
+
+    def emit(self, event, **fields):
+        pass
+
+    def stage(self, name):
+        pass
+
+    def finish_stage(self):
+        pass
+
+    def fields(self, data, source, confidence):
+        pass
+
+    def result(self, result):
+        pass
+
+NULL_EMITTER = NullEmitter()
+
+def run_streaming(extract, *args, **kwargs):
+    """Executa a extração emitindo NDJSON no stdout (diagnósticos vão para o stderr)"""
+    emitter = NdjsonEmitter(sys.stdout)
+    with redirect_stdout(sys.stderr):
+        return extract(*args, emitter=emitter, **kwargs)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Orçamento de threads para OpenCV, NumPy (BLAS) e Tesseract (OpenMP)
+Evita que vários jobs OCR simultâneos disputem todos os núcleos
+
+Deve ser importado antes de numpy/cv2: as bibliotecas BLAS leem as
+variáveis de ambiente apenas no carregamento.
+"""
+
+import os
+import sys
+import json
+
+# Variáveis lidas pelas bibliotecas BLAS/OpenMP no carregamento
+BLAS_THREAD_VARS = [
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS'
+]
+
+_current_budget = None
+
+def _cgroup_cpu_limit():
+    """Lê o limite de CPU do cgroup (Docker), se houver"""
+    # cgroup v2: "quota period" ou "max period"
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            return max(1, int(int(quota) / int(period)))
+        return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return max(1, int(quota / period))
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+def available_cpus():
+    """Retorna (núcleos disponíveis, origem do valor)"""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus, source = len(os.sched_getaffinity(0)), 'affinity'
+    else:
+        cpus, source = os.cpu_count() or 1, 'cpu_count'
+
+    cgroup_limit = _cgroup_cpu_limit()
+    if cgroup_limit is not None and cgroup_limit < cpus:
+        cpus, source = cgroup_limit, 'cgroup'
+
+    return cpus, source
+
+def plan_thread_budget(pool_size=None):
+    """Calcula quantas threads cada worker OCR pode usar"""
+    if pool_size is None:
+        pool_size = int(os.environ.get('OCR_POOL_SIZE', '1'))
+    pool_size = max(1, pool_size)
+
+    cpus, source = available_cpus()
+    threads_per_worker = int(os.environ.get('OCR_THREADS_PER_WORKER', '0')) or max(1, cpus // pool_size)
+
+    return {
+        'cpus': cpus,
+        'cpu_source': source,
+        'pool_size': pool_size,
+        'threads_per_worker': threads_per_worker,
+        'oversubscribed': pool_size * threads_per_worker > cpus
+    }
+
+def apply_thread_budget(pool_size=None):
+    """Aplica o orçamento ao processo atual e retorna o layout escolhido"""
+    global _current_budget
+
+    budget = plan_thread_budget(pool_size)
+    threads = str(budget['threads_per_worker'])
+
+    for var in BLAS_THREAD_VARS:
+        os.environ[var] = threads
+    # Lido por cada processo filho do Tesseract
+    os.environ['OMP_THREAD_LIMIT'] = threads
+
+    # BLAS já carregado (numpy importado antes): ajustar em tempo de execução
+    if 'numpy' in sys.modules:
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(budget['threads_per_worker'])
+        except ImportError:
+            budget['blas_runtime_limit'] = False
+
+    try:
+        import cv2
+        cv2.setNumThreads(budget['threads_per_worker'])
+    except ImportError:
+        pass
+
+    _current_budget = budget
+    return budget
+
+def current_thread_budget():
+    """Retorna o orçamento aplicado (aplicando o padrão se necessário)"""
+    return _current_budget or apply_thread_budget()
+
+def tesseract_env(threads=None):
+    """
+    Ambiente de um processo do Tesseract com threads OpenMP (None: o do processo).
+
+    O limite vai só para aquele processo filho: o os.environ é compartilhado
+    por todas as threads, e alterá-lo afetaria chamadas simultâneas.
+    """
+    return dict(os.environ, OMP_THREAD_LIMIT=str(threads)) if threads else os.environ
+
+def main():
+    """Mostra o layout de threads para um tamanho de pool"""
+    pool_size = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(json.dumps(plan_thread_budget(pool_size), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
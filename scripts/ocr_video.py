@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OCR a partir de vídeo ou câmera (webcam no balcão)
+Lê os quadros de um arquivo de vídeo ou de um dispositivo de captura,
+pontua cada quadro em uma cópia reduzida (nitidez na região do texto,
+documento presente, pouco movimento) e envia ao OCR só o melhor quadro
+(ou alguns, bem separados no tempo), em vez de um quadro qualquer borrado
+
+Uso:
+  python ocr_video.py <video.mp4> [--device=kodak] [--top=1] [--step=1]
+  python ocr_video.py <indice_da_camera> [--seconds=5] [...]
+  Outras opções: --no-barcode, --no-quality-gate, --deadline=<segundos>, --dry-run (só pontua)
+"""
+
+import sys
+import json
+import time
+import base64
+from contextlib import redirect_stdout
+
+import cv2
+
+from ocr_barcode import REQUIRED_FIELDS
+from ocr_devices import get_extractor
+from ocr_quality import ANALYSIS_SIZE, QUALITY_THRESHOLDS, text_regions
+
+# Tempo de captura padrão de uma câmera (segundos)
+DEFAULT_CAPTURE_SECONDS = 5
+
+# Fração do quadro coberta por texto a partir da qual o documento conta como inteiro
+FULL_TEXT_AREA = 0.05
+
+# Intervalo mínimo entre quadros escolhidos (segundos): quadros vizinhos são quase iguais
+MIN_SELECTION_GAP = 0.5
+
+# Candidatos guardados por quadro escolhido (quadros inteiros ficam na memória)
+CANDIDATES_PER_PICK = 4
+
+def open_capture(source):
+    """Arquivo de vídeo ou índice de dispositivo de captura ('0', '1', ...)"""
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        raise ValueError(f"Não foi possível abrir o vídeo ou a câmera: {source}")
+    return capture
+
+def score_frame(frame, previous=None):
+    """
+    Pontua um quadro BGR; retorna (métricas, cinza reduzido para o próximo quadro).
+
+    score = nitidez na região do texto x cobertura do documento, reduzido
+    pelo movimento em relação ao quadro anterior.
+    """
+    height, width = frame.shape[:2]
+    scale = min(1.0, ANALYSIS_SIZE / max(height, width))
+    small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1 else frame
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    boxes = text_regions(gray)
+    text_area = sum(w * h for _, _, w, h in boxes) / gray.size
+    region = gray
+    if boxes:
+        left = min(x for x, _, _, _ in boxes)
+        top = min(y for _, y, _, _ in boxes)
+        right = max(x + w for x, _, w, _ in boxes)
+        bottom = max(y + h for _, y, _, h in boxes)
+        region = gray[top:bottom, left:right]
+    sharpness = float(cv2.Laplacian(region, cv2.CV_64F).var())
+    motion = float(cv2.absdiff(gray, previous).mean()) if previous is not None and previous.shape == gray.shape else 0.0
+
+    present = len(boxes) >= QUALITY_THRESHOLDS['min_text_regions']
+    score = sharpness * min(1.0, text_area / FULL_TEXT_AREA) / (1 + motion / 10) if present else 0.0
+    return {
+        'score': round(score, 1),
+        'sharpness': round(sharpness, 1),
+        'text_area': round(text_area, 4),
+        'text_regions': len(boxes),
+        'motion': round(motion, 2)
+    }, gray
+
+def spread(candidates, limit):
+    """Os melhores candidatos (métricas, quadro), separados no tempo por MIN_SELECTION_GAP"""
+    picked = []
+    for metrics, frame in sorted(candidates, key=lambda item: item[0]['score'], reverse=True):
+        if all(abs(metrics['time'] - other['time']) >= MIN_SELECTION_GAP for other, _ in picked):
+            picked.append((metrics, frame))
+            if len(picked) == limit:
+                break
+    return picked
+
+def best_frames(capture, top=1, step=1, max_seconds=None):
+    """
+    Lê os quadros e retorna ([(métricas, quadro BGR)], estatísticas da leitura).
+
+    step: pontua um quadro a cada step (os demais só são avançados).
+    max_seconds: limite de captura (câmeras; arquivos vão até o fim).
+    """
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    started = time.perf_counter()
+    candidates = []
+    previous = None
+    index = scored = 0
+
+    while max_seconds is None or time.perf_counter() - started < max_seconds:
+        if not capture.grab():
+            break
+        index += 1
+        if (index - 1) % step:
+            continue
+        ok, frame = capture.retrieve()
+        if not ok:
+            break
+        metrics, previous = score_frame(frame, previous)
+        scored += 1
+        if metrics['score'] <= 0:
+            continue
+        metrics.update(frame=index - 1, time=round((index - 1) / fps, 2))
+        candidates.append((metrics, frame))
+        # Só os melhores ficam na memória
+        if len(candidates) > top * CANDIDATES_PER_PICK * 2:
+            candidates = spread(candidates, top * CANDIDATES_PER_PICK)
+
+    picked = spread(candidates, top)
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'frames_read': index,
+        'frames_scored': scored,
+        'scoring_seconds': round(elapsed, 2),
+        'ms_per_frame': round(elapsed * 1000 / scored, 1) if scored else None
+    }
+    return picked, stats
+
+def encode_frame(frame):
+    """Quadro BGR em PNG base64 (sem perda), entrada das funções de extração"""
+    ok, buffer = cv2.imencode('.png', frame)
+    if not ok:
+        raise ValueError('Falha ao codificar o quadro')
+    return base64.b64encode(buffer.tobytes()).decode('ascii')
+
+def result_rank(result):
+    """Ordem entre resultados de quadros: sucesso, campos essenciais, total de campos"""
+    data = result.get('data', {})
+    return (bool(result.get('success')), sum(1 for field in REQUIRED_FIELDS if data.get(field)),
+            sum(1 for value in data.values() if value), result.get('confidence') or 0)
+
+def extract_from_video(source, device='generic', top=1, step=1, max_seconds=None, **options):
+    """Escolhe os melhores quadros e devolve o resultado de OCR do melhor deles"""
+    capture = open_capture(source)
+    try:
+        # Câmera sem limite informado: capturar por alguns segundos
+        if max_seconds is None and str(source).isdigit():
+            max_seconds = DEFAULT_CAPTURE_SECONDS
+        picked, stats = best_frames(capture, top, step, max_seconds)
+    finally:
+        capture.release()
+
+    if not picked:
+        return {
+            'success': False,
+            'error': 'Nenhum quadro com documento legível: aproxime o documento da câmera e mantenha-o parado',
+            'data': {},
+            'video': dict(stats, selected=[])
+        }
+
+    extract = get_extractor(device)
+    best = None
+    for metrics, frame in picked:
+        result = extract(encode_frame(frame), **options)
+        result['frame'] = metrics
+        if best is None or result_rank(result) > result_rank(best):
+            best = result
+    best['video'] = dict(stats, selected=[metrics for metrics, _ in picked])
+    return best
+
+def main():
+    """Função principal para processar vídeo ou câmera via linha de comando"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+
+    if len(args) != 1:
+        print(json.dumps({
+            'success': False,
+            'error': 'Uso: python ocr_video.py <video|indice_da_camera> [--device=<dispositivo>] [--top=1] '
+                     '[--step=1] [--seconds=<segundos>] [--no-barcode] [--no-quality-gate] '
+                     '[--deadline=<segundos>] [--dry-run]'
+        }))
+        sys.exit(1)
+
+    try:
+        device = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--device=')), 'generic')
+        top = int(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--top=')), 1))
+        step = int(next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--step=')), 1))
+        seconds = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--seconds=')), None)
+        seconds = float(seconds) if seconds else None
+
+        if '--dry-run' in flags:
+            # Só a pontuação dos quadros, sem OCR
+            capture = open_capture(args[0])
+            try:
+                picked, stats = best_frames(capture, top, step, seconds)
+            finally:
+                capture.release()
+            print(json.dumps(dict(stats, selected=[metrics for metrics, _ in picked]), ensure_ascii=False, indent=2))
+            return
+
+        options = {
+            'barcode': '--no-barcode' not in flags,
+            'quality_gate': '--no-quality-gate' not in flags
+        }
+        deadline = next((flag.split('=', 1)[1] for flag in flags if flag.startswith('--deadline=')), None)
+        if deadline:
+            options['deadline_seconds'] = float(deadline)
+
+        # Prints dos scripts vão para o stderr; stdout só tem o resultado
+        with redirect_stdout(sys.stderr):
+            result = extract_from_video(args[0], device, top, step, seconds, **options)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    except Exception as e:
+        print(json.dumps({
+            'success': False,
+            'error': str(e)
+        }))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker OCR de longa duração
+Lê requisições JSON (uma por linha) do stdin e escreve um resultado JSON por
+linha no stdout, mantendo módulos carregados e o índice de quase-duplicatas
+entre requisições
+
+Requisição: {"id": "...", "image": "<base64>", "device": "kodak" | "auto",
+             "bands": false, "barcode": true, "memory_budget_mb": null,
+             "pdf_path": null, "tiff_path": null, "deadline_seconds": null, "quality_gate": true,
+             "dedup": "off" | "reuse" | "seed",
+             "trace": null, "trace_mode": "sample" | "cprofile"}
+Em vez de "image", "path" aponta para o arquivo da imagem (páginas de lote)
+Com "pair": true, "back" (ou "back_path") traz o outro lado do documento;
+sem ele, "image" é uma digitalização com os dois lados (ocr_pairing.py)
+
+Com OCR_INDEX_DB=<banco.db>, cada resultado novo é gravado no índice de
+texto completo (ocr_index.py); com OCR_CLIENT_INDEX=<clientes.idx>, o resultado
+traz os clientes já cadastrados que podem ser a mesma pessoa (client_matcher.py)
+
+Uso: python ocr_worker.py < requisicoes.jsonl
+"""
+
+import os
+import sys
+import json
+import base64
+import hashlib
+from contextlib import redirect_stdout
+
+from client_matcher import ClientIndex
+from ocr_barcode import REQUIRED_FIELDS
+from ocr_dedup import (DEFAULT_MAX_DISTANCE, DEFAULT_WINDOW_SECONDS, DuplicateIndex, fingerprint_from_bytes,
+                       seed_from_previous)
+from ocr_devices import get_extractor
+from ocr_index import OcrIndex
+from ocr_pairing import extract_pair
+from ocr_profile import profiled
+
+# Modo padrão de quase-duplicatas: 'reuse' devolve o resultado anterior,
+# 'seed' reprocessa e completa os campos faltantes, 'off' desativa. Desativado
+# por padrão: com o modo ligado, o anterior só é usado se o texto conferir
+DEFAULT_DEDUP_MODE = os.environ.get('OCR_DEDUP_MODE', 'off')
+
+# Opções da requisição repassadas à função de extração
+EXTRACT_OPTIONS = ('bands', 'barcode', 'memory_budget_mb', 'pdf_path', 'tiff_path', 'deadline_seconds',
+                   'quality_gate')
+
+def is_complete(result):
+    """Resultado anterior com sucesso e com todos os campos essenciais"""
+    data = result.get('data', {})
+    return result.get('success') and all(data.get(field) for field in REQUIRED_FIELDS)
+
+def request_image(request, field='image', path_field='path'):
+    """Imagem da requisição em base64 (campo "image" ou arquivo em "path")"""
+    if field not in request and path_field in request:
+        with open(request[path_field], 'rb') as f:
+            return base64.b64encode(f.read()).decode('ascii')
+    return request[field]
+
+def document_key(request):
+    """
+    Chave do documento no índice de texto: hash do conteúdo da imagem (e do
+    verso). Ids de requisição se repetem entre clientes e podem faltar; a
+    mesma imagem reenviada atualiza a mesma linha
+    """
+    digest = hashlib.sha256(request_image(request).encode('ascii'))
+    if 'back' in request or 'back_path' in request:
+        digest.update(request_image(request, 'back', 'back_path').encode('ascii'))
+    return f"sha256:{digest.hexdigest()}"
+
+def handle_request(request, index):
+    """Processa uma requisição, consultando o índice de quase-duplicatas"""
+    image = request_image(request)
+    device = request.get('device', 'generic')
+    mode = request.get('dedup', DEFAULT_DEDUP_MODE)
+    # Frente e verso: os dois lados em paralelo, sem consulta de quase-duplicatas
+    extract = extract_pair if request.get('pair') else get_extractor(device)
+    options = {key: request[key] for key in EXTRACT_OPTIONS if key in request}
+    if request.get('trace'):
+        # Perfil desta requisição (ocr_profile.py), gravado no caminho pedido
+        extract = profiled(extract, request['trace'], request.get('trace_mode', 'sample'))
+
+    if request.get('pair'):
+        back = request_image(request, 'back', 'back_path') if 'back' in request or 'back_path' in request else None
+        return extract(image, back, device, **options)
+
+    image_hash = content = previous = None
+    if mode != 'off':
+        try:
+            image_hash, content = fingerprint_from_bytes(base64.b64decode(image))
+            previous = index.find(image_hash, content, key=device)
+        except Exception as e:
+            # Imagem ilegível: a extração devolve o erro detalhado
+            print(f"⚠️ Hash perceptual indisponível: {e}", file=sys.stderr)
+
+    # Redigitalização de um documento já lido por completo: devolver o anterior
+    if previous and mode == 'reuse' and is_complete(previous['result']):
+        print(f"♻️ Quase-duplicata (distância {previous['distance']}, texto conferido), resultado reaproveitado",
+              file=sys.stderr)
+        result = dict(previous['result'])
+        result['duplicate'] = {'reused': True, 'distance': previous['distance'],
+                               'content_mismatch': previous['content_mismatch'],
+                               'age_seconds': previous['age_seconds']}
+        if request.get('trace'):
+            result['profile'] = {'trace': None, 'note': 'resultado reaproveitado; nenhum trace gravado'}
+        return result
+
+    result = extract(image, **options)
+
+    # Leitura anterior incompleta (o atendente redigitalizou): completar com ela
+    if previous and previous['result'].get('success') and result.get('success'):
+        result = seed_from_previous(result, previous['result'])
+        result['duplicate'] = {'reused': False, 'distance': previous['distance'],
+                               'content_mismatch': previous['content_mismatch'],
+                               'age_seconds': previous['age_seconds']}
+
+    if image_hash is not None and result.get('success'):
+        index.add(image_hash, result, key=device, content=content)
+
+    return result
+
+def load_client_index():
+    """Índice de clientes de OCR_CLIENT_INDEX (None se não configurado)"""
+    return ClientIndex.load(os.environ['OCR_CLIENT_INDEX']) if os.environ.get('OCR_CLIENT_INDEX') else None
+
+def serve(requests, output, clients=None):
+    """
+    Laço do worker: uma requisição JSON por linha de requests, um resultado
+    por linha em output. clients: índice de clientes já carregado (pré-fork)
+    """
+    index = DuplicateIndex(
+        max_distance=int(os.environ.get('OCR_DEDUP_MAX_DISTANCE', DEFAULT_MAX_DISTANCE)),
+        window_seconds=float(os.environ.get('OCR_DEDUP_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS))
+    )
+    # Conexão SQLite aberta no próprio processo (nunca herdada de um fork)
+    search_index = OcrIndex(os.environ['OCR_INDEX_DB']) if os.environ.get('OCR_INDEX_DB') else None
+    clients = clients if clients is not None else load_client_index()
+
+    for line in requests:
+        if not line.strip():
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            # Prints dos scripts vão para o stderr; stdout só tem resultados
+            with redirect_stdout(sys.stderr):
+                result = handle_request(request, index)
+            # Resultados reaproveitados já estão no índice; 'auto' grava o perfil escolhido (reprocessável)
+            if search_index and result.get('success') and not result.get('duplicate', {}).get('reused'):
+                search_index.add(result, source=document_key(request),
+                                 device=result.get('device_type') or request.get('device', 'generic'))
+            # Possíveis clientes já cadastrados (evita cadastro duplicado)
+            if clients and result.get('success'):
+                result = dict(result, client_matches=clients.match(result['data']))
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        result = dict(result, id=request_id)
+        output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        output.flush()
+
+def main():
+    """Laço principal: uma requisição JSON por linha"""
+    serve(sys.stdin, sys.stdout)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tesseract simulado para teste de carga (ocr_loadtest.py)
+Aceita a mesma linha de comando do Tesseract (entrada, base de saída, -l,
+--oem/--psm, -c e renderizadores txt/pdf/tsv), grava as saídas com o texto
+de um documento e simula a latência proporcional aos pixels da imagem,
+ocupando a CPU como o Tesseract real (ou só aguardando)
+
+Uso: TESSERACT_CMD=/caminho/stub_tesseract.py python ocr_processor.py ...
+
+Ambiente:
+  STUB_TESSERACT_BASE_MS       custo fixo por execução (padrão 150)
+  STUB_TESSERACT_MS_PER_MPIXEL custo por megapixel (padrão 400)
+  STUB_TESSERACT_JITTER        desvio lognormal da latência (padrão 0.25)
+  STUB_TESSERACT_MODE          cpu (ocupa um núcleo) ou sleep (padrão cpu)
+  STUB_TESSERACT_ERROR_RATE    fração de execuções que falham (padrão 0)
+  STUB_TESSERACT_TEXT          arquivo com o texto devolvido
+"""
+
+import os
+import sys
+import time
+import random
+
+# Texto devolvido (carteira de identidade fictícia, CPF válido)
+DEFAULT_TEXT = """REPUBLICA FEDERATIVA DO BRASIL
+CARTEIRA DE IDENTIDADE
+NOME: JOAO CARLOS DA SILVA
+FILIACAO: JOSE DA SILVA
+MARIA APARECIDA DA SILVA
+NATURALIDADE: SAO PAULO SP
+DATA DE NASCIMENTO: 15/03/1985
+RG: 12.345.678-9
+CPF: 529.982.247-25
+"""
+
+TSV_HEADER = 'level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext'
+
+def image_megapixels(path):
+    """Megapixels da imagem de entrada (só o cabeçalho é lido)"""
+    try:
+        from PIL import Image
+        with Image.open(path) as image:
+            width, height = image.size
+        return width * height / 1e6
+    except Exception:
+        # Sem PIL ou formato desconhecido: estimar pelo tamanho do arquivo
+        return os.path.getsize(path) / 1e6
+
+def simulate_latency(megapixels):
+    """Aguarda (ou ocupa a CPU) pelo tempo simulado de reconhecimento"""
+    base_ms = float(os.environ.get('STUB_TESSERACT_BASE_MS', 150))
+    per_mpixel_ms = float(os.environ.get('STUB_TESSERACT_MS_PER_MPIXEL', 400))
+    jitter = float(os.environ.get('STUB_TESSERACT_JITTER', 0.25))
+    seconds = (base_ms + per_mpixel_ms * megapixels) / 1000 * random.lognormvariate(0, jitter)
+
+    if os.environ.get('STUB_TESSERACT_MODE', 'cpu') == 'sleep':
+        time.sleep(seconds)
+        return
+
+    deadline = time.perf_counter() + seconds
+    value = 0
+    while time.perf_counter() < deadline:
+        for i in range(10000):
+            value += i * i
+
+def tsv_words(text):
+    """TSV no formato do Tesseract, uma palavra por coluna fixa"""
+    rows = [TSV_HEADER]
+    for line_number, line in enumerate(text.splitlines(), 1):
+        left = 40
+        for word_number, word in enumerate(line.split(), 1):
+            width = 18 * len(word)
+            rows.append(f"5\t1\t1\t1\t{line_number}\t{word_number}\t{left}\t{30 * line_number}\t"
+                        f"{width}\t24\t{random.uniform(80, 96):.2f}\t{word}")
+            left += width + 12
+    return '\n'.join(rows) + '\n'
+
+def main():
+    """Interpreta a linha de comando do Tesseract e grava as saídas pedidas"""
+    args = sys.argv[1:]
+    if '--version' in args:
+        print('tesseract 5.3.0 (stub)')
+        return
+    if '--list-langs' in args:
+        print('List of available languages (2):\neng\npor')
+        return
+    if len(args) < 2:
+        print('Usage: stub_tesseract.py imagename outputbase [options...] [configfile...]', file=sys.stderr)
+        sys.exit(1)
+
+    input_path, output_base = args[0], args[1]
+    renderers = set()
+    index = 2
+    while index < len(args):
+        arg = args[index]
+        if arg in ('-l', '--oem', '--psm', '--dpi', '-c'):
+            if arg == '-c' and args[index + 1].startswith('tessedit_create_tsv=1'):
+                renderers.add('tsv')
+            index += 2
+            continue
+        if not arg.startswith('-'):
+            renderers.add(arg)
+        index += 1
+    # Sem renderizador, o Tesseract grava texto
+    renderers = renderers or {'txt'}
+
+    simulate_latency(image_megapixels(input_path))
+
+    if random.random() < float(os.environ.get('STUB_TESSERACT_ERROR_RATE', 0)):
+        print('Error during processing (simulated).', file=sys.stderr)
+        sys.exit(1)
+
+    text = DEFAULT_TEXT
+    if os.environ.get('STUB_TESSERACT_TEXT'):
+        with open(os.environ['STUB_TESSERACT_TEXT'], encoding='utf-8') as f:
+            text = f.read()
+
+    if 'txt' in renderers:
+        with open(output_base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(text)
+    if 'tsv' in renderers:
+        with open(output_base + '.tsv', 'w', encoding='utf-8') as f:
+            f.write(tsv_words(text))
+    if 'pdf' in renderers:
+        with open(output_base + '.pdf', 'wb') as f:
+            f.write(b'%PDF-1.5\n% stub_tesseract\n%%EOF\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ajuste automático dos parâmetros de pré-processamento por dispositivo
+Avalia combinações de parâmetros contra um corpus rotulado, em paralelo,
+e grava o perfil mais rápido que mantém a precisão dos campos
+
+Candidatos são ordenados pelos parâmetros da cadeia de operadores
+(ocr_graph.py), então cada worker reaproveita redimensionamento, cinza e
+desfoque já calculados e só refaz o fim da cadeia; o tempo de cada perfil
+continua contando o custo real de todos os operadores
+
+Corpus: uma pasta com imagens (png/jpg/tif) e, para cada uma, um arquivo
+<mesmo nome>.json com os valores corretos dos campos, por exemplo
+{"nome": "JOAO DA SILVA", "cpf": "529.982.247-25", "nascimento": "15/03/1985"}
+
+Uso: python tune_device_profile.py <pasta_corpus> --device kodak --name kodak_i2600
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import importlib
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+# Módulo e funções de cada dispositivo
+DEVICES = {
+    'kodak': {
+        'module': 'kodak_scanner_ocr',
+        'defaults': 'KODAK_DEFAULT_PROFILE',
+        'parse': 'parse_document_text_advanced'
+    },
+    'multifunctional': {
+        'module': 'multifunctional_scanner_ocr',
+        'defaults': 'MULTIFUNCTIONAL_DEFAULT_PROFILE',
+        'parse': 'parse_document_text_multifunctional'
+    }
+}
+
+# Valores avaliados para cada parâmetro
+SEARCH_SPACE = {
+    'kodak': {
+        'scale_factor': [1.0, 1.5, 2.0, 2.5],
+        'blur_kernel': [1, 3, 5],
+        'threshold_block_size': [11, 15, 21, 31],
+        'threshold_c': [2, 5, 8],
+        'morph_kernel': [1, 2],
+        'contrast': [1.0, 1.3, 1.5],
+        'sharpness': [1.0, 1.5, 2.0],
+        'brightness': [1.0, 1.05, 1.1]
+    },
+    'multifunctional': {
+        'scale_factor': [1.5, 2.0, 2.5, 3.0],
+        'blur_kernel': [1, 3, 5],
+        'threshold_block_size': [11, 15, 21, 31],
+        'threshold_c': [2, 5, 8],
+        'morph_kernel': [1, 2],
+        'median_kernel': [1, 3, 5],
+        'contrast': [1.0, 1.3, 1.5],
+        'sharpness': [1.0, 1.5, 2.0],
+        'brightness': [1.0, 1.05, 1.1],
+        'color': [1.0, 1.1]
+    }
+}
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# Cache de intermediários por worker (MB)
+DEFAULT_CACHE_MB = 512
+
+# Estado de cada processo worker
+_worker = {}
+
+def load_corpus(folder):
+    """Lista pares (imagem, valores corretos) da pasta do corpus"""
+    corpus = []
+    for filename in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(filename)
+        truth_path = os.path.join(folder, stem + '.json')
+        if ext.lower() in IMAGE_EXTENSIONS and os.path.exists(truth_path):
+            with open(truth_path, encoding='utf-8') as f:
+                truth = json.load(f)
+            corpus.append((os.path.join(folder, filename), truth.get('data', truth)))
+    return corpus
+
+def normalize_value(value):
+    """Normaliza valor para comparação (sem acentos, pontuação e caixa)"""
+    value = unicodedata.normalize('NFKD', str(value))
+    return ''.join(char for char in value.upper() if char.isalnum())
+
+def candidate_profiles(device, defaults, trials, seed):
+    """Gera os perfis candidatos: o padrão atual e combinações aleatórias"""
+    space = SEARCH_SPACE[device]
+    rng = random.Random(seed)
+    candidates = [dict(defaults)]
+    seen = {json.dumps(defaults, sort_keys=True)}
+
+    attempts = 0
+    while len(candidates) < trials and attempts < trials * 20:
+        attempts += 1
+        params = dict(defaults)
+        params.update({key: rng.choice(values) for key, values in space.items()})
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+
+    return candidates
+
+def chain_order(device, params):
+    """Chave de ordenação: perfis vizinhos compartilham o maior prefixo da cadeia"""
+    from ocr_graph import build_chain
+    return [sorted(step_params.items()) for _, step_params in build_chain(device, params)]
+
+def _init_worker(device, corpus, workers, cache_mb=DEFAULT_CACHE_MB):
+    """Carrega o módulo do dispositivo e as imagens uma vez por worker"""
+    from PIL import Image
+    from ocr_graph import IntermediateCache
+    from ocr_threads import apply_thread_budget
+
+    spec = DEVICES[device]
+    with redirect_stdout(sys.stderr):
+        module = importlib.import_module(spec['module'])
+
+    # Orçamento de threads dividido entre os workers do ajuste
+    apply_thread_budget(workers)
+
+    _worker['module'] = module
+    _worker['spec'] = spec
+    _worker['device'] = device
+    _worker['cache'] = IntermediateCache(cache_mb)
+    _worker['corpus'] = []
+    for path, truth in corpus:
+        with Image.open(path) as image:
+            image.load()
+            _worker['corpus'].append((path, image.copy(), truth))
+
+def evaluate_profile(params):
+    """Executa o pipeline com os parâmetros e mede precisão e tempo"""
+    from ocr_bands import ocr_with_fallback
+    from ocr_graph import build_chain, run_graph
+
+    module, spec = _worker['module'], _worker['spec']
+    parse = getattr(module, spec['parse'])
+    chain = build_chain(_worker['device'], params)
+
+    fields_total = fields_matched = 0
+    elapsed = 0.0
+    operator_ms = {}
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for path, image, truth in _worker['corpus']:
+            enhanced, costs = run_graph(image, chain, _worker['cache'], input_key=path)
+            started = time.perf_counter()
+            text = ocr_with_fallback(enhanced, module.TESSERACT_CONFIG)
+            data = parse(text)
+            # Operadores vindos do cache contam o tempo que custaram ao serem calculados
+            elapsed += time.perf_counter() - started + sum(cost['ms'] for cost in costs) / 1000
+            for cost in costs:
+                operator_ms[cost['op']] = operator_ms.get(cost['op'], 0.0) + cost['ms']
+
+            for field, expected in truth.items():
+                fields_total += 1
+                if normalize_value(data.get(field, '')) == normalize_value(expected):
+                    fields_matched += 1
+
+    documents = len(_worker['corpus'])
+    return {
+        'params': params,
+        'accuracy': fields_matched / fields_total if fields_total else 0.0,
+        'fields_matched': fields_matched,
+        'fields_total': fields_total,
+        'mean_seconds': elapsed / documents if documents else 0.0,
+        'operator_ms': {op: round(ms / documents, 1) for op, ms in operator_ms.items()} if documents else {}
+    }
+
+def select_profile(results, tolerance):
+    """Escolhe o perfil mais rápido dentro da tolerância da melhor precisão"""
+    best_accuracy = max(result['accuracy'] for result in results)
+    eligible = [result for result in results if result['accuracy'] >= best_accuracy - tolerance]
+    return min(eligible, key=lambda result: result['mean_seconds'])
+
+def main():
+    """Função principal do ajuste de perfis"""
+    parser = argparse.ArgumentParser(description='Ajusta o perfil de pré-processamento de um dispositivo')
+    parser.add_argument('corpus', help='Pasta com imagens e arquivos .json com os valores corretos')
+    parser.add_argument('--device', choices=sorted(DEVICES), required=True)
+    parser.add_argument('--name', help='Nome do perfil (modelo do scanner); padrão: nome do dispositivo')
+    parser.add_argument('--trials', type=int, default=40, help='Quantidade de combinações avaliadas')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help='Perda de precisão aceita em troca de velocidade (0.02 = 2 pontos)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_MB,
+                        help='Cache de intermediários do pré-processamento por worker (MB)')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"❌ Nenhuma imagem com valores corretos (.json) em {args.corpus}")
+        sys.exit(1)
+
+    with redirect_stdout(sys.stderr):
+        module = importlib.import_module(DEVICES[args.device]['module'])
+    defaults = getattr(module, DEVICES[args.device]['defaults'])
+    candidates = candidate_profiles(args.device, defaults, args.trials, args.seed)
+    # O padrão continua primeiro (referência); os demais agrupados por prefixo da cadeia
+    candidates = candidates[:1] + sorted(candidates[1:], key=lambda params: chain_order(args.device, params))
+    chunksize = max(1, -(-len(candidates) // args.workers))
+
+    print(f"🔧 {len(candidates)} perfis x {len(corpus)} documentos em {args.workers} workers")
+
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.device, corpus, args.workers, args.cache_mb)) as executor:
+        for index, result in enumerate(executor.map(evaluate_profile, candidates, chunksize=chunksize), 1):
+            results.append(result)
+            print(f"  [{index}/{len(candidates)}] precisão {result['accuracy']:.1%} "
+                  f"em {result['mean_seconds']:.2f}s/doc")
+
+    baseline = results[0]
+    chosen = select_profile(results, args.tolerance)
+
+    from ocr_profiles import save_profile
+    path = save_profile(args.device, args.name or args.device, chosen['params'], {
+        'accuracy': chosen['accuracy'],
+        'mean_seconds': chosen['mean_seconds'],
+        'baseline_accuracy': baseline['accuracy'],
+        'baseline_mean_seconds': baseline['mean_seconds'],
+        'documents': len(corpus),
+        'trials': len(candidates),
+        'tolerance': args.tolerance
+    })
+
+    print(f"✅ Perfil gravado em {path} ({time.perf_counter() - started:.0f}s de ajuste)")
+    print(f"📊 Padrão: {baseline['accuracy']:.1%} em {baseline['mean_seconds']:.2f}s/doc")
+    print(f"📊 Escolhido: {chosen['accuracy']:.1%} em {chosen['mean_seconds']:.2f}s/doc")
+
+if __name__ == '__main__':
+    main()